@@ -0,0 +1,184 @@
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, TypeVar
+
+import config
+import metricas
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Classes de quota: leituras (GET) e escritas (uploads, criação, alteração) têm ritmos diferentes.
+LEITURA = "leitura"
+ESCRITA = "escrita"
+
+STATUS_TRANSITORIOS = {429, 500, 502, 503, 504}
+MOTIVOS_LIMITE = {"userRateLimitExceeded", "rateLimitExceeded"}
+
+
+# --- BALDE DE FICHAS (RITMO POR CLASSE DE QUOTA) ---
+
+class BaldeFichas:
+    """
+    Token bucket thread-safe: `taxa` fichas por segundo, até `capacidade` acumuladas.
+    Quem pega uma ficha com o balde vazio fica com o saldo negativo e dorme o tempo
+    correspondente, então rajadas (ex.: logo após um cold start) saem espaçadas no
+    ritmo configurado em vez de esbarrar no limite do Drive.
+    """
+
+    def __init__(self, taxa: float, capacidade: float):
+        self.taxa = max(taxa, 0.001)
+        self.capacidade = max(capacidade, 1.0)
+        self._fichas = self.capacidade
+        self._atualizado = time.monotonic()
+        self._trava = threading.Lock()
+
+    def adquirir(self) -> float:
+        """Reserva uma ficha, dormindo se preciso. Devolve o tempo esperado, em segundos."""
+        with self._trava:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            self._fichas -= 1
+            espera = -self._fichas / self.taxa if self._fichas < 0 else 0.0
+        if espera:
+            time.sleep(espera)
+        return espera
+
+
+# --- CLASSIFICAÇÃO DOS ERROS ---
+
+def _motivo(erro) -> str | None:
+    try:
+        detalhes = json.loads(erro.content.decode("utf-8") if isinstance(erro.content, bytes) else erro.content)
+        return detalhes["error"]["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+def segundos_retry_after(valor: str | None) -> float | None:
+    """Interpreta o cabeçalho Retry-After (segundos ou data HTTP)."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def classificar(erro: Exception) -> str | None:
+    """Nome curto do erro se valer a pena tentar de novo; None se for definitivo."""
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    if isinstance(erro, HttpError):
+        status = getattr(erro.resp, "status", None)
+        if status in STATUS_TRANSITORIOS:
+            return str(status)
+        if status == 403 and _motivo(erro) in MOTIVOS_LIMITE:
+            return "403_limite"
+        return None
+    if isinstance(erro, (TimeoutError, ConnectionError, httplib2.HttpLib2Error)):
+        return "rede"
+    return None
+
+
+# --- AGENDADOR ---
+
+class AgendadorDrive:
+    """
+    Ponto único por onde passam as chamadas ao Drive: ritmo por classe de quota e
+    novas tentativas com backoff exponencial + jitter nos erros transitórios
+    (429, 5xx, 403 de limite de taxa, falhas de rede), respeitando o Retry-After
+    quando o Drive informa. Contadores de tentativas e de tempo de espera ficam em
+    `metricas` (prefixo "drive.").
+    """
+
+    def __init__(
+        self,
+        taxas: dict[str, float] | None = None,
+        capacidade: float = config.DRIVE_RAJADA,
+        tentativas: int = config.DRIVE_TENTATIVAS,
+        backoff_base: float = config.DRIVE_BACKOFF_BASE,
+        backoff_maximo: float = config.DRIVE_BACKOFF_MAXIMO,
+    ):
+        taxas = taxas or {LEITURA: config.DRIVE_TAXA_LEITURA, ESCRITA: config.DRIVE_TAXA_ESCRITA}
+        self.baldes = {classe: BaldeFichas(taxa, capacidade) for classe, taxa in taxas.items()}
+        self.tentativas = max(1, tentativas)
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+
+    def reservar(self, classe: str = LEITURA) -> float:
+        """Espera a vez na classe de quota (para quem fala com o Drive por fora do googleapiclient)."""
+        espera = (self.baldes.get(classe) or self.baldes[LEITURA]).adquirir()
+        if espera:
+            metricas.incrementar("drive.espera_ritmo_s", espera)
+        metricas.incrementar(f"drive.chamadas.{classe}")
+        return espera
+
+    def espera_backoff(self, tentativa: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_maximo)
+        # Full jitter: uniforme entre 0 e base * 2^tentativa (limitado ao máximo).
+        return random.uniform(0, min(self.backoff_maximo, self.backoff_base * 2 ** tentativa))
+
+    def executar(self, chamada: Callable[[], T], classe: str = LEITURA, descricao: str = "") -> T:
+        for tentativa in range(self.tentativas):
+            self.reservar(classe)
+            try:
+                return chamada()
+            except Exception as e:
+                tipo = classificar(e)
+                if tipo is None or tentativa == self.tentativas - 1:
+                    if tipo is not None:
+                        metricas.incrementar("drive.falhas_apos_tentativas")
+                    raise
+                from googleapiclient.errors import HttpError  # já carregado por classificar()
+
+                retry_after = None
+                if isinstance(e, HttpError) and e.resp is not None:
+                    retry_after = segundos_retry_after(e.resp.get("retry-after"))
+                espera = self.espera_backoff(tentativa, retry_after)
+                metricas.incrementar("drive.retentativas")
+                metricas.incrementar(f"drive.retentativas.{tipo}")
+                metricas.incrementar("drive.espera_backoff_s", espera)
+                logger.warning(
+                    f"Drive {descricao or classe}: erro transitório ({tipo}); nova tentativa "
+                    f"{tentativa + 2}/{self.tentativas} em {espera:.1f}s."
+                )
+                time.sleep(espera)
+
+
+agendador = AgendadorDrive()
+
+def executar(chamada: Callable[[], T], classe: str = LEITURA, descricao: str = "") -> T:
+    return agendador.executar(chamada, classe, descricao)
+
+
+@functools.cache
+def classe_requisicao():
+    """
+    HttpRequest que passa pelo agendador. Usado como `requestBuilder` dos clientes do
+    pool, então todo `.execute()` feito com eles ganha ritmo e novas tentativas.
+    Uploads resumable retomam da última parte confirmada ao tentar de novo.
+
+    A classe é montada na primeira chamada, para o googleapiclient só ser importado
+    quando o primeiro cliente do Drive for criado (e não na partida do bot).
+    """
+    from googleapiclient.http import HttpRequest
+
+    class RequisicaoAgendada(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            classe = LEITURA if self.method.upper() == "GET" else ESCRITA
+            descricao = f"{self.method} {self.methodId or self.uri.split('?')[0]}"
+            return executar(lambda: super(RequisicaoAgendada, self).execute(http=http, num_retries=0), classe, descricao)
+
+    return RequisicaoAgendada
@@ -0,0 +1,113 @@
+"""
+Benchmark do índice de busca (busca.IndiceBusca) contra a varredura linear antiga
+(`palavra_chave in a.lower()` sobre a lista inteira).
+
+Gera catálogos sintéticos de assuntos, com acentos, e mede montagem do índice,
+inclusão incremental e latência por consulta (mediana e p95).
+
+Uso:
+    python benchmark_busca.py                       # 10k, 50k e 100k itens
+    python benchmark_busca.py --itens 20000 --consultas 500
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import busca
+import catalogo
+
+PALAVRAS = [
+    "Tensão", "Fornecimento", "Extensão", "Rede", "Ligação", "Nova", "Baixa", "Média", "Alta",
+    "Iluminação", "Pública", "Poste", "Transformador", "Religação", "Medidor", "Fatura", "Consumo",
+    "Projeto", "Obra", "Manutenção", "Poda", "Árvore", "Reclamação", "Interrupção", "Oscilação",
+    "Ramal", "Subestação", "Cabo", "Padrão", "Entrada", "Vistoria", "Orçamento", "Prazo", "Rural",
+]
+
+SILABAS = ["ca", "ri", "a", "cu", "bo", "ta", "pa", "ção", "lã", "ve", "nho", "gua", "rá", "mi", "to", "sé", "lu", "ma"]
+
+CONSULTAS = {
+    "palavra exata": ["tensao", "iluminacao", "poste", "ramal"],
+    "prefixos": ["lig nov", "ext red", "manut pod", "subest"],
+    "com acento": ["Tensão", "Religação", "Árvore"],
+    "erro de digitação": ["tensõa", "ilumincao", "trasformador", "reliagcao", "rde"],
+    "termo + nome": ["poste cari", "tensao bota", "ramal lu"],
+}
+
+
+def gerar_catalogo(total: int, caminho: str, semente: int = 42):
+    """Assuntos com 1-3 termos técnicos comuns e 1-2 nomes próprios inventados (mais seletivos)."""
+    aleatorio = random.Random(semente)
+    nomes_proprios = list(dict.fromkeys(
+        "".join(aleatorio.choices(SILABAS, k=aleatorio.randint(2, 4))).capitalize() for _ in range(total // 2)
+    ))
+    vistos = set()
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("assunto\n")
+        while len(vistos) < total:
+            termos = aleatorio.sample(PALAVRAS, aleatorio.randint(1, 3))
+            termos += aleatorio.sample(nomes_proprios, aleatorio.randint(1, 2))
+            nome = " ".join(termos)
+            if nome not in vistos:
+                vistos.add(nome)
+                f.write(nome + "\n")
+
+
+def percentis(tempos: list[float]) -> tuple[float, float]:
+    tempos = sorted(tempos)
+    return statistics.median(tempos) * 1000, tempos[int(len(tempos) * 0.95) - 1] * 1000
+
+
+def medir_consultas(funcao, consultas: list[str], repeticoes: int) -> tuple[float, float]:
+    tempos = []
+    for _ in range(repeticoes):
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            funcao(consulta)
+            tempos.append(time.perf_counter() - inicio)
+    return percentis(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--consultas", type=int, default=200, help="repetições de cada consulta")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    for total in args.itens:
+        caminho = os.path.join(pasta, f"assuntos_{total}.csv")
+        gerar_catalogo(total, caminho)
+        fonte = catalogo.Catalogo(caminho, "assunto")
+        indice = busca.IndiceBusca(fonte)
+
+        inicio = time.perf_counter()
+        itens = fonte.itens()
+        carga = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        indice.buscar("tensao")
+        montagem = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for i in range(100):
+            fonte.adicionar(f"Assunto Incremental {i}")
+        inclusao = (time.perf_counter() - inicio) / 100
+
+        print(f"\n{total} itens: leitura do CSV {carga * 1000:.0f} ms, montagem do índice {montagem * 1000:.0f} ms, "
+              f"inclusão (CSV + índice) {inclusao * 1000:.2f} ms/item")
+        print(f"  {'consulta':<20} {'índice p50':>11} {'p95':>8} {'linear p50':>11} {'p95':>8} {'resultados':>11}")
+
+        lista = list(itens)
+        for rotulo, consultas in CONSULTAS.items():
+            p50, p95 = medir_consultas(indice.buscar, consultas, args.consultas)
+            l50, l95 = medir_consultas(
+                lambda c: [a for a in lista if c.lower() in a.lower()], consultas, max(1, args.consultas // 20)
+            )
+            resultados = sum(len(indice.buscar(c)) for c in consultas) // len(consultas)
+            print(f"  {rotulo:<20} {p50:>9.3f}ms {p95:>6.3f}ms {l50:>9.3f}ms {l95:>6.3f}ms {resultados:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark do caminho quente dos handlers de paginação e dos menus fixos: montar o
+teclado a cada clique (como era) contra pegar a página pronta em `teclados`.
+
+"Antes" refaz o que os handlers faziam por clique: pega a lista da consulta, fatia a
+página em `utils.botoes_pagina` e cria o InlineKeyboardMarkup. "Depois" é
+`teclados.paginados.pagina` / `teclados.fixo`, com a página já montada.
+
+Uso:
+    python benchmark_teclados.py
+    python benchmark_teclados.py --itens 50000 --cliques 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from telegram import InlineKeyboardMarkup
+
+import benchmark_busca
+import busca
+import catalogo
+import teclados
+import utils
+
+CONSULTAS = ["tensao", "poste", "lig nov", "ramal"]
+
+
+def medir(funcao, argumentos: list[tuple]) -> tuple[float, float]:
+    tempos = []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        funcao(*args)
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return statistics.median(tempos) * 1e6, tempos[int(len(tempos) * 0.95) - 1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, default=10_000)
+    parser.add_argument("--cliques", type=int, default=2_000, help="cliques simulados em cada cenário")
+    args = parser.parse_args()
+
+    caminho = os.path.join(tempfile.mkdtemp(), "assuntos.csv")
+    benchmark_busca.gerar_catalogo(args.itens, caminho)
+    indice = busca.IndiceBusca(catalogo.Catalogo(caminho, "assunto"))
+    paginados = teclados.TecladosPaginados(1024)
+
+    aleatorio = random.Random(7)
+    cliques = [(aleatorio.choice(CONSULTAS + [None]), aleatorio.randint(0, 5)) for _ in range(args.cliques)]
+    for consulta, _ in cliques:
+        indice.resultados(consulta)  # os dois lados partem dos resultados já em cache
+
+    def antes(consulta, pagina):
+        botoes, _ = utils.botoes_pagina(indice.resultados(consulta), pagina, prefix="assunto_")
+        return InlineKeyboardMarkup(botoes)
+
+    def depois(consulta, pagina):
+        return paginados.pagina(indice, consulta, pagina, "assunto_")
+
+    for consulta, pagina in set(cliques):
+        depois(consulta, pagina)  # aquece: cada página é montada uma vez
+
+    print(f"{args.itens} itens, {args.cliques} cliques de paginação")
+    print(f"  {'cenário':<28} {'p50':>9} {'p95':>9}")
+    for rotulo, funcao in (("página: montada no clique", antes), ("página: teclado pronto", depois)):
+        p50, p95 = medir(funcao, cliques)
+        print(f"  {rotulo:<28} {p50:>7.1f}µs {p95:>7.1f}µs")
+
+    menus = [(nome,) for nome in teclados._MENUS] * (args.cliques // len(teclados._MENUS))
+    for rotulo, funcao in (("menu fixo: montado", lambda nome: teclados._MENUS[nome]()),
+                           ("menu fixo: pronto", teclados.fixo)):
+        p50, p95 = medir(funcao, menus)
+        print(f"  {rotulo:<28} {p50:>7.1f}µs {p95:>7.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark do anexador de linhas em xlsx (xlsx_append) contra o caminho antigo via pandas.
+
+Uso:
+    python benchmark_xlsx_append.py                      # 10k, 100k e 500k linhas
+    python benchmark_xlsx_append.py --linhas 10000 50000 --pandas
+"""
+import argparse
+import time
+from io import BytesIO
+
+import pandas as pd
+import xlsxwriter
+
+import utils
+import xlsx_append
+
+DADOS_EXEMPLO = {
+    "data": "2026-10-18",
+    "colaborador": "Orlando Sena Campos Junior",
+    "tipo_visita": "PROATIVO",
+    "tipo_atendimento": "PRESENCIAL - EDP",
+    "assunto": "Extensão de Rede",
+    "municipio": "VITÓRIA",
+    "figuras_orgaos": [{"orgao_publico": "PREFEITURA MUNICIPAL", "figura_publica": "Fulano", "cargo": "Secretário"}],
+}
+
+
+def gerar_planilha(total_linhas: int) -> bytes:
+    """Planilha no formato de salvar_excel_drive_em_memoria (aba REUNIOES), gerada em modo streaming."""
+    linha = utils.linha_reuniao(DADOS_EXEMPLO)
+    colunas = list(linha)
+    saida = BytesIO()
+    workbook = xlsxwriter.Workbook(saida, {"constant_memory": True, "in_memory": False})
+    aba = workbook.add_worksheet("REUNIOES")
+    aba.write_row(0, 0, colunas)
+    valores = [linha[c] for c in colunas]
+    for i in range(1, total_linhas + 1):
+        aba.write_row(i, 0, valores)
+    workbook.close()
+    return saida.getvalue()
+
+
+def medir(funcao, repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def anexar_via_pandas(conteudo: bytes, linhas: list[dict]) -> bytes:
+    df_existente = pd.read_excel(BytesIO(conteudo), engine="openpyxl")
+    df_final = pd.concat([df_existente, pd.DataFrame(linhas)], ignore_index=True)
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        df_final.to_excel(writer, index=False, sheet_name="REUNIOES")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 500_000],
+                        help="tamanhos da planilha existente")
+    parser.add_argument("--lote", type=int, default=20, help="linhas anexadas por escrita")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--pandas", action="store_true", help="mede também o caminho antigo (lento)")
+    args = parser.parse_args()
+
+    novas = [utils.linha_reuniao(DADOS_EXEMPLO)] * args.lote
+    print(f"{'existentes':>10} {'xlsx (MB)':>10} {'append (s)':>11} {'ms/linha':>9}"
+          + (f" {'pandas (s)':>11} {'ms/linha':>9}" if args.pandas else ""))
+
+    for total in args.linhas:
+        conteudo = gerar_planilha(total)
+        tempo = medir(lambda: xlsx_append.anexar_linhas_xlsx(conteudo, novas), args.repeticoes)
+        linha = f"{total:>10} {len(conteudo) / 1e6:>10.2f} {tempo:>11.3f} {tempo * 1000 / args.lote:>9.2f}"
+        if args.pandas:
+            tempo_pandas = medir(lambda: anexar_via_pandas(conteudo, novas), 1)
+            linha += f" {tempo_pandas:>11.3f} {tempo_pandas * 1000 / args.lote:>9.2f}"
+        print(linha, flush=True)
+
+
+if __name__ == "__main__":
+    main()
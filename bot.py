@@ -6,6 +6,7 @@ from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler,
     CallbackQueryHandler, ConversationHandler, filters
 )
+import config
 import handlers
 from handlers import *
 
@@ -25,6 +26,7 @@ async def start(update, context):
     await update.message.reply_text("Olá! Use /iniciar para começar o registro de uma ocorrência.")
 
 def main():
+    config.inicializar()
     token = os.getenv("BOT_TOKEN")
     if not token:
         print("Error: BOT_TOKEN not found in environment variables or .env file")
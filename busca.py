@@ -0,0 +1,260 @@
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import catalogo
+import config
+import metricas
+
+logger = logging.getLogger(__name__)
+
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+def tokens(texto: str) -> list[str]:
+    return _PALAVRA.findall(catalogo.normalizar(texto))
+
+
+def chave_consulta(consulta: str | None) -> str | None:
+    """Forma da consulta usada como chave de cache: "Tensão  baixa" e "tensao baixa" são a mesma busca."""
+    if consulta is None:
+        return None
+    return " ".join(tokens(consulta))
+
+
+def trigramas(palavras: list[str]) -> set[str]:
+    resultado = set()
+    for palavra in palavras:
+        marcada = f"  {palavra} "
+        resultado.update(marcada[i:i + 3] for i in range(len(marcada) - 2))
+    return resultado
+
+
+def um_erro(a: str, b: str) -> bool:
+    """True se `a` e `b` diferem por no máximo uma letra trocada, incluída, removida ou transposta."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    return a[i:] == b[i + 1:]
+
+
+class IndiceBusca:
+    """
+    Índice de busca em memória sobre um `catalogo.Catalogo`.
+
+    Textos e consultas passam pela mesma normalização (sem acentos, minúsculas), então
+    "tensao" encontra "Tensão". Cada palavra da consulta precisa casar com uma palavra do
+    item, inteira ou como prefixo ("lig nova" → "Ligação Nova..."). Palavra da consulta
+    que não é prefixo de nada é comparada por trigramas com o vocabulário (tolera erros
+    de digitação: "tensoa" → "tensao"). O resultado vem ordenado por relevância e, no
+    empate, pelos itens mais usados (`registrar_uso`).
+
+    O índice é montado na primeira busca, recebe as inclusões do catálogo uma a uma e só
+    é remontado por inteiro se o CSV mudar no disco.
+
+    `resultados` devolve a lista de uma consulta como tupla compartilhada: as conversas
+    guardam só a consulta e a página, e paginam sobre a mesma tupla (LRU de até
+    `max_resultados` consultas, descartado quando o catálogo muda).
+    """
+
+    def __init__(self, fonte: catalogo.Catalogo, caminho_usos: str | None = None, limiar_aproximado: float = 0.35,
+                 max_resultados: int = 256):
+        self.fonte = fonte
+        self.caminho_usos = caminho_usos
+        self.limiar_aproximado = limiar_aproximado
+        self.max_resultados = max_resultados
+        self._trava = threading.RLock()
+        self._versao_indexada: int | None = None
+        self._limpar()
+        self._usos: Counter | None = None
+        self._resultados: OrderedDict[str, tuple[str, ...]] = OrderedDict()
+        self._versao_resultados: int | None = None
+        fonte.ao_adicionar(self._incluir_do_catalogo)
+
+    # --- Montagem ---
+
+    def _limpar(self):
+        self._itens: list[str] = []
+        self._dobrados: list[str] = []
+        self._posicoes: dict[str, int] = {}
+        self._por_palavra: dict[str, set[int]] = {}
+        self._palavras_ordenadas: list[str] = []
+        self._trigramas_palavra: dict[str, set[str]] = {}
+        self._por_trigrama: dict[str, set[str]] = {}
+
+    def _indexar(self, item: str, ordenar: bool = True):
+        dobrado = catalogo.normalizar(item)
+        if dobrado in self._posicoes:
+            return
+        posicao = len(self._itens)
+        self._itens.append(item)
+        self._dobrados.append(dobrado)
+        self._posicoes[dobrado] = posicao
+
+        for palavra in _PALAVRA.findall(dobrado):
+            if palavra not in self._por_palavra:
+                self._por_palavra[palavra] = set()
+                if ordenar:
+                    bisect.insort(self._palavras_ordenadas, palavra)
+                tri = trigramas([palavra])
+                self._trigramas_palavra[palavra] = tri
+                for t in tri:
+                    self._por_trigrama.setdefault(t, set()).add(palavra)
+            self._por_palavra[palavra].add(posicao)
+
+    def _garantir(self):
+        itens = self.fonte.itens()  # também confere se o CSV mudou no disco
+        versao = self.fonte.versao
+        if versao == self._versao_indexada:
+            return
+        self._limpar()
+        for item in itens:
+            self._indexar(item, ordenar=False)
+        self._palavras_ordenadas = sorted(self._por_palavra)
+        self._versao_indexada = versao
+        logger.info(f"Índice de busca montado com {len(self._itens)} item(ns) e {len(self._por_palavra)} palavra(s).")
+
+    def _incluir_do_catalogo(self, item: str):
+        with self._trava:
+            if self._versao_indexada is None:
+                return  # ainda não montado: a primeira busca já pega o item
+            self._indexar(item)
+            self._versao_indexada = self.fonte.versao
+
+    def adicionar(self, item: str):
+        """Inclui um item só no índice (o catálogo já avisa sozinho das suas inclusões)."""
+        with self._trava:
+            self._garantir()
+            self._indexar(item)
+
+    # --- Uso (para ordenar) ---
+
+    def _carregar_usos(self) -> Counter:
+        if self._usos is None:
+            self._usos = Counter()
+            if self.caminho_usos:
+                try:
+                    with open(self.caminho_usos, encoding="utf-8") as f:
+                        self._usos.update(json.load(f))
+                except FileNotFoundError:
+                    pass
+                except (json.JSONDecodeError, TypeError, ValueError) as e:
+                    logger.warning(f"Contagem de usos em '{self.caminho_usos}' ilegível ({e}); começando do zero.")
+        return self._usos
+
+    def registrar_uso(self, item: str):
+        with self._trava:
+            usos = self._carregar_usos()
+            usos[catalogo.normalizar(item)] += 1
+            if not self.caminho_usos:
+                return
+            os.makedirs(os.path.dirname(self.caminho_usos) or ".", exist_ok=True)
+            temporario = self.caminho_usos + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(usos, f, ensure_ascii=False)
+            os.replace(temporario, self.caminho_usos)
+
+    # --- Consulta ---
+
+    def _palavras_casadas(self, palavra: str) -> dict[str, float]:
+        """Palavras do vocabulário que casam com `palavra`, com peso: 2 exata, 1 prefixo, <1 aproximada."""
+        casadas = {}
+        inicio = bisect.bisect_left(self._palavras_ordenadas, palavra)
+        for candidata in self._palavras_ordenadas[inicio:]:
+            if not candidata.startswith(palavra):
+                break
+            casadas[candidata] = 2.0 if candidata == palavra else 1.0
+        if casadas:
+            return casadas
+
+        tri = trigramas([palavra])
+        comuns: Counter = Counter()
+        for t in tri:
+            comuns.update(self._por_trigrama.get(t, ()))
+        for candidata, n in comuns.items():
+            similaridade = n / (len(tri) + len(self._trigramas_palavra[candidata]) - n)
+            if similaridade >= self.limiar_aproximado:
+                casadas[candidata] = similaridade
+            elif um_erro(palavra, candidata):
+                # Palavras curtas têm poucos trigramas; um erro só já derruba a similaridade.
+                casadas[candidata] = max(similaridade, self.limiar_aproximado)
+        return casadas
+
+    def buscar(self, consulta: str, limite: int | None = None) -> list[str]:
+        dobrada = catalogo.normalizar(consulta)
+        palavras = _PALAVRA.findall(dobrada)
+        if not palavras:
+            return []
+        with self._trava:
+            self._garantir()
+            pontos: dict[int, float] | None = None
+            for palavra in palavras:
+                casados: dict[int, float] = {}
+                for candidata, peso in self._palavras_casadas(palavra).items():
+                    for posicao in self._por_palavra[candidata]:
+                        if casados.get(posicao, 0.0) < peso:
+                            casados[posicao] = peso
+                if pontos is None:
+                    pontos = casados
+                else:
+                    pontos = {p: pontos[p] + peso for p, peso in casados.items() if p in pontos}
+                if not pontos:
+                    return []
+
+            for posicao in pontos:
+                dobrado = self._dobrados[posicao]
+                if dobrado.startswith(dobrada):
+                    pontos[posicao] += 2.0
+                elif dobrada in dobrado:
+                    pontos[posicao] += 1.0
+
+            usos = self._carregar_usos()
+            chave = lambda p: (-pontos[p], -usos[self._dobrados[p]], p)
+            if limite is not None:
+                ordem = heapq.nsmallest(limite, pontos, key=chave)
+            else:
+                ordem = sorted(pontos, key=chave)
+            return [self._itens[p] for p in ordem]
+
+    def resultados(self, consulta: str | None) -> tuple[str, ...]:
+        """
+        Resultado de `buscar(consulta)` congelado e compartilhado entre as conversas; a
+        mesma consulta (após normalização) devolve a mesma tupla enquanto o catálogo não
+        mudar, então a ordem fica estável durante a paginação. `None` é a lista completa.
+        """
+        if consulta is None:
+            return self.fonte.itens()
+        chave = chave_consulta(consulta)
+        with self._trava:
+            self._garantir()
+            if self._versao_resultados != self._versao_indexada:
+                self._resultados.clear()
+                self._versao_resultados = self._versao_indexada
+            resultado = self._resultados.get(chave)
+            if resultado is not None:
+                self._resultados.move_to_end(chave)
+                metricas.incrementar("busca.resultados.reaproveitados")
+                return resultado
+            resultado = tuple(self.buscar(consulta))
+            self._resultados[chave] = resultado
+            if len(self._resultados) > self.max_resultados:
+                self._resultados.popitem(last=False)
+            metricas.incrementar("busca.resultados.calculados")
+            return resultado
+
+
+assuntos = IndiceBusca(catalogo.assuntos, config.USO_ASSUNTOS_PATH, max_resultados=config.BUSCA_RESULTADOS_MAX)
+orgaos = IndiceBusca(catalogo.orgaos, config.USO_ORGAOS_PATH, max_resultados=config.BUSCA_RESULTADOS_MAX)
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import agendador_drive
+import config
+
+logger = logging.getLogger(__name__)
+
+# Campos do Drive que identificam o conteúdo atual de um arquivo.
+CAMPOS_REVISAO = "md5Checksum,headRevisionId"
+
+
+class ConflitoRevisao(RuntimeError):
+    """A planilha mudou no Drive entre a leitura e o envio, em todas as tentativas."""
+
+
+class CachePlanilhas:
+    """
+    Cache local das planilhas do Drive, chaveado pelo ID do arquivo e pela revisão.
+
+    Antes de baixar uma planilha, uma consulta de metadados (`files().get` só com
+    md5Checksum/headRevisionId) diz se os bytes guardados em disco ainda são os do
+    Drive. Depois de cada upload nosso o cache é atualizado com o que acabamos de
+    enviar, então a próxima escrita não baixa de novo o próprio arquivo. Os
+    DataFrames já lidos ficam em memória (LRU) para a mesma revisão.
+    """
+
+    def __init__(self, pasta: str = config.CACHE_PLANILHAS_PATH, max_dataframes: int = 8):
+        self.pasta = pasta
+        self.max_dataframes = max_dataframes
+        self._trava = threading.Lock()
+        self._dataframes: OrderedDict[str, tuple[str, "pd.DataFrame"]] = OrderedDict()
+
+    # --- Arquivos locais ---
+
+    def _caminho_bytes(self, file_id: str) -> str:
+        return os.path.join(self.pasta, f"{file_id}.xlsx")
+
+    def _caminho_meta(self, file_id: str) -> str:
+        return os.path.join(self.pasta, f"{file_id}.json")
+
+    def _meta_local(self, file_id: str) -> dict | None:
+        try:
+            with open(self._caminho_meta(file_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _gravar_local(self, file_id: str, conteudo: bytes, meta: dict):
+        os.makedirs(self.pasta, exist_ok=True)
+        # Bytes primeiro, metadados depois: metadados sem bytes correspondentes nunca são lidos.
+        temporario = self._caminho_bytes(file_id) + ".tmp"
+        with open(temporario, "wb") as f:
+            f.write(conteudo)
+        os.replace(temporario, self._caminho_bytes(file_id))
+        temporario = self._caminho_meta(file_id) + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temporario, self._caminho_meta(file_id))
+
+    @staticmethod
+    def _revisao(meta: dict) -> str:
+        return f"{meta.get('headRevisionId', '')}:{meta.get('md5Checksum', '')}"
+
+    # --- Consulta ao Drive ---
+
+    def _meta_remota(self, service, file_id: str) -> dict:
+        return service.files().get(fileId=file_id, fields=CAMPOS_REVISAO).execute()
+
+    def _baixar(self, service, file_id: str) -> bytes:
+        from googleapiclient.http import MediaIoBaseDownload
+
+        request = service.files().get_media(fileId=file_id)
+        fh = BytesIO()
+        downloader = MediaIoBaseDownload(fh, request)
+        done = False
+        while not done:
+            # O download em partes não passa pelo `execute`; cada parte vai pelo agendador.
+            status, done = agendador_drive.executar(downloader.next_chunk, descricao=f"download {file_id}")
+        return fh.getvalue()
+
+    def revisao_remota(self, service, file_id: str) -> str:
+        """Revisão atual do arquivo no Drive (só metadados, sem baixar o conteúdo)."""
+        return self._revisao(self._meta_remota(service, file_id))
+
+    def ler_bytes(self, service, file_id: str) -> tuple[bytes, str]:
+        """Devolve (conteúdo, revisão) da planilha, baixando só se o Drive tiver outra revisão."""
+        meta_remota = self._meta_remota(service, file_id)
+        revisao = self._revisao(meta_remota)
+
+        with self._trava:
+            meta_local = self._meta_local(file_id)
+            if meta_local and self._revisao(meta_local) == revisao:
+                try:
+                    with open(self._caminho_bytes(file_id), "rb") as f:
+                        logger.info(f"Planilha {file_id} servida do cache local (revisão {revisao}).")
+                        return f.read(), revisao
+                except FileNotFoundError:
+                    pass
+
+        conteudo = self._baixar(service, file_id)
+        with self._trava:
+            self._gravar_local(file_id, conteudo, meta_remota)
+        logger.info(f"Planilha {file_id} baixada do Drive ({len(conteudo)} bytes, revisão {revisao}).")
+        return conteudo, revisao
+
+    def ler_dataframe(self, service, file_id: str) -> "pd.DataFrame":
+        """
+        Devolve a planilha como DataFrame, reaproveitando o já lido se a revisão não mudou.
+        O DataFrame é compartilhado: quem precisar alterá-lo deve trabalhar numa cópia.
+        """
+        conteudo, revisao = self.ler_bytes(service, file_id)
+        with self._trava:
+            em_memoria = self._dataframes.get(file_id)
+            if em_memoria and em_memoria[0] == revisao:
+                self._dataframes.move_to_end(file_id)
+                return em_memoria[1]
+
+        import pandas as pd
+
+        df = pd.read_excel(BytesIO(conteudo), engine="openpyxl")
+        self._guardar_dataframe(file_id, revisao, df)
+        return df
+
+    def _guardar_dataframe(self, file_id: str, revisao: str, df: "pd.DataFrame | None"):
+        with self._trava:
+            if df is None:
+                self._dataframes.pop(file_id, None)
+                return
+            self._dataframes[file_id] = (revisao, df)
+            self._dataframes.move_to_end(file_id)
+            while len(self._dataframes) > self.max_dataframes:
+                self._dataframes.popitem(last=False)
+
+    # --- Atualização após upload ---
+
+    def registrar_upload(self, file_id: str, conteudo: bytes, resposta_drive: dict, df: "pd.DataFrame | None" = None):
+        """
+        Guarda o que acabamos de enviar como a revisão atual do arquivo.
+        `resposta_drive` é o retorno de `files().update(..., fields=CAMPOS_REVISAO)`.
+        """
+        if not resposta_drive.get("md5Checksum") and not resposta_drive.get("headRevisionId"):
+            # Sem a revisão nova não há como validar o cache depois; melhor descartá-lo.
+            self.invalidar(file_id)
+            return
+        with self._trava:
+            self._gravar_local(file_id, conteudo, {k: resposta_drive.get(k) for k in CAMPOS_REVISAO.split(",")})
+        self._guardar_dataframe(file_id, self._revisao(resposta_drive), df)
+
+    def invalidar(self, file_id: str):
+        with self._trava:
+            self._dataframes.pop(file_id, None)
+            for caminho in (self._caminho_meta(file_id), self._caminho_bytes(file_id)):
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+
+
+cache = CachePlanilhas()
@@ -0,0 +1,74 @@
+import base64
+import hashlib
+import logging
+import threading
+from typing import Callable, Iterable
+
+import catalogo
+
+logger = logging.getLogger(__name__)
+
+# O Telegram aceita no máximo 64 bytes em callback_data. Em vez do nome da opção
+# (órgão, assunto, colaborador), o botão leva `<prefixo>#<id>`, com um id curto
+# derivado do nome normalizado; o nome de volta sai deste registro no servidor.
+MARCADOR = "#"
+TAMANHO_ID = 8  # caracteres base64url (48 bits)
+
+_trava = threading.Lock()
+_opcoes: dict[str, str] = {}
+_fontes: list[Callable[[], Iterable[str]]] = []
+
+
+def id_opcao(nome: str) -> str:
+    """Id estável da opção: o mesmo nome dá o mesmo id em qualquer versão do catálogo e após reinícios."""
+    resumo = hashlib.blake2b(catalogo.normalizar(nome).encode("utf-8"), digest_size=6).digest()
+    return base64.urlsafe_b64encode(resumo).decode("ascii")[:TAMANHO_ID]
+
+
+def _registrar(nome: str) -> str:
+    chave = id_opcao(nome)
+    atual = _opcoes.get(chave)
+    if atual is None:
+        _opcoes[chave] = nome
+    elif atual != nome and catalogo.normalizar(atual) != catalogo.normalizar(nome):
+        logger.error(f"Colisão de id de callback entre '{atual}' e '{nome}'; mantendo '{atual}'.")
+    return chave
+
+
+def registrar_fonte(fonte: Callable[[], Iterable[str]]):
+    """
+    Lista de onde saem opções de botões (ex.: `catalogo.orgaos.itens`). Depois de um
+    reinício, botões antigos trazem ids que ainda não estão no registro; as fontes são
+    relidas para reconstruí-lo.
+    """
+    with _trava:
+        _fontes.append(fonte)
+
+
+def codificar(prefixo: str, nome: str) -> str:
+    with _trava:
+        return f"{prefixo}{MARCADOR}{_registrar(nome)}"
+
+
+def decodificar(data: str, prefixo: str) -> str | None:
+    """
+    Nome da opção em `data` (gerado por `codificar` com o mesmo prefixo). Botões antigos,
+    com o nome direto no callback_data, continuam funcionando. None se o id for desconhecido.
+    """
+    if not data.startswith(prefixo):
+        return None
+    resto = data[len(prefixo):]
+    if not resto.startswith(MARCADOR):
+        return resto
+    chave = resto[len(MARCADOR):]
+
+    with _trava:
+        nome = _opcoes.get(chave)
+        if nome is None:
+            for fonte in _fontes:
+                for item in fonte():
+                    _registrar(item)
+            nome = _opcoes.get(chave)
+    if nome is None:
+        logger.warning(f"Id de opção desconhecido no callback '{data}'.")
+    return nome
@@ -0,0 +1,132 @@
+import csv
+import logging
+import os
+import threading
+import unicodedata
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar(texto: str) -> str:
+    """Forma canônica para comparar nomes: sem acentos, minúsculas e espaços simples."""
+    if not texto.isascii():
+        # NFKD separa letra e acento; o encode descarta os acentos (e o que não tiver forma ASCII).
+        texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return " ".join(texto.split()).casefold()
+
+
+class Catalogo:
+    """
+    Lista de um CSV de uma coluna (órgãos, assuntos) mantida em memória para o processo todo.
+
+    O arquivo é lido uma vez e só relido quando o mtime/tamanho muda (edição manual no
+    servidor); as nossas próprias inclusões atualizam a memória na hora. Um conjunto de
+    nomes normalizados responde "já existe?" em O(1). `versao` muda a cada alteração,
+    para quem guarda algo derivado da lista (índices de busca, teclados) saber quando refazer.
+    """
+
+    def __init__(self, caminho: str, coluna: str):
+        self.caminho = caminho
+        self.coluna = coluna
+        self.versao = 0
+        self._trava = threading.Lock()
+        self._itens: tuple[str, ...] = ()
+        self._normalizados: set[str] = set()
+        self._assinatura: tuple[int, int] | None = None
+        self._ouvintes = []
+
+    def _assinatura_arquivo(self) -> tuple[int, int] | None:
+        try:
+            info = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def _atualizar(self):
+        assinatura = self._assinatura_arquivo()
+        if assinatura == self._assinatura and self.versao:
+            return
+        itens, vistos = [], set()
+        if assinatura is None:
+            logger.warning(f"CSV não encontrado em {self.caminho}. Usando uma lista vazia.")
+        else:
+            with open(self.caminho, newline="", encoding="utf-8") as f:
+                leitor = csv.reader(f)
+                cabecalho = next(leitor, None)
+                indice = cabecalho.index(self.coluna) if cabecalho and self.coluna in cabecalho else 0
+                for linha in leitor:
+                    if len(linha) <= indice or not linha[indice].strip():
+                        continue
+                    nome = linha[indice].strip()
+                    normalizado = normalizar(nome)
+                    if normalizado not in vistos:
+                        vistos.add(normalizado)
+                        itens.append(nome)
+        self._itens = tuple(itens)
+        self._normalizados = vistos
+        self._assinatura = assinatura
+        self.versao += 1
+        logger.info(f"Catálogo '{os.path.basename(self.caminho)}' carregado: {len(itens)} item(ns).")
+
+    def versao_atual(self) -> int:
+        """`versao` depois de conferir o arquivo (só um stat se nada mudou)."""
+        with self._trava:
+            self._atualizar()
+            return self.versao
+
+    def itens(self) -> tuple[str, ...]:
+        with self._trava:
+            self._atualizar()
+            return self._itens
+
+    def contem(self, nome: str) -> bool:
+        with self._trava:
+            self._atualizar()
+            return normalizar(nome) in self._normalizados
+
+    def adicionar(self, nome: str) -> bool:
+        """Inclui `nome` no CSV e na memória se ainda não existir. Devolve True se incluiu."""
+        nome = nome.strip()
+        if not nome:
+            return False
+        with self._trava:
+            self._atualizar()
+            if normalizar(nome) in self._normalizados:
+                return False
+
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            novo = self._assinatura is None or not self._assinatura[1]
+            prefixo = ""
+            if not novo:
+                # Arquivo editado à mão pode terminar sem quebra de linha.
+                with open(self.caminho, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        prefixo = "\n"
+            with open(self.caminho, mode="a", newline="", encoding="utf-8") as f:
+                f.write(prefixo)
+                escritor = csv.writer(f, lineterminator="\n")
+                if novo:
+                    escritor.writerow([self.coluna])
+                escritor.writerow([nome])
+
+            self._itens = self._itens + (nome,)
+            self._normalizados.add(normalizar(nome))
+            self._assinatura = self._assinatura_arquivo()
+            self.versao += 1
+            ouvintes = list(self._ouvintes)
+
+        for ouvinte in ouvintes:
+            ouvinte(nome)
+        return True
+
+    def ao_adicionar(self, ouvinte):
+        """Registra `ouvinte(nome)`, chamado depois de cada inclusão feita por `adicionar`."""
+        with self._trava:
+            self._ouvintes.append(ouvinte)
+
+
+orgaos = Catalogo(config.CSV_ORGAOS, "nome")
+assuntos = Catalogo(config.CSV_ASSUNTOS, "assunto")
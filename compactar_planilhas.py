@@ -0,0 +1,119 @@
+"""
+Monta, fora do fluxo do bot, as planilhas consolidadas com todos os meses.
+
+Só faz sentido com PARTICIONAR_PLANILHAS=1 (desligado por padrão): aí o bot grava em
+REUNIAO_PP_AAAA-MM.xlsx / DEMANDAS_PP_AAAA-MM.xlsx (e em REUNIAO_PP_SEM-DATA.xlsx os
+registros sem data legível). Este comando junta o histórico anterior ao particionamento
+(REUNIAO_PP.xlsx, que fica congelado) com todas as partições e envia o resultado para
+REUNIAO_PP_TOTAL.xlsx.
+
+Uso:
+    python compactar_planilhas.py                       # as duas planilhas
+    python compactar_planilhas.py --planilha REUNIAO_PP.xlsx
+"""
+import argparse
+import logging
+import os
+import re
+from io import BytesIO
+
+import pandas as pd
+from dotenv import load_dotenv
+from googleapiclient.http import MediaIoBaseUpload
+
+import cache_planilhas
+import drive_cliente
+import utils
+
+logger = logging.getLogger(__name__)
+
+
+def nome_consolidado(planilha: str) -> str:
+    base, extensao = os.path.splitext(planilha)
+    return f"{base}_TOTAL{extensao}"
+
+
+def listar_particoes(service, planilha: str, folder_id: str | None) -> list[tuple[str, str]]:
+    """(nome, id) das partições da planilha, em ordem cronológica (a sem data por último)."""
+    base, extensao = os.path.splitext(planilha)
+    padrao = re.compile(
+        rf"^{re.escape(base)}_(\d{{4}}-\d{{2}}|{re.escape(utils.PARTICAO_SEM_DATA)}){re.escape(extensao)}$"
+    )
+    query = f"name contains '{base}_' and trashed=false"
+    if folder_id:
+        query += f" and '{folder_id}' in parents"
+
+    particoes = []
+    page_token = None
+    while True:
+        resposta = service.files().list(
+            q=query, fields="nextPageToken, files(id, name)", pageToken=page_token
+        ).execute()
+        particoes += [(f["name"], f["id"]) for f in resposta.get("files", []) if padrao.match(f["name"])]
+        page_token = resposta.get("nextPageToken")
+        if not page_token:
+            break
+    return sorted(particoes)
+
+
+def compactar(planilha: str, folder_id: str | None):
+    colunas = utils.COLUNAS_PLANILHAS[planilha]
+    destino = nome_consolidado(planilha)
+
+    with drive_cliente.servico_drive() as service:
+        partes = []
+        historico_id = drive_cliente.obter_id_arquivo(service, planilha, folder_id)
+        if historico_id:
+            partes.append((planilha, historico_id))
+        partes += listar_particoes(service, planilha, folder_id)
+        if not partes:
+            logger.warning(f"Nada para consolidar em '{planilha}'.")
+            return
+
+        dataframes = []
+        for nome, file_id in partes:
+            conteudo, _ = cache_planilhas.cache.ler_bytes(service, file_id)
+            df = pd.read_excel(BytesIO(conteudo), engine="openpyxl")
+            logger.info(f"'{nome}': {len(df)} registro(s).")
+            dataframes.append(df)
+
+        df_total = pd.concat(dataframes, ignore_index=True)
+        extras = [c for c in df_total.columns if c not in colunas]
+        df_total = df_total.reindex(columns=colunas + extras)
+
+        buffer = BytesIO()
+        df_total.to_excel(buffer, index=False, engine="openpyxl")
+        media_body = MediaIoBaseUpload(
+            BytesIO(buffer.getvalue()),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            resumable=True
+        )
+
+        destino_id = drive_cliente.obter_id_arquivo(service, destino, folder_id)
+        if destino_id:
+            service.files().update(fileId=destino_id, media_body=media_body).execute()
+        else:
+            metadata = {'name': destino}
+            if folder_id:
+                metadata['parents'] = [folder_id]
+            service.files().create(body=metadata, media_body=media_body, fields='id').execute()
+
+    logger.info(f"'{destino}' atualizada com {len(df_total)} registro(s) de {len(partes)} arquivo(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--planilha", choices=list(utils.COLUNAS_PLANILHAS), action="append",
+                        help="planilha a consolidar (padrão: todas)")
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rail.env'))
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    folder_id = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
+    for planilha in args.planilha or list(utils.COLUNAS_PLANILHAS):
+        compactar(planilha, folder_id)
+
+
+if __name__ == "__main__":
+    main()
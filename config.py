@@ -9,8 +9,79 @@ CSV_ORGAOS = os.path.join(CAMINHO_BASE, "listas", "orgaos.csv")
 CSV_PATH = os.path.join(CAMINHO_BASE, "data")
 FOTO_PATH = os.path.join(CAMINHO_BASE, "fotos")
 CSV_ASSUNTOS = os.path.join(CAMINHO_BASE, "listas", "assuntos.csv")
+CSV_MUNICIPIOS = os.path.join(CAMINHO_BASE, "listas", "municipios.csv")  # código IBGE, nome, UF
 CSV_REGISTRO = os.path.join(CAMINHO_BASE, "data", "registros.csv")
 PAGINACAO_TAMANHO = 5
+
+# Fila de exportação para o Google Drive (processada fora do event loop)
+# Os registros vão primeiro para o diário local e são enviados em lotes: a cada
+# EXPORT_FLUSH_INTERVALO segundos ou assim que houver EXPORT_LOTE_MAXIMO pendentes.
+DIARIO_EXPORTACAO_PATH = os.path.join(CSV_PATH, "diario_exportacao.jsonl")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_FLUSH_INTERVALO = float(os.getenv("EXPORT_FLUSH_INTERVALO", "15"))
+EXPORT_LOTE_MAXIMO = int(os.getenv("EXPORT_LOTE_MAXIMO", "20"))
+EXPORT_IDS_LEMBRADOS = int(os.getenv("EXPORT_IDS_LEMBRADOS", "1000"))  # ids concluídos guardados contra reenvio
+EXPORT_IDS_JANELA = float(os.getenv("EXPORT_IDS_JANELA", "604800"))  # segundos (7 dias)
+EXPORT_DIARIO_COMPACTAR_EVENTOS = int(os.getenv("EXPORT_DIARIO_COMPACTAR_EVENTOS", "500"))
+# Lote que falha volta com espera exponencial (EXPORT_BACKOFF_BASE, dobrando até
+# EXPORT_BACKOFF_MAXIMO segundos); depois de EXPORT_TENTATIVAS_MAXIMAS o registro sai da
+# fila e vai para EXPORT_FALHAS_PATH, para reenvio manual.
+EXPORT_BACKOFF_BASE = float(os.getenv("EXPORT_BACKOFF_BASE", "30"))
+EXPORT_BACKOFF_MAXIMO = float(os.getenv("EXPORT_BACKOFF_MAXIMO", "1800"))
+EXPORT_TENTATIVAS_MAXIMAS = int(os.getenv("EXPORT_TENTATIVAS_MAXIMAS", "10"))
+EXPORT_FALHAS_PATH = os.path.join(CSV_PATH, "exportacao_falhas.jsonl")
+
+# Webhook: responde ao Telegram na hora e processa os updates em workers (um chat
+# sempre no mesmo worker). Acima de WEBHOOK_FILA_MAXIMA por worker, responde 503.
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_FILA_MAXIMA = int(os.getenv("WEBHOOK_FILA_MAXIMA", "100"))
+WEBHOOK_ESPERA_ENCERRAMENTO = float(os.getenv("WEBHOOK_ESPERA_ENCERRAMENTO", "10"))  # segundos
+# update_ids já aceitos, para ignorar reenvios (o Telegram reenvia por até 24h)
+WEBHOOK_VISTOS_MAXIMO = int(os.getenv("WEBHOOK_VISTOS_MAXIMO", "10000"))
+WEBHOOK_VISTOS_JANELA = float(os.getenv("WEBHOOK_VISTOS_JANELA", "86400"))  # segundos
+
+# Orçamento de partida (cold start do Render). `python perfil_inicializacao.py` confere o
+# tempo de `import main`; o bot avisa no log se a partida inteira passar do orçamento.
+IMPORTACAO_ORCAMENTO_MS = float(os.getenv("IMPORTACAO_ORCAMENTO_MS", "1500"))
+INICIALIZACAO_ORCAMENTO_S = float(os.getenv("INICIALIZACAO_ORCAMENTO_S", "5"))
+
+# Opcional: com "1" os registros vão para planilhas mensais (REUNIAO_PP_2026-10.xlsx) e
+# REUNIAO_PP.xlsx / DEMANDAS_PP.xlsx deixam de ser atualizadas; a planilha com todos os
+# meses passa a ser montada offline com `python compactar_planilhas.py`.
+PARTICIONAR_PLANILHAS = os.getenv("PARTICIONAR_PLANILHAS", "0") == "1"
+
+# Cópias locais das planilhas do Drive, validadas pela revisão do arquivo
+CACHE_PLANILHAS_PATH = os.path.join(CSV_PATH, "cache_planilhas")
+INDICE_FOTOS_PATH = os.path.join(CSV_PATH, "indice_fotos.jsonl")
+USO_ASSUNTOS_PATH = os.path.join(CSV_PATH, "uso_assuntos.json")
+USO_ORGAOS_PATH = os.path.join(CSV_PATH, "uso_orgaos.json")
+
+# Conversas em andamento e user_data, para sobreviver a reinícios (gravados a cada PERSISTENCIA_INTERVALO s)
+PERSISTENCIA_PATH = os.path.join(CSV_PATH, "conversas.sqlite3")
+PERSISTENCIA_INTERVALO = float(os.getenv("PERSISTENCIA_INTERVALO", "30"))
+
+# Pool de clientes do Google Drive (um transporte HTTP por cliente)
+DRIVE_POOL_TAMANHO = int(os.getenv("DRIVE_POOL_TAMANHO", "4"))
+DRIVE_HTTP_TIMEOUT = int(os.getenv("DRIVE_HTTP_TIMEOUT", "60"))
+DRIVE_CACHE_ID_TTL = float(os.getenv("DRIVE_CACHE_ID_TTL", "3600"))
+DRIVE_TENTATIVAS_CONFLITO = int(os.getenv("DRIVE_TENTATIVAS_CONFLITO", "3"))
+DRIVE_TAXA_LEITURA = float(os.getenv("DRIVE_TAXA_LEITURA", "10"))  # chamadas/s
+DRIVE_TAXA_ESCRITA = float(os.getenv("DRIVE_TAXA_ESCRITA", "3"))  # chamadas/s
+DRIVE_RAJADA = float(os.getenv("DRIVE_RAJADA", "10"))
+DRIVE_TENTATIVAS = int(os.getenv("DRIVE_TENTATIVAS", "6"))
+DRIVE_BACKOFF_BASE = float(os.getenv("DRIVE_BACKOFF_BASE", "1"))
+DRIVE_BACKOFF_MAXIMO = float(os.getenv("DRIVE_BACKOFF_MAXIMO", "64"))
+FOTO_UPLOADS_SIMULTANEOS = int(os.getenv("FOTO_UPLOADS_SIMULTANEOS", "3"))
+FOTO_TAMANHO_PARTE_KB = int(os.getenv("FOTO_TAMANHO_PARTE_KB", "1024"))  # múltiplo de 256
+FOTO_ESPERA_CONFIRMACAO = float(os.getenv("FOTO_ESPERA_CONFIRMACAO", "60"))
+FOTO_PROCESSAR = os.getenv("FOTO_PROCESSAR", "0") == "1"  # reduz/recomprime antes do upload (via arquivo temporário)
+FOTO_LADO_MAXIMO = int(os.getenv("FOTO_LADO_MAXIMO", "1600"))  # pixels
+FOTO_QUALIDADE_JPEG = int(os.getenv("FOTO_QUALIDADE_JPEG", "80"))
+FOTO_PROCESSOS = int(os.getenv("FOTO_PROCESSOS", "2"))
+
+# Resultados de busca compartilhados entre as conversas (consultas distintas guardadas por índice)
+BUSCA_RESULTADOS_MAX = int(os.getenv("BUSCA_RESULTADOS_MAX", "256"))
+TECLADOS_CACHE_MAX = int(os.getenv("TECLADOS_CACHE_MAX", "1024"))  # páginas de teclado prontas
 COLABORADORES = ["Orlando Sena Campos Junior", "Derielle Valeriotte Alvarenga", "Ricardo Augusto Sepulveda Filho", "Vania Caldeira De Azevedo Xible", "Danilo Candido De Sa Comarella"]
 
 def escrever_permissao(path):
@@ -28,17 +99,20 @@ def escrever_permissao(path):
         except Exception as e:
             print(f"erro ao olhar a permissão/dar permissão {path}: {e}")
 
-    # Ensure permissions for data and fotos
-escrever_permissao(CSV_PATH)
-escrever_permissao(FOTO_PATH)
 
+# Pastas e teste de escrita: feitos no início do bot (main/bot chamam inicializar()),
+# e não ao importar este módulo, para não pesar em quem só lê a configuração.
+def inicializar():
+    # Ensure permissions for data and fotos
+    escrever_permissao(CSV_PATH)
+    escrever_permissao(FOTO_PATH)
 
-# Ensure directories exist (this is VERY important)
-os.makedirs(os.path.dirname(CSV_ORGAOS), exist_ok=True)
-os.makedirs(CSV_PATH, exist_ok=True)
-os.makedirs(FOTO_PATH, exist_ok=True)
-os.makedirs(os.path.dirname(CSV_ASSUNTOS), exist_ok=True)
-os.makedirs(os.path.dirname(CSV_REGISTRO), exist_ok=True)
+    # Ensure directories exist (this is VERY important)
+    os.makedirs(os.path.dirname(CSV_ORGAOS), exist_ok=True)
+    os.makedirs(CSV_PATH, exist_ok=True)
+    os.makedirs(FOTO_PATH, exist_ok=True)
+    os.makedirs(os.path.dirname(CSV_ASSUNTOS), exist_ok=True)
+    os.makedirs(os.path.dirname(CSV_REGISTRO), exist_ok=True)
 
 PREDEFINED_ASSUNTOS = [
     "Qualidade De Fornecimento",
@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def novo_registro_id() -> str:
+    return f"{datetime.now():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:8]}"
+
+
+class DiarioExportacao:
+    """
+    Diário local (JSON lines, só anexação) das ocorrências confirmadas.
+
+    Toda ocorrência é gravada aqui antes de qualquer chamada ao Drive. Cada linha é
+    um evento:
+      {"tipo": "registro", "id": ..., "chat_id": ..., "dados": {...}}
+      {"tipo": "aplicado", "planilha": "DEMANDAS_PP.xlsx", "ids": [...]}
+      {"tipo": "concluidos", "ids": {id: instante, ...}}
+      {"tipo": "descartado", "ids": [...]}
+    Um registro fica pendente até ter sido aplicado em todas as planilhas ou até ser
+    descartado (`descartar`, que o copia para o arquivo de falhas). O arquivo é compactado
+    quando não sobra nada pendente ou a cada `compactar_apos` eventos: é reescrito só com os
+    registros pendentes (e as planilhas em que já entraram) e os ids concluídos que ainda
+    valem contra reenvio, no máximo `lembrar_concluidos` e de até `janela_concluidos` segundos.
+
+    O id do registro é a chave de idempotência: `registrar` com um id pendente ou
+    concluído há pouco não grava de novo (confirmação tocada duas vezes, callback repetido).
+    """
+
+    def __init__(self, caminho: str = config.DIARIO_EXPORTACAO_PATH, planilhas: tuple[str, ...] = (),
+                 lembrar_concluidos: int = config.EXPORT_IDS_LEMBRADOS,
+                 janela_concluidos: float = config.EXPORT_IDS_JANELA,
+                 compactar_apos: int = config.EXPORT_DIARIO_COMPACTAR_EVENTOS,
+                 caminho_falhas: str = config.EXPORT_FALHAS_PATH):
+        self.caminho = caminho
+        self.planilhas = tuple(planilhas)
+        self.lembrar_concluidos = max(0, lembrar_concluidos)
+        self.janela_concluidos = janela_concluidos
+        self.compactar_apos = max(1, compactar_apos)
+        self.caminho_falhas = caminho_falhas
+        self._trava = threading.Lock()
+        self._registros: dict[str, dict] = {}        # id -> evento "registro" ainda pendente
+        self._aplicados: dict[str, set[str]] = {}    # id -> planilhas já gravadas
+        self._concluidos: OrderedDict[str, float] = OrderedDict()  # id -> instante em que foi concluído
+        self._eventos = 0          # linhas no arquivo
+        self._eventos_base = 0     # linhas logo depois da última compactação
+        self._carregar()
+
+    # --- Leitura do arquivo ---
+
+    def _carregar(self):
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        if not os.path.exists(self.caminho):
+            return
+        with open(self.caminho, encoding="utf-8") as f:
+            for numero, linha in enumerate(f, 1):
+                linha = linha.strip()
+                if not linha:
+                    continue
+                try:
+                    evento = json.loads(linha)
+                except json.JSONDecodeError:
+                    # Uma linha cortada no fim do arquivo (queda no meio da escrita) é ignorada.
+                    logger.warning(f"Linha {numero} do diário de exportação ilegível; ignorada.")
+                    continue
+                self._aplicar_evento(evento)
+                self._eventos += 1
+        self._descartar_concluidos()
+        if self._registros:
+            logger.info(f"Diário de exportação carregado com {len(self._registros)} registro(s) pendente(s).")
+        self._compactar()
+
+    def _aplicar_evento(self, evento: dict):
+        if evento.get("tipo") == "registro":
+            self._registros[evento["id"]] = evento
+            self._aplicados.setdefault(evento["id"], set())
+        elif evento.get("tipo") == "aplicado":
+            for registro_id in evento.get("ids", []):
+                self._aplicados.setdefault(registro_id, set()).add(evento["planilha"])
+        elif evento.get("tipo") == "concluidos":
+            ids = evento.get("ids", [])
+            if isinstance(ids, list):  # formato antigo, sem o instante
+                ids = dict.fromkeys(ids, time.time())
+            self._lembrar(ids.items())
+        elif evento.get("tipo") == "descartado":
+            for registro_id in evento.get("ids", []):
+                self._registros.pop(registro_id, None)
+                self._aplicados.pop(registro_id, None)
+
+    def _lembrar(self, ids_instantes):
+        for registro_id, instante in ids_instantes:
+            self._concluidos[registro_id] = instante
+            self._concluidos.move_to_end(registro_id)
+        limite = time.time() - self.janela_concluidos
+        while self._concluidos and (
+            len(self._concluidos) > self.lembrar_concluidos or next(iter(self._concluidos.values())) < limite
+        ):
+            self._concluidos.popitem(last=False)
+
+    def _concluido(self, registro_id: str) -> bool:
+        return all(p in self._aplicados.get(registro_id, ()) for p in self.planilhas)
+
+    def _descartar_concluidos(self) -> list[dict]:
+        concluidos = [r for rid, r in self._registros.items() if self._concluido(rid)]
+        for registro in concluidos:
+            del self._registros[registro["id"]]
+            self._aplicados.pop(registro["id"], None)
+        agora = time.time()
+        self._lembrar((r["id"], agora) for r in concluidos)
+        return concluidos
+
+    # --- Escrita ---
+
+    def _anexar(self, evento: dict):
+        with open(self.caminho, "a", encoding="utf-8") as f:
+            f.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._eventos += 1
+
+    def _compactar_se_preciso(self):
+        if not self._registros or self._eventos - self._eventos_base >= self.compactar_apos:
+            self._compactar()
+
+    def registrar(self, dados: dict, chat_id: int | None, registro_id: str | None = None) -> tuple[str, bool]:
+        """
+        Grava a ocorrência no diário. Devolve o id do registro e se ele é novo; um id já
+        pendente ou concluído não é gravado outra vez.
+        """
+        registro_id = registro_id or novo_registro_id()
+        evento = {"tipo": "registro", "id": registro_id, "chat_id": chat_id, "dados": dados}
+        with self._trava:
+            if registro_id in self._registros or registro_id in self._concluidos:
+                return registro_id, False
+            self._anexar(evento)
+            self._aplicar_evento(evento)
+            self._compactar_se_preciso()
+        return registro_id, True
+
+    def marcar_aplicados(self, planilha: str, ids: list[str]) -> list[dict]:
+        """
+        Registra que `ids` já estão na `planilha`. Devolve os registros que ficaram
+        completos (gravados em todas as planilhas) com essa marcação.
+        """
+        with self._trava:
+            # Concluído ou descartado enquanto a outra planilha gravava: nada a marcar.
+            ids = [i for i in ids if i in self._registros]
+            if not ids:
+                return []
+            self._anexar({"tipo": "aplicado", "planilha": planilha, "ids": ids})
+            for registro_id in ids:
+                self._aplicados.setdefault(registro_id, set()).add(planilha)
+            concluidos = self._descartar_concluidos()
+            self._compactar_se_preciso()
+        return concluidos
+
+    def descartar(self, ids: list[str], motivo: str):
+        """
+        Tira `ids` das pendências (desistência depois de muitas falhas). Cada registro é
+        copiado antes para o arquivo de falhas, com as planilhas em que já tinha entrado,
+        para ser reenviado à mão.
+        """
+        with self._trava:
+            registros = [self._registros[i] for i in ids if i in self._registros]
+            if not registros:
+                return
+            os.makedirs(os.path.dirname(self.caminho_falhas) or ".", exist_ok=True)
+            with open(self.caminho_falhas, "a", encoding="utf-8") as f:
+                for registro in registros:
+                    falha = {
+                        **registro,
+                        "aplicado_em": sorted(self._aplicados.get(registro["id"], ())),
+                        "motivo": motivo,
+                        "descartado": datetime.now().isoformat(timespec="seconds"),
+                    }
+                    f.write(json.dumps(falha, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            evento = {"tipo": "descartado", "ids": [r["id"] for r in registros]}
+            self._anexar(evento)
+            self._aplicar_evento(evento)
+            self._compactar_se_preciso()
+
+    def _compactar(self):
+        # Do histórico só interessam as pendências (com o que já foi aplicado delas) e os
+        # ids concluídos recentes (contra reenvios); o resto é descartado.
+        self._lembrar(())
+        eventos = []
+        if self._concluidos:
+            eventos.append({"tipo": "concluidos", "ids": dict(self._concluidos)})
+        eventos += self._registros.values()
+        for planilha in self.planilhas:
+            ids = [i for i in self._registros if planilha in self._aplicados.get(i, ())]
+            if ids:
+                eventos.append({"tipo": "aplicado", "planilha": planilha, "ids": ids})
+
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            for evento in eventos:
+                f.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+        self._eventos = self._eventos_base = len(eventos)
+
+    # --- Consulta ---
+
+    def pendentes(self) -> list[dict]:
+        """Registros ainda não gravados em todas as planilhas, na ordem de chegada."""
+        with self._trava:
+            return list(self._registros.values())
+
+    def falta_aplicar(self, registro_id: str, planilha: str) -> bool:
+        """
+        Se o registro ainda precisa ir para `planilha`. Falso para registros que já não
+        estão pendentes (concluídos ou descartados), mesmo que a outra planilha os tenha
+        fechado no meio de um lote.
+        """
+        with self._trava:
+            return registro_id in self._registros and planilha not in self._aplicados.get(registro_id, ())
+
+    def planilhas_aplicadas(self, registro_id: str) -> set[str]:
+        with self._trava:
+            return set(self._aplicados.get(registro_id, ()))
+
+    def __len__(self):
+        with self._trava:
+            return len(self._registros)
@@ -3,11 +3,7 @@ import pickle
 from io import BytesIO
 import logging
 
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from google.auth.transport.requests import Request
-import pandas as pd
+import drive_cliente
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,6 +11,9 @@ logger = logging.getLogger(__name__)
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
 def autenticar():
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
     if os.path.exists('token.pickle'):
         with open('token.pickle', 'rb') as token:
@@ -30,9 +29,18 @@ def autenticar():
     logger.info("Autenticado com sucesso no Google Drive")
     return creds
 
-def upload_excel_para_drive(nome_arquivo: str, df: pd.DataFrame, pasta_id: str = None):
-    creds = autenticar()
-    service = build('drive', 'v3', credentials=creds)
+# Pool próprio porque aqui as credenciais são OAuth do usuário (token.pickle),
+# não a conta de serviço usada pelo bot. Criado no primeiro upload.
+_pool: drive_cliente.PoolDrive | None = None
+
+def _pool_drive() -> drive_cliente.PoolDrive:
+    global _pool
+    if _pool is None:
+        _pool = drive_cliente.PoolDrive(autenticar, tamanho=1)
+    return _pool
+
+def upload_excel_para_drive(nome_arquivo: str, df: "pd.DataFrame", pasta_id: str = None):
+    from googleapiclient.http import MediaIoBaseUpload
 
     buffer = BytesIO()
     df.to_excel(buffer, index=False, engine='openpyxl')
@@ -45,7 +53,8 @@ def upload_excel_para_drive(nome_arquivo: str, df: pd.DataFrame, pasta_id: str =
     media = MediaIoBaseUpload(buffer, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', resumable=True)
 
     try:
-        arquivo = service.files().create(body=metadata, media_body=media, fields='id').execute()
+        with _pool_drive().servico() as service:
+            arquivo = service.files().create(body=metadata, media_body=media, fields='id').execute()
         logger.info(f"Arquivo '{nome_arquivo}' enviado para o Drive com ID: {arquivo.get('id')}")
         return arquivo.get('id')
     except Exception as e:
@@ -53,6 +62,8 @@ def upload_excel_para_drive(nome_arquivo: str, df: pd.DataFrame, pasta_id: str =
         return None
 
 if __name__ == '__main__':
+    import pandas as pd
+
     # Teste rápido
     df_teste = pd.DataFrame({'Teste':[1,2,3]})
     upload_excel_para_drive('teste_bot.xlsx', df_teste)
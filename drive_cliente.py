@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import agendador_drive
+import config
+
+logger = logging.getLogger(__name__)
+
+SCOPES_DRIVE = ['https://www.googleapis.com/auth/drive']
+
+# --- DOCUMENTO DE DESCOBERTA (ESTÁTICO) ---
+# O googleapiclient traz o documento de descoberta do Drive v3 junto com o pacote.
+# Lemos e decodificamos uma única vez; `build_from_document` aceita o dict pronto.
+
+_documento_drive: dict | None = None
+_trava_documento = threading.Lock()
+
+def documento_drive() -> dict:
+    global _documento_drive
+    with _trava_documento:
+        if _documento_drive is None:
+            from googleapiclient import discovery_cache
+
+            conteudo = discovery_cache.get_static_doc("drive", "v3")
+            if conteudo is None:
+                raise RuntimeError("Documento de descoberta estático do Drive v3 não encontrado no googleapiclient.")
+            _documento_drive = json.loads(conteudo)
+        return _documento_drive
+
+# --- CREDENCIAIS DA CONTA DE SERVIÇO (EM CACHE) ---
+
+_credenciais = None
+_trava_credenciais = threading.Lock()
+
+def credenciais_service_account():
+    """Lê GOOGLE_CREDENTIALS_JSON uma vez só; o token é renovado pelo próprio transporte."""
+    global _credenciais
+    with _trava_credenciais:
+        if _credenciais is None:
+            creds_json = os.environ.get("GOOGLE_CREDENTIALS_JSON")
+            if not creds_json:
+                raise ValueError("GOOGLE_CREDENTIALS_JSON não está configurada nas variáveis de ambiente.")
+            from google.oauth2 import service_account
+
+            _credenciais = service_account.Credentials.from_service_account_info(
+                json.loads(creds_json),
+                scopes=SCOPES_DRIVE
+            )
+            logger.info("Credenciais do Google Drive carregadas.")
+        return _credenciais
+
+def token_acesso() -> str:
+    """Token OAuth válido da conta de serviço, para chamadas HTTP feitas fora do googleapiclient."""
+    credenciais = credenciais_service_account()
+    with _trava_credenciais:
+        if not credenciais.valid:
+            import google_auth_httplib2
+            import httplib2
+
+            credenciais.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=config.DRIVE_HTTP_TIMEOUT)))
+        return credenciais.token
+
+# --- POOL DE CLIENTES ---
+
+class PoolDrive:
+    """
+    Pool de clientes do Drive v3, cada um com o seu próprio transporte HTTP autenticado.
+    Todas as requisições feitas com eles passam pelo `agendador_drive` (ritmo e retentativas).
+
+    O httplib2.Http não é thread-safe, então cada thread empresta um cliente inteiro
+    (serviço + transporte) e o devolve ao terminar. Os clientes são criados sob
+    demanda até `tamanho` e reaproveitados depois, mantendo as conexões TLS abertas.
+    """
+
+    def __init__(self, obter_credenciais, tamanho: int = config.DRIVE_POOL_TAMANHO):
+        self._obter_credenciais = obter_credenciais
+        self.tamanho = max(1, tamanho)
+        self._livres: queue.LifoQueue = queue.LifoQueue()
+        self._criados = 0
+        self._trava = threading.Lock()
+
+    def _novo_servico(self):
+        # Importados aqui: o googleapiclient pesa na partida e só é preciso no primeiro cliente.
+        import google_auth_httplib2
+        import httplib2
+        from googleapiclient.discovery import build_from_document
+
+        http = google_auth_httplib2.AuthorizedHttp(
+            self._obter_credenciais(),
+            http=httplib2.Http(timeout=config.DRIVE_HTTP_TIMEOUT)
+        )
+        service = build_from_document(
+            documento_drive(), http=http, requestBuilder=agendador_drive.classe_requisicao()
+        )
+        logger.info(f"Novo cliente do Google Drive criado ({self._criados}/{self.tamanho} no pool).")
+        return service
+
+    def _emprestar(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._trava:
+            criar = self._criados < self.tamanho
+            if criar:
+                self._criados += 1
+        if not criar:
+            # Pool cheio: espera algum cliente ser devolvido.
+            return self._livres.get()
+        try:
+            return self._novo_servico()
+        except Exception:
+            with self._trava:
+                self._criados -= 1
+            raise
+
+    @contextmanager
+    def servico(self):
+        service = self._emprestar()
+        try:
+            yield service
+        finally:
+            self._livres.put(service)
+
+
+pool = PoolDrive(credenciais_service_account)
+
+def servico_drive():
+    """Uso: `with drive_cliente.servico_drive() as service: ...`"""
+    return pool.servico()
+
+
+# --- CACHE NOME → ID DE ARQUIVO ---
+
+def erro_nao_encontrado(erro: Exception) -> bool:
+    from googleapiclient.errors import HttpError
+
+    return isinstance(erro, HttpError) and getattr(erro.resp, "status", None) == 404
+
+class CacheIdsArquivos:
+    """
+    Guarda o ID dos arquivos do Drive por (nome, pasta) durante `ttl` segundos,
+    poupando a consulta `files().list` antes de cada leitura/escrita. Quem receber
+    um 404 usando um ID do cache deve chamar `invalidar` e consultar de novo.
+    """
+
+    def __init__(self, ttl: float = config.DRIVE_CACHE_ID_TTL):
+        self.ttl = ttl
+        self._ids: dict[tuple[str, str | None], tuple[str, float]] = {}
+        self._trava = threading.Lock()
+
+    def obter(self, service, nome: str, pasta_id: str | None = None) -> str | None:
+        chave = (nome, pasta_id)
+        with self._trava:
+            em_cache = self._ids.get(chave)
+            if em_cache and em_cache[1] > time.monotonic():
+                return em_cache[0]
+
+        query = f"name='{nome}' and trashed=false"
+        if pasta_id:
+            query += f" and '{pasta_id}' in parents"
+        files = service.files().list(q=query, fields="files(id)").execute().get("files", [])
+        if not files:
+            # Arquivo inexistente não entra no cache: pode ser criado a qualquer momento.
+            return None
+
+        file_id = files[0]["id"]
+        with self._trava:
+            self._ids[chave] = (file_id, time.monotonic() + self.ttl)
+        return file_id
+
+    def registrar(self, nome: str, pasta_id: str | None, file_id: str):
+        """Para arquivos que nós mesmos acabamos de criar."""
+        with self._trava:
+            self._ids[(nome, pasta_id)] = (file_id, time.monotonic() + self.ttl)
+
+    def invalidar(self, nome: str, pasta_id: str | None = None):
+        with self._trava:
+            self._ids.pop((nome, pasta_id), None)
+
+
+ids_arquivos = CacheIdsArquivos()
+
+def obter_id_arquivo(service, nome: str, pasta_id: str | None = None) -> str | None:
+    return ids_arquivos.obter(service, nome, pasta_id)
+
+def registrar_id_arquivo(nome: str, pasta_id: str | None, file_id: str):
+    ids_arquivos.registrar(nome, pasta_id, file_id)
+
+def invalidar_id_arquivo(nome: str, pasta_id: str | None = None):
+    ids_arquivos.invalidar(nome, pasta_id)
+
+def pre_aquecer_ids(nomes: list[str], pasta_id: str | None = None):
+    """Resolve de antemão os IDs das planilhas conhecidas (chamado no startup, em thread)."""
+    try:
+        with servico_drive() as service:
+            for nome in nomes:
+                file_id = obter_id_arquivo(service, nome, pasta_id)
+                if file_id:
+                    logger.info(f"ID de '{nome}' pré-carregado: {file_id}")
+                else:
+                    logger.warning(f"Arquivo '{nome}' não encontrado ao pré-carregar IDs.")
+    except Exception as e:
+        logger.error(f"Erro ao pré-carregar IDs de arquivos do Drive: {e}", exc_info=True)
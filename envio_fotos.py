@@ -0,0 +1,312 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+from telegram.constants import ParseMode
+
+import agendador_drive
+import config
+import drive_cliente
+import indice_fotos
+import metricas
+import processamento_fotos
+
+logger = logging.getLogger(__name__)
+
+URL_UPLOAD_DRIVE = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&fields=id"
+# O Drive exige partes de upload resumable em múltiplos de 256 KiB (exceto a última).
+MULTIPLO_PARTE = 256 * 1024
+
+FOTO_ENVIANDO = "⏳ Enviando para o Drive..."
+FOTO_ERRO = "Erro no upload"
+
+
+class ErroEnvioFoto(RuntimeError):
+    pass
+
+
+def _confirmado(resposta: httpx.Response) -> int:
+    """Quantos bytes o Drive já guardou, pelo cabeçalho Range de uma resposta 308."""
+    intervalo = resposta.headers.get("Range")
+    return int(intervalo.rsplit("-", 1)[1]) + 1 if intervalo else 0
+
+
+def arquivo_ativo(drive_id: str) -> bool:
+    try:
+        with drive_cliente.servico_drive() as service:
+            meta = service.files().get(fileId=drive_id, fields="id,trashed").execute()
+        return not meta.get("trashed")
+    except Exception as e:
+        if drive_cliente.erro_nao_encontrado(e):
+            return False
+        raise
+
+
+class EnvioFotos:
+    """
+    Envio das fotos da ocorrência para o Drive, sem travar a conversa.
+
+    A foto é lida do Telegram em streaming e repassada ao Drive em partes de um upload
+    resumable (nunca fica inteira na memória; com processamento ela passa por um arquivo
+    temporário). Cada foto vira uma tarefa em segundo plano, com no máximo `simultaneos`
+    uploads ao mesmo tempo; as fotos de um álbum entram juntas e sobem em paralelo. Fotos
+    repetidas (ver `indice_fotos`) não sobem de novo: basta conferir que o arquivo anterior
+    ainda existe no Drive. As tarefas não mexem no `user_data`: os handlers leem o
+    resultado com `situacao` (resumo) e `aguardar` (confirmação, que espera com limite as
+    que ainda estiverem subindo), para a persistência ver a mudança no mesmo update.
+    """
+
+    def __init__(
+        self,
+        simultaneos: int = config.FOTO_UPLOADS_SIMULTANEOS,
+        tamanho_parte: int = config.FOTO_TAMANHO_PARTE_KB * 1024,
+        tentativas: int = config.DRIVE_TENTATIVAS,
+    ):
+        self.tamanho_parte = max(MULTIPLO_PARTE, tamanho_parte // MULTIPLO_PARTE * MULTIPLO_PARTE)
+        self.tentativas = max(1, tentativas)
+        self._semaforo = asyncio.Semaphore(max(1, simultaneos))
+        self._cliente: httpx.AsyncClient | None = None
+        self._tarefas: dict[int, list[asyncio.Task]] = {}
+
+    def _cliente_http(self) -> httpx.AsyncClient:
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(timeout=httpx.Timeout(config.DRIVE_HTTP_TIMEOUT))
+        return self._cliente
+
+    async def fechar(self):
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    # --- Upload resumable em streaming ---
+
+    async def _iniciar_sessao(self, nome: str, pasta_id: str, tamanho: int | None) -> str:
+        token = await asyncio.to_thread(drive_cliente.token_acesso)
+        cabecalhos = {"Authorization": f"Bearer {token}", "X-Upload-Content-Type": "image/jpeg"}
+        if tamanho:
+            cabecalhos["X-Upload-Content-Length"] = str(tamanho)
+        metadata = {"name": nome, "mimeType": "image/jpeg", "parents": [pasta_id]}
+
+        for tentativa in range(self.tentativas):
+            await asyncio.to_thread(agendador_drive.agendador.reservar, agendador_drive.ESCRITA)
+            try:
+                resposta = await self._cliente_http().post(URL_UPLOAD_DRIVE, json=metadata, headers=cabecalhos)
+            except httpx.TransportError as e:
+                resposta, erro = None, str(e)
+            else:
+                if resposta.status_code == 200 and "Location" in resposta.headers:
+                    return resposta.headers["Location"]
+                if resposta.status_code not in agendador_drive.STATUS_TRANSITORIOS:
+                    raise ErroEnvioFoto(f"Drive recusou o upload de '{nome}': {resposta.status_code} {resposta.text[:200]}")
+                erro = str(resposta.status_code)
+            await self._esperar_nova_tentativa(tentativa, resposta, f"início do upload de '{nome}' ({erro})")
+        raise ErroEnvioFoto(f"Não foi possível iniciar o upload de '{nome}'.")
+
+    async def _enviar_parte(self, sessao: str, parte: bytes, inicio: int, total: int | None) -> httpx.Response:
+        """Envia `parte` a partir do byte `inicio`, retomando do que o Drive confirmou em caso de falha."""
+        fim = inicio + len(parte)
+        total_str = str(total) if total is not None else "*"
+        enviado = inicio
+
+        for tentativa in range(self.tentativas):
+            resto = parte[enviado - inicio:]
+            intervalo = f"bytes {enviado}-{fim - 1}/{total_str}" if resto else f"bytes */{total_str}"
+            try:
+                resposta = await self._cliente_http().put(sessao, content=resto, headers={"Content-Range": intervalo})
+            except httpx.TransportError:
+                resposta = None
+            else:
+                if resposta.status_code in (200, 201):
+                    return resposta
+                if resposta.status_code == 308:
+                    confirmado = _confirmado(resposta)
+                    if confirmado >= fim and total is None:
+                        return resposta
+                    if confirmado > enviado:
+                        enviado = confirmado
+                        continue
+                elif resposta.status_code not in agendador_drive.STATUS_TRANSITORIOS:
+                    raise ErroEnvioFoto(f"Drive recusou a parte {intervalo}: {resposta.status_code} {resposta.text[:200]}")
+
+            await self._esperar_nova_tentativa(tentativa, resposta, f"parte {intervalo}")
+            # Depois de uma falha, pergunta ao Drive até onde ele recebeu antes de reenviar.
+            try:
+                status = await self._cliente_http().put(sessao, headers={"Content-Range": f"bytes */{total_str}"})
+            except httpx.TransportError:
+                continue
+            if status.status_code in (200, 201):
+                return status
+            if status.status_code == 308:
+                enviado = max(inicio, _confirmado(status))
+        raise ErroEnvioFoto(f"Falha ao enviar a parte {inicio}-{fim - 1} ao Drive.")
+
+    async def _esperar_nova_tentativa(self, tentativa: int, resposta: httpx.Response | None, descricao: str):
+        retry_after = agendador_drive.segundos_retry_after(resposta.headers.get("Retry-After")) if resposta else None
+        espera = agendador_drive.agendador.espera_backoff(tentativa, retry_after)
+        metricas.incrementar("drive.retentativas")
+        metricas.incrementar("drive.espera_backoff_s", espera)
+        logger.warning(f"Upload de foto, {descricao}: nova tentativa em {espera:.1f}s.")
+        await asyncio.sleep(espera)
+
+    async def _reaproveitar(self, drive_id: str | None) -> str | None:
+        """Confere (só metadados) se a foto já enviada ainda existe no Drive."""
+        if not drive_id:
+            return None
+        if await asyncio.to_thread(arquivo_ativo, drive_id):
+            return drive_id
+        logger.info(f"Foto {drive_id} do índice não existe mais no Drive; enviando de novo.")
+        await asyncio.to_thread(indice_fotos.indice.remover, drive_id)
+        return None
+
+    async def _cancelar_sessao(self, sessao: str):
+        try:
+            await self._cliente_http().delete(sessao)
+        except httpx.TransportError as e:
+            logger.warning(f"Não foi possível cancelar a sessão de upload: {e}")
+
+    async def _conteudo(self, url_origem: str, processar: bool):
+        """Bytes da foto em pedaços: direto do Telegram ou, com `processar`, já recomprimidos."""
+        if not processar:
+            async with self._cliente_http().stream("GET", url_origem) as origem:
+                origem.raise_for_status()
+                async for pedaco in origem.aiter_bytes(self.tamanho_parte):
+                    yield pedaco
+            return
+
+        # A recompressão precisa da imagem inteira: ela vai para um arquivo temporário,
+        # o processo de `processamento_fotos` grava o resultado em outro, e esse é lido em partes.
+        with tempfile.TemporaryDirectory(prefix="foto_") as pasta:
+            original = os.path.join(pasta, "original")
+            async with self._cliente_http().stream("GET", url_origem) as origem:
+                origem.raise_for_status()
+                with open(original, "wb") as arquivo:
+                    async for pedaco in origem.aiter_bytes(self.tamanho_parte):
+                        await asyncio.to_thread(arquivo.write, pedaco)
+            final = await processamento_fotos.processar(original, os.path.join(pasta, "final.jpg"))
+            with open(final, "rb") as arquivo:
+                while pedaco := await asyncio.to_thread(arquivo.read, self.tamanho_parte):
+                    yield pedaco
+
+    async def enviar(
+        self, url_origem: str, nome: str, pasta_id: str,
+        tamanho: int | None = None, file_unique_id: str | None = None,
+        processar: bool = config.FOTO_PROCESSAR,
+    ) -> str:
+        """
+        Copia a foto de `url_origem` (arquivo do Telegram) para o Drive e devolve o ID criado.
+        Com `processar`, a foto é reduzida/recomprimida (ver `processamento_fotos`) antes de subir.
+        Se a mesma foto (mesmo `file_unique_id` ou mesmo conteúdo) já foi enviada, devolve o ID existente.
+        """
+        async with self._semaforo:
+            inicio = time.perf_counter()
+            existente = await self._reaproveitar(
+                await asyncio.to_thread(indice_fotos.indice.por_unique_id, file_unique_id)
+            )
+            if existente:
+                metricas.incrementar("fotos.dedup.acertos")
+                logger.info(f"Foto '{nome}' já está no Drive (file_unique_id), ID: {existente}")
+                return existente
+
+            # A sessão no Drive só é aberta quando a primeira parte precisa sair: foto que cabe
+            # numa parte é comparada pelo hash antes de qualquer byte ir para o Drive.
+            sessao = None
+            resumo = hashlib.sha256()
+            enviado = 0
+            buffer = bytearray()
+            if processar:
+                tamanho = None  # o tamanho informado pelo Telegram é o da foto original
+            async with contextlib.aclosing(self._conteudo(url_origem, processar)) as pedacos:
+                async for pedaco in pedacos:
+                    buffer += pedaco
+                    resumo.update(pedaco)
+                    # Segura sempre um resto: a última parte precisa ir com o tamanho total.
+                    while len(buffer) > self.tamanho_parte:
+                        if sessao is None:
+                            sessao = await self._iniciar_sessao(nome, pasta_id, tamanho)
+                        parte = bytes(buffer[:self.tamanho_parte])
+                        del buffer[:self.tamanho_parte]
+                        await self._enviar_parte(sessao, parte, enviado, None)
+                        enviado += len(parte)
+
+            sha256 = resumo.hexdigest()
+            existente = await self._reaproveitar(await asyncio.to_thread(indice_fotos.indice.por_hash, sha256))
+            if existente:
+                if sessao is not None:
+                    await self._cancelar_sessao(sessao)
+                metricas.incrementar("fotos.dedup.acertos")
+                await asyncio.to_thread(indice_fotos.indice.registrar, existente, None, file_unique_id)
+                logger.info(f"Foto '{nome}' já está no Drive (mesmo conteúdo), ID: {existente}")
+                return existente
+            metricas.incrementar("fotos.dedup.novas")
+
+            if sessao is None:
+                sessao = await self._iniciar_sessao(nome, pasta_id, tamanho)
+            resposta = await self._enviar_parte(sessao, bytes(buffer), enviado, enviado + len(buffer))
+            file_id = resposta.json()["id"]
+            await asyncio.to_thread(indice_fotos.indice.registrar, file_id, sha256, file_unique_id)
+
+            duracao = time.perf_counter() - inicio
+            metricas.registrar_tempo("fotos.upload", duracao)
+            logger.info(f"Foto '{nome}' enviada ao Drive em {duracao:.2f}s ({enviado + len(buffer)} bytes), ID: {file_id}")
+            return file_id
+
+    # --- Tarefas em segundo plano por usuário ---
+
+    def descartar(self, user_id: int):
+        """Esquece as fotos anteriores do usuário (uploads em andamento terminam, mas não contam mais)."""
+        self._tarefas.pop(user_id, None)
+
+    def agendar(self, user_id: int, user_data: dict, telegram_file, nome: str, pasta_id: str, bot, chat_id: int):
+        async def _tarefa():
+            try:
+                return await self.enviar(
+                    telegram_file.file_path, nome, pasta_id, telegram_file.file_size, telegram_file.file_unique_id
+                )
+            except Exception as e:
+                metricas.incrementar("fotos.falhas")
+                logger.error(f"Erro ao enviar a foto '{nome}' para o Google Drive: {e}", exc_info=True)
+                try:
+                    await bot.send_message(
+                        chat_id=chat_id,
+                        text="❌ Não consegui enviar uma das fotos para o Google Drive. O registro segue sem ela.",
+                        parse_mode=ParseMode.HTML,
+                    )
+                except Exception as erro_aviso:
+                    logger.error(f"Erro ao avisar o chat {chat_id} sobre a foto: {erro_aviso}")
+                return None
+
+        self._tarefas.setdefault(user_id, []).append(asyncio.create_task(_tarefa()))
+        user_data["foto"] = FOTO_ENVIANDO
+
+    def situacao(self, user_id: int) -> str | None:
+        """
+        Valor de `user_data["foto"]` pelas fotos do usuário: os IDs já enviados, FOTO_ENVIANDO
+        ou FOTO_ERRO. None se ele não tem fotos nesta execução (o `user_data` fica como está).
+        """
+        tarefas = self._tarefas.get(user_id)
+        if not tarefas:
+            return None
+        ids = [t.result() for t in tarefas if t.done() and not t.cancelled() and t.result()]
+        if ids:
+            return ", ".join(ids)
+        return FOTO_ERRO if all(t.done() for t in tarefas) else FOTO_ENVIANDO
+
+    async def aguardar(self, user_id: int, limite: float = config.FOTO_ESPERA_CONFIRMACAO) -> str | None:
+        """
+        Espera os uploads pendentes do usuário (até `limite` segundos) antes de salvar o
+        registro e devolve a `situacao` final.
+        """
+        pendentes = [t for t in self._tarefas.get(user_id, []) if not t.done()]
+        if pendentes:
+            await asyncio.wait(pendentes, timeout=limite)
+        situacao = self.situacao(user_id)
+        self._tarefas.pop(user_id, None)
+        return situacao
+
+
+fotos = EnvioFotos()
@@ -0,0 +1,65 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+import metricas
+
+logger = logging.getLogger(__name__)
+
+
+class EscritaCoalescida:
+    """
+    Junta as escritas concorrentes de um mesmo arquivo em uma só (single-flight por planilha).
+
+    A primeira thread que pede para anexar linhas a uma planilha vira a "líder" e faz a
+    escrita. Quem chega enquanto ela está no Drive só deixa as suas linhas na fila da
+    planilha e espera; quando a líder termina, ela leva de uma vez tudo o que acumulou
+    numa nova escrita. Assim N confirmações simultâneas custam uma ou duas escritas no
+    Drive em vez de N, e nunca há duas escritas do processo no mesmo arquivo ao mesmo tempo.
+
+    `escrever(nome, linhas, colunas)` faz a escrita de fato e levanta exceção se falhar;
+    a exceção é repassada a todos os pedidos que estavam naquela escrita.
+    """
+
+    def __init__(self, escrever: Callable[[str, list[dict], list[str] | None], None]):
+        self._escrever = escrever
+        self._trava = threading.Lock()
+        self._pendentes: dict[str, list[tuple[list[dict], list[str] | None, Future]]] = {}
+        self._com_lider: set[str] = set()
+
+    def anexar(self, nome: str, linhas: list[dict], colunas: list[str] | None = None):
+        """Bloqueia até as linhas estarem gravadas (por esta thread ou pela líder da vez)."""
+        futuro = Future()
+        with self._trava:
+            self._pendentes.setdefault(nome, []).append((linhas, colunas, futuro))
+            lider = nome not in self._com_lider
+            if lider:
+                self._com_lider.add(nome)
+
+        if lider:
+            self._liderar(nome)
+        else:
+            metricas.incrementar(f"planilha.{nome}.escritas_coalescidas")
+        futuro.result()
+
+    def _liderar(self, nome: str):
+        while True:
+            with self._trava:
+                pedidos = self._pendentes.pop(nome, [])
+                if not pedidos:
+                    self._com_lider.discard(nome)
+                    return
+
+            linhas = [linha for pedido in pedidos for linha in pedido[0]]
+            colunas = next((pedido[1] for pedido in pedidos if pedido[1] is not None), None)
+            if len(pedidos) > 1:
+                logger.info(f"'{nome}': {len(pedidos)} pedidos de escrita juntados em um ({len(linhas)} linha(s)).")
+            try:
+                self._escrever(nome, linhas, colunas)
+            except BaseException as e:
+                for _, _, futuro in pedidos:
+                    futuro.set_exception(e)
+            else:
+                for _, _, futuro in pedidos:
+                    futuro.set_result(None)
@@ -1,16 +1,15 @@
 import os
 import json
 import logging
-import pandas as pd
 from datetime import datetime
 from io import BytesIO
 import base64
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
 import io
 
+import cache_planilhas
+import drive_cliente
+import xlsx_append
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -29,31 +28,18 @@ if not GOOGLE_DRIVE_PHOTOS_FOLDER_ID:
 
 # --- Funções Google Drive ---
 
-def get_drive_service():
-    try:
-        # Carrega credenciais do JSON armazenado em variável de ambiente (string JSON)
-        info = json.loads(GOOGLE_CREDENTIALS_JSON)
-        creds = Credentials.from_service_account_info(
-            info,
-            scopes=['https://www.googleapis.com/auth/drive']
-        )
-        service = build('drive', 'v3', credentials=creds)
-        logger.info("Serviço do Google Drive autenticado via GOOGLE_CREDENTIALS_JSON.")
-        return service
-    except Exception as e:
-        logger.error(f"Erro ao carregar credenciais do Google Drive: {e}", exc_info=True)
-        raise
+# O cliente do Drive vem do pool compartilhado em drive_cliente
+# (credenciais em cache, descoberta estática e transportes reaproveitados).
 
 def _get_file_id_by_name(service, filename: str, folder_id: str = None) -> str | None:
-    query = f"name='{filename}' and trashed=false"
-    if folder_id:
-        query += f" and '{folder_id}' in parents"
+    from googleapiclient.errors import HttpError
+
     try:
-        results = service.files().list(q=query, fields='files(id)').execute()
-        files = results.get('files', [])
-        if files:
-            logger.info(f"Arquivo '{filename}' encontrado no Drive com ID: {files[0]['id']}.")
-            return files[0]['id']
+        # Consulta o Drive só se o ID não estiver no cache (ou se ele expirou)
+        file_id = drive_cliente.obter_id_arquivo(service, filename, folder_id)
+        if file_id:
+            logger.info(f"Arquivo '{filename}' encontrado no Drive com ID: {file_id}.")
+            return file_id
         logger.info(f"Arquivo '{filename}' não encontrado no Drive.")
         return None
     except HttpError as error:
@@ -64,50 +50,62 @@ def _get_file_id_by_name(service, filename: str, folder_id: str = None) -> str |
         return None
 
 def ler_excel_drive_em_memoria(service, file_id):
-    request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
+    # Reaproveita a cópia local se a revisão no Drive for a mesma da última leitura/escrita
+    df = cache_planilhas.cache.ler_dataframe(service, file_id)
     logger.info("Arquivo Excel carregado da memória com sucesso.")
-    return pd.read_excel(fh)
+    return df
 
 def salvar_excel_drive_em_memoria(service, file_id, df_final):
     from pandas import ExcelWriter
     excel_bytes = io.BytesIO()
     with ExcelWriter(excel_bytes, engine="xlsxwriter") as writer:
         df_final.to_excel(writer, index=False, sheet_name="REUNIOES")
-    excel_bytes.seek(0)
+    _enviar_bytes_excel(service, file_id, excel_bytes.getvalue(), df_final)
+
+def anexar_excel_drive_em_memoria(service, file_id, df_novo: "pd.DataFrame"):
+    """
+    Anexa as linhas de `df_novo` à planilha sem reescrever o histórico: o XML da aba
+    é copiado e as linhas novas entram no fim, mantendo nome da aba e colunas.
+    """
+    conteudo, _ = cache_planilhas.cache.ler_bytes(service, file_id)
+    novo_conteudo = xlsx_append.anexar_linhas_xlsx(conteudo, df_novo.to_dict("records"))
+    _enviar_bytes_excel(service, file_id, novo_conteudo)
+
+def _enviar_bytes_excel(service, file_id, conteudo: bytes, df_final: "pd.DataFrame" = None):
+    from googleapiclient.http import MediaIoBaseUpload
 
     media = MediaIoBaseUpload(
-        excel_bytes,
+        io.BytesIO(conteudo),
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         resumable=True
     )
 
     updated_file = service.files().update(
         fileId=file_id,
-        media_body=media
+        media_body=media,
+        fields=f"id,{cache_planilhas.CAMPOS_REVISAO}"
     ).execute()
+    cache_planilhas.cache.registrar_upload(file_id, conteudo, updated_file, df_final)
 
     logger.info(f"✅ Arquivo Excel atualizado com sucesso no Drive (ID: {updated_file.get('id')}).")
 
 def upload_photo_to_drive(file_bytes: bytes, filename: str) -> str | None:
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaIoBaseUpload
+
     try:
-        service = get_drive_service()
         target_folder_id = GOOGLE_DRIVE_PHOTOS_FOLDER_ID if GOOGLE_DRIVE_PHOTOS_FOLDER_ID else GOOGLE_DRIVE_FOLDER_ID
         file_metadata = {'name': filename, 'mimeType': 'image/jpeg'}
         if target_folder_id:
             file_metadata['parents'] = [target_folder_id]
 
         media = MediaIoBaseUpload(BytesIO(file_bytes), mimetype='image/jpeg', resumable=True)
-        uploaded_file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        with drive_cliente.servico_drive() as service:
+            uploaded_file = service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            ).execute()
 
         file_id = uploaded_file.get('id')
         logger.info(f"Foto '{filename}' enviada para o Google Drive (pasta: {target_folder_id}) com ID: {file_id}")
@@ -119,7 +117,7 @@ def upload_photo_to_drive(file_bytes: bytes, filename: str) -> str | None:
         logger.error(f"Erro inesperado ao fazer upload da foto para o Drive: {e}", exc_info=True)
         return None
 
-def _upload_or_update_excel(service, filename: str, df_novo: pd.DataFrame, folder_id: str = None):
+def _upload_or_update_excel(service, filename: str, df_novo: "pd.DataFrame", folder_id: str = None):
     logger.info(f"Iniciando atualização da planilha '{filename}' no Drive...")
 
     file_id = _get_file_id_by_name(service, filename, folder_id)
@@ -128,21 +126,31 @@ def _upload_or_update_excel(service, filename: str, df_novo: pd.DataFrame, folde
         return
 
     try:
-        df_existente = ler_excel_drive_em_memoria(service, file_id)
-        logger.info(f"Planilha existente possui {len(df_existente)} registros.")
+        try:
+            anexar_excel_drive_em_memoria(service, file_id, df_novo)
+            logger.info(f"{len(df_novo)} registro(s) anexado(s) à planilha '{filename}'.")
+        except xlsx_append.FormatoXlsxNaoSuportado as e:
+            logger.warning(f"Planilha '{filename}' fora do formato esperado ({e}); usando pandas.")
+            import pandas as pd
+            df_existente = ler_excel_drive_em_memoria(service, file_id)
+            logger.info(f"Planilha existente possui {len(df_existente)} registros.")
 
-        df_final = pd.concat([df_existente, df_novo], ignore_index=True)
-        logger.info(f"Planilha final com {len(df_final)} registros após concatenação.")
+            df_final = pd.concat([df_existente, df_novo], ignore_index=True)
+            logger.info(f"Planilha final com {len(df_final)} registros após concatenação.")
 
-        salvar_excel_drive_em_memoria(service, file_id, df_final)
+            salvar_excel_drive_em_memoria(service, file_id, df_final)
 
     except Exception as e:
+        if drive_cliente.erro_nao_encontrado(e):
+            # O ID em cache não vale mais; a próxima chamada consulta o Drive de novo.
+            drive_cliente.invalidar_id_arquivo(filename, folder_id)
+            cache_planilhas.cache.invalidar(file_id)
         logger.error(f"Erro ao atualizar planilha '{filename}': {e}", exc_info=True)
 
 # Função para exportar DataFrame direto para Drive sem banco
-def exportar_dataframe_para_drive(df: pd.DataFrame, filename: str, folder_id: str = None):
+def exportar_dataframe_para_drive(df: "pd.DataFrame", filename: str, folder_id: str = None):
     try:
-        service = get_drive_service()
-        _upload_or_update_excel(service, filename, df, folder_id)
+        with drive_cliente.servico_drive() as service:
+            _upload_or_update_excel(service, filename, df, folder_id)
     except Exception as e:
         logger.error(f"Erro ao exportar dataframe para '{filename}': {e}", exc_info=True)
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.constants import ParseMode
+
+import config
+import metricas
+import utils
+from diario_exportacao import DiarioExportacao
+
+logger = logging.getLogger(__name__)
+
+PLANILHAS = (utils.PLANILHA_DEMANDAS, utils.PLANILHA_REUNIOES)
+
+
+def linhas_para_planilha(planilha: str, registro: dict) -> list[dict]:
+    dados = registro["dados"]
+    if planilha == utils.PLANILHA_REUNIOES:
+        return [utils.linha_reuniao(dados)]
+    return utils.linhas_demandas(dados)
+
+
+def aplicar_planilha(diario: DiarioExportacao, planilha: str, registros: list[dict]) -> list[dict]:
+    """
+    Grava em uma das planilhas (chamada síncrona, roda em thread) os registros do lote que
+    ainda não foram aplicados nela. Cada arquivo de destino (a planilha ou a sua partição
+    mensal) recebe as linhas de todos esses registros em uma única escrita, que pode ainda
+    ser juntada às de outros lotes simultâneos. Devolve os registros que ficaram completos (aplicados em todas as planilhas).
+    """
+    faltando = [r for r in registros if diario.falta_aplicar(r["id"], planilha)]
+    destinos: dict[str, list[dict]] = {}
+    for registro in faltando:
+        destinos.setdefault(utils.planilha_destino(planilha, registro["dados"]), []).append(registro)
+
+    concluidos = []
+    for destino, registros_destino in destinos.items():
+        linhas = [linha for r in registros_destino for linha in linhas_para_planilha(planilha, r)]
+        if utils.anexar_linhas_planilha(destino, linhas, colunas=utils.COLUNAS_PLANILHAS[planilha]):
+            concluidos += diario.marcar_aplicados(planilha, [r["id"] for r in registros_destino])
+    return concluidos
+
+
+class FilaExportacao:
+    """
+    Exportação das ocorrências confirmadas para o Google Drive, fora do event loop.
+
+    `enfileirar` só grava a ocorrência no diário local (durável) e retorna. Um flusher
+    junta os registros pendentes em lotes, a cada `intervalo` segundos ou assim que
+    houver `lote_maximo` pendentes, e os workers aplicam cada lote nas planilhas em um
+    pool de threads próprio, com as duas planilhas atualizadas em paralelo (os arquivos
+    são independentes; as escritas em cada um são serializadas em `utils`). Registros que
+    falham continuam no diário e voltam depois de uma espera que dobra a cada falha
+    (`backoff_base` até `backoff_maximo` segundos); na `tentativas_maximas`-ésima falha saem
+    da fila para o arquivo de falhas do diário. O que ficou pendente antes de um reinício é
+    retomado em `iniciar`.
+    """
+
+    def __init__(
+        self,
+        caminho_diario: str = config.DIARIO_EXPORTACAO_PATH,
+        num_workers: int = config.EXPORT_WORKERS,
+        intervalo: float = config.EXPORT_FLUSH_INTERVALO,
+        lote_maximo: int = config.EXPORT_LOTE_MAXIMO,
+        backoff_base: float = config.EXPORT_BACKOFF_BASE,
+        backoff_maximo: float = config.EXPORT_BACKOFF_MAXIMO,
+        tentativas_maximas: int = config.EXPORT_TENTATIVAS_MAXIMAS,
+    ):
+        self.caminho_diario = caminho_diario
+        self.num_workers = max(1, num_workers)
+        self.intervalo = intervalo
+        self.lote_maximo = max(1, lote_maximo)
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+        self.tentativas_maximas = max(1, tentativas_maximas)
+        self.diario: DiarioExportacao | None = None
+        self._fila: asyncio.Queue | None = None
+        self._acordar: asyncio.Event | None = None
+        self._tarefas: list[asyncio.Task] = []
+        self._executor: ThreadPoolExecutor | None = None
+        self._em_voo: set[str] = set()
+        self._falha_avisada: set[str] = set()
+        self._tentativas: dict[str, int] = {}     # id -> falhas seguidas
+        self._espera_ate: dict[str, float] = {}   # id -> loop.time() em que pode voltar
+        self._bot = None
+
+    # --- Ciclo de vida ---
+
+    async def iniciar(self, bot):
+        self._bot = bot
+        self._fila = asyncio.Queue()
+        self._acordar = asyncio.Event()
+        # Uma thread por planilha para cada worker: as duas escritas de um lote rodam juntas.
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.num_workers * len(PLANILHAS), thread_name_prefix="exportacao"
+        )
+
+        loop = asyncio.get_running_loop()
+        self.diario = await loop.run_in_executor(
+            self._executor, lambda: DiarioExportacao(self.caminho_diario, PLANILHAS)
+        )
+        if len(self.diario):
+            # Pendências de antes do último desligamento: não espera o intervalo.
+            self._acordar.set()
+
+        self._tarefas = [asyncio.create_task(self._flusher())]
+        self._tarefas += [asyncio.create_task(self._worker(i)) for i in range(self.num_workers)]
+        logger.info(
+            f"Fila de exportação iniciada com {self.num_workers} worker(s), "
+            f"flush a cada {self.intervalo}s ou {self.lote_maximo} registro(s)."
+        )
+
+    async def parar(self):
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        logger.info("Fila de exportação parada.")
+
+    # --- API usada pelos handlers ---
+
+    async def enfileirar(self, dados: dict, chat_id: int | None) -> bool:
+        """
+        Grava a ocorrência no diário. `dados["registro_id"]` (criado no resumo) torna o
+        pedido idempotente: repetido, não é gravado nem exportado de novo e devolve False.
+        """
+        if self.diario is None:
+            raise RuntimeError("Fila de exportação não iniciada.")
+
+        loop = asyncio.get_running_loop()
+        registro_id, novo = await loop.run_in_executor(
+            self._executor, self.diario.registrar, dados, chat_id, dados.get("registro_id")
+        )
+        if not novo:
+            metricas.incrementar("exportacao.registros_repetidos")
+            logger.info(f"Registro {registro_id} já recebido antes; confirmação repetida ignorada.")
+            return False
+        pendentes = len(self.diario) - len(self._em_voo)
+        logger.info(f"Registro {registro_id} gravado no diário ({pendentes} aguardando envio).")
+        if pendentes >= self.lote_maximo:
+            self._acordar.set()
+        return True
+
+    # --- Flusher e workers ---
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._acordar.clear()
+            self._despachar()
+
+    def _despachar(self):
+        agora = asyncio.get_running_loop().time()
+        livres = [
+            r for r in self.diario.pendentes()
+            if r["id"] not in self._em_voo and self._espera_ate.get(r["id"], 0) <= agora
+        ]
+        for inicio in range(0, len(livres), self.lote_maximo):
+            lote = livres[inicio:inicio + self.lote_maximo]
+            self._em_voo.update(r["id"] for r in lote)
+            self._fila.put_nowait(lote)
+
+    async def _worker(self, numero: int):
+        while True:
+            lote = await self._fila.get()
+            try:
+                await self._processar(lote)
+            except Exception as e:
+                logger.error(f"Worker {numero}: erro inesperado ao exportar lote: {e}", exc_info=True)
+            finally:
+                self._em_voo.difference_update(r["id"] for r in lote)
+                self._fila.task_done()
+
+    async def _processar(self, lote: list[dict]):
+        loop = asyncio.get_running_loop()
+        inicio = loop.time()
+        resultados = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, aplicar_planilha, self.diario, planilha, lote)
+            for planilha in PLANILHAS
+        ))
+        concluidos = [r for parcial in resultados for r in parcial]
+        duracao = loop.time() - inicio
+        metricas.registrar_tempo("exportacao.lote", duracao)
+        metricas.incrementar("exportacao.registros_concluidos", len(concluidos))
+        logger.info(f"Lote exportado em {duracao:.2f}s: {len(concluidos)} de {len(lote)} registro(s) concluído(s).")
+
+        ids_concluidos = {r["id"] for r in concluidos}
+        for registro in lote:
+            if registro["id"] in ids_concluidos:
+                self._esquecer(registro["id"])
+                await self._avisar(
+                    registro.get("chat_id"),
+                    "🎉 Dados salvos com sucesso nos arquivos Excel do Google Drive! Muito obrigado pelo seu registro.",
+                )
+            else:
+                await self._falhou(registro)
+
+    async def _falhou(self, registro: dict):
+        registro_id = registro["id"]
+        tentativas = self._tentativas.get(registro_id, 0) + 1
+        if tentativas >= self.tentativas_maximas:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self._executor, self.diario.descartar, [registro_id], f"{tentativas} tentativa(s) sem sucesso"
+            )
+            self._esquecer(registro_id)
+            metricas.incrementar("exportacao.registros_descartados")
+            logger.error(
+                f"Registro {registro_id} desistido após {tentativas} tentativa(s); "
+                f"copiado para {self.diario.caminho_falhas} para reenvio manual."
+            )
+            await self._avisar(
+                registro.get("chat_id"),
+                "❌ Não consegui gravar seu registro no Google Drive depois de várias tentativas. "
+                "Ele foi guardado para a equipe reenviar manualmente.",
+            )
+            return
+
+        espera = min(self.backoff_base * 2 ** (tentativas - 1), self.backoff_maximo)
+        self._tentativas[registro_id] = tentativas
+        self._espera_ate[registro_id] = asyncio.get_running_loop().time() + espera
+        metricas.incrementar("exportacao.retentativas")
+        logger.warning(
+            f"Registro {registro_id} não exportado (tentativa {tentativas}/{self.tentativas_maximas}); "
+            f"nova tentativa em {espera:.0f}s."
+        )
+        if registro_id not in self._falha_avisada:
+            self._falha_avisada.add(registro_id)
+            await self._avisar(
+                registro.get("chat_id"),
+                "⚠️ Não consegui gravar seu registro no Google Drive agora. "
+                "Ele está guardado e será reenviado automaticamente.",
+            )
+
+    def _esquecer(self, registro_id: str):
+        self._falha_avisada.discard(registro_id)
+        self._tentativas.pop(registro_id, None)
+        self._espera_ate.pop(registro_id, None)
+
+    async def _avisar(self, chat_id: int | None, texto: str):
+        if not chat_id or not self._bot:
+            return
+        try:
+            await self._bot.send_message(chat_id=chat_id, text=texto, parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.error(f"Erro ao avisar o chat {chat_id} sobre a exportação: {e}", exc_info=True)
+
+
+fila = FilaExportacao()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from telegram import Update
+
+import config
+import metricas
+
+logger = logging.getLogger(__name__)
+
+
+class FilaUpdates:
+    """
+    Processamento dos updates do webhook fora da requisição HTTP.
+
+    O endpoint só valida o update, chama `aceitar` e responde 200 na hora; quem roda os
+    handlers são `num_workers` tarefas, cada uma com a sua fila. O update vai sempre para
+    a fila `chat_id % num_workers`, então as mensagens de um mesmo chat são tratadas em
+    ordem, uma de cada vez (a conversa depende disso), enquanto chats diferentes andam
+    em paralelo. Cada fila aceita até `maximo_por_fila` updates; cheia, `aceitar` devolve
+    False e o endpoint responde 503 para o Telegram reenviar mais tarde.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = config.WEBHOOK_WORKERS,
+        maximo_por_fila: int = config.WEBHOOK_FILA_MAXIMA,
+        espera_encerramento: float = config.WEBHOOK_ESPERA_ENCERRAMENTO,
+    ):
+        self.num_workers = max(1, num_workers)
+        self.maximo_por_fila = max(1, maximo_por_fila)
+        self.espera_encerramento = espera_encerramento
+        self._filas: list[asyncio.Queue] = []
+        self._tarefas: list[asyncio.Task] = []
+        self._processar: Callable[[Update], Awaitable] | None = None
+
+    # --- Ciclo de vida ---
+
+    async def iniciar(self, processar: Callable[[Update], Awaitable]):
+        self._processar = processar
+        self._filas = [asyncio.Queue(maxsize=self.maximo_por_fila) for _ in range(self.num_workers)]
+        self._tarefas = [asyncio.create_task(self._worker(i)) for i in range(self.num_workers)]
+        logger.info(
+            f"Fila de updates iniciada com {self.num_workers} worker(s) e até "
+            f"{self.maximo_por_fila} update(s) por fila."
+        )
+
+    async def parar(self):
+        # Os updates já aceitos receberam 200 do Telegram e não voltam: tenta terminá-los.
+        pendentes = [fila.join() for fila in self._filas]
+        if pendentes:
+            try:
+                await asyncio.wait_for(asyncio.gather(*pendentes), timeout=self.espera_encerramento)
+            except asyncio.TimeoutError:
+                logger.warning(f"Encerrando com {self.pendentes()} update(s) ainda na fila.")
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+        logger.info("Fila de updates parada.")
+
+    # --- API usada pelo endpoint ---
+
+    def aceitar(self, update: Update) -> bool:
+        """Coloca o update na fila do seu chat. False se a fila estiver cheia (ou não iniciada)."""
+        if not self._tarefas:
+            return False
+        if update.effective_chat:
+            chave = update.effective_chat.id
+        elif update.effective_user:
+            chave = update.effective_user.id
+        else:
+            chave = update.update_id
+        try:
+            self._filas[chave % self.num_workers].put_nowait(update)
+        except asyncio.QueueFull:
+            metricas.incrementar("webhook.rejeitados")
+            logger.warning(f"Fila de updates cheia; update {update.update_id} recusado (503).")
+            return False
+        metricas.incrementar("webhook.aceitos")
+        return True
+
+    def pendentes(self) -> int:
+        return sum(fila.qsize() for fila in self._filas)
+
+    # --- Workers ---
+
+    async def _worker(self, numero: int):
+        fila = self._filas[numero]
+        while True:
+            update = await fila.get()
+            try:
+                with metricas.cronometro("webhook.processamento"):
+                    await self._processar(update)
+            except Exception as e:
+                logger.error(f"Worker {numero}: erro ao processar o update {update.update_id}: {e}", exc_info=True)
+            finally:
+                fila.task_done()
+
+
+class UpdatesVistos:
+    """
+    `update_id`s já aceitos, para descartar os reenvios do Telegram (ele repete o update
+    quando não recebe a resposta a tempo). Guarda no máximo `maximo` ids e esquece os
+    mais velhos que `janela` segundos; consulta e registro são O(1).
+    """
+
+    def __init__(self, maximo: int = config.WEBHOOK_VISTOS_MAXIMO, janela: float = config.WEBHOOK_VISTOS_JANELA):
+        self.maximo = max(1, maximo)
+        self.janela = janela
+        self._vistos: OrderedDict[int, float] = OrderedDict()
+
+    def _expirar(self, agora: float):
+        while self._vistos and (
+            len(self._vistos) > self.maximo or agora - next(iter(self._vistos.values())) > self.janela
+        ):
+            self._vistos.popitem(last=False)
+
+    def repetido(self, update_id) -> bool:
+        self._expirar(time.monotonic())
+        return update_id in self._vistos
+
+    def marcar(self, update_id):
+        """Chamar só depois que o update foi aceito: um 503 precisa deixar o reenvio passar."""
+        self._vistos[update_id] = time.monotonic()
+        self._vistos.move_to_end(update_id)
+        self._expirar(time.monotonic())
+
+
+fila = FilaUpdates()
+vistos = UpdatesVistos()
@@ -5,8 +5,6 @@ import os
 import csv
 import logging 
 from telegram.constants import ParseMode 
-from google.oauth2.service_account import Credentials
-from exportar_para_excel import exportar_dataframe_para_drive as export_data_to_drive
 
 
 
@@ -16,8 +14,22 @@ from exportar_para_excel import exportar_dataframe_para_drive as export_data_to_
 # Importa módulos de suporte para configurações (config), utilidades (utils) e dados globais (globals).
 import config 
 import utils  
+import busca
+import diario_exportacao
+import callback_codec
+import envio_fotos
+import fila_exportacao
+import municipios
+import processamento_fotos
+import teclados
 from globals import user_data 
 
+# Botões antigos (de antes de um reinício) trazem ids que o codec reconstrói a partir destas listas.
+callback_codec.registrar_fonte(lambda: config.COLABORADORES)
+callback_codec.registrar_fonte(lambda: config.PREDEFINED_ASSUNTOS)
+callback_codec.registrar_fonte(utils.ler_orgaos_csv)
+callback_codec.registrar_fonte(utils.ler_assuntos_csv)
+
 # Configura o logger para este arquivo, útil para acompanhar o que está acontecendo no Render.
 logger = logging.getLogger(__name__)
 
@@ -33,9 +45,9 @@ OBSERVACAO_ESCOLHA, OBSERVACAO_DIGITAR, CONFIRMACAO_FINAL, TIPO_ATENDIMENTO = ra
 
 # --- Início do Nosso Registro: Seleção do Colaborador ---
 async def iniciar_colaborador(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    buttons = [InlineKeyboardButton(name, callback_data=f"colaborador_{name}") for name in config.COLABORADORES]
-    buttons.append(InlineKeyboardButton("Outro", callback_data="colaborador_outro"))
-    keyboard = InlineKeyboardMarkup(utils.build_menu(buttons, n_cols=2))
+    # Nova ocorrência: o id de um resumo anterior faria ela ser descartada como repetida.
+    context.user_data.pop("registro_id", None)
+    keyboard = teclados.fixo("colaborador")
     await update.message.reply_text(
         "👋 Olá! Vamos começar o registro da ocorrência.\nPor favor, selecione o <b>colaborador</b> na lista ou clique em 'Outro' para digitar manualmente:", 
         reply_markup=keyboard, 
@@ -53,7 +65,10 @@ async def colaborador_button(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.message.reply_text("✍️ Entendido! Por favor, digite o nome completo do colaborador:")
         return COLABORADOR_MANUAL 
     else:
-        colaborador = data.replace("colaborador_", "") 
+        colaborador = callback_codec.decodificar(data, "colaborador_")
+        if colaborador is None:
+            await query.message.reply_text("⚠️ Essa opção não está mais disponível. Use /iniciar para recomeçar.")
+            return ConversationHandler.END
         context.user_data['colaborador'] = colaborador 
         await query.message.edit_text(f"✅ Colaborador selecionado: <b>{colaborador}</b>.", parse_mode=ParseMode.HTML) 
         # Transição para o estado de TIPO_VISITA
@@ -70,11 +85,7 @@ async def colaborador_manual(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 # --- Etapa: Tipo de Visita ---
 async def solicitar_tipo_visita(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    buttons = [
-        InlineKeyboardButton("🔄 Reativa", callback_data="tipo_visita_reativo"),
-        InlineKeyboardButton("🎯 Proativa", callback_data="tipo_visita_proativo"),
-    ]
-    keyboard = InlineKeyboardMarkup.from_row(buttons)
+    keyboard = teclados.fixo("tipo_visita")
 
     if update.message:
         await update.message.reply_text("🤝 Excelente! Agora, por favor, selecione o <b>tipo da visita</b> realizada:", reply_markup=keyboard, parse_mode=ParseMode.HTML)
@@ -97,12 +108,7 @@ async def tipo_visita_escolha(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 #ATENDIMENTO!!!!
 async def solicitar_tipo_atendimento(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    buttons = [
-        [InlineKeyboardButton("⚡ PRESENCIAL - EDP", callback_data="tipo_atendimento_presencial - edp")],
-        [InlineKeyboardButton("🗺️ PRESENCIAL - EXTERNO", callback_data="tipo_atendimento_presencial - externo")],
-        [InlineKeyboardButton("💻 VIRTUAL", callback_data="tipo_atendimento_virtual")],
-    ]
-    keyboard = InlineKeyboardMarkup(buttons)
+    keyboard = teclados.fixo("tipo_atendimento")
 
     if update.message:
         await update.message.reply_text("🤝 Excelente! Agora, por favor, selecione o <b>tipo de atendimento</b> realizado:", reply_markup=keyboard, parse_mode=ParseMode.HTML)
@@ -131,11 +137,7 @@ async def tipo_atendimento_escolha(update: Update, context: ContextTypes.DEFAULT
 # Pergunta se o usuário quer adicionar uma figura pública e órgão
 # Solicita se deseja adicionar Figura Pública e Órgão
 async def solicitar_figura_orgao_inicial(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    buttons = [
-        [InlineKeyboardButton("➕ Adicionar Figura/Órgão", callback_data="add_figura_orgao")],
-        [InlineKeyboardButton("⏭️ Pular Figuras/Órgãos", callback_data="fim_figuras_orgaos")],
-    ]
-    reply_markup = InlineKeyboardMarkup(buttons)
+    reply_markup = teclados.fixo("figura_orgao_inicial")
 
     if update.callback_query:
         await update.callback_query.message.reply_text(
@@ -166,13 +168,9 @@ async def figura_orgao_escolha(update: Update, context: ContextTypes.DEFAULT_TYP
         return await solicitar_assunto_inicial(update, context)
 
 
-# Inicia menu direto de órgãos públicos (sem busca)
+# Inicia a escolha do órgão público: busca por palavra-chave (a lista inteira fica como opção)
 async def iniciar_menu_orgao_publico_for_figura(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    orgaos = utils.ler_orgaos_csv()
-    context.user_data['temp_orgaos_busca_for_figura'] = orgaos
-    context.user_data['temp_orgao_pagina_for_figura'] = 0
-
-    if not orgaos:
+    if not utils.ler_orgaos_csv():
         msg = "⚠️ Nenhum órgão disponível. Digite manualmente o nome do <b>órgão público</b> desta figura:"
         if update.callback_query:
             await update.callback_query.message.reply_text(msg, parse_mode=ParseMode.HTML)
@@ -180,21 +178,32 @@ async def iniciar_menu_orgao_publico_for_figura(update: Update, context: Context
             await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
         return ORGAO_PUBLICO_FOR_FIGURA_MANUAL
 
-    botoes, _ = utils.botoes_pagina(orgaos, 0, prefix="orgao_figura_")
-
-    # Remove o botão de refazer busca se houver
-    for linha in botoes:
-        linha[:] = [btn for btn in linha if "refazer_busca" not in btn.callback_data]
-
-    keyboard = InlineKeyboardMarkup(botoes)
+    keyboard = teclados.fixo("orgao_figura_palavra_chave")
+    msg = "🏛️ Digite uma <b>palavra-chave</b> (ou o começo do nome) do <b>órgão público</b> da figura pública:"
 
     if update.callback_query:
-        await update.callback_query.message.reply_text("🏛️ Escolha o <b>órgão público</b> da figura pública:", reply_markup=keyboard, parse_mode=ParseMode.HTML)
+        await update.callback_query.message.reply_text(msg, reply_markup=keyboard, parse_mode=ParseMode.HTML)
     else:
-        await update.message.reply_text("🏛️ Escolha o <b>órgão público</b> da figura pública:", reply_markup=keyboard, parse_mode=ParseMode.HTML)
+        await update.message.reply_text(msg, reply_markup=keyboard, parse_mode=ParseMode.HTML)
 
-    return ORGAO_PUBLICO_FOR_FIGURA_PAGINACAO
+    return ORGAO_PUBLICO_FOR_FIGURA_KEYWORD
+
+
+# Busca do órgão pela palavra-chave digitada
+async def buscar_orgao_for_figura(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    palavra_chave = update.message.text.strip()
+    # Só a consulta e a página ficam na conversa; a lista é compartilhada pelo índice.
+    resultados = busca.orgaos.resultados(palavra_chave)
+    context.user_data['temp_orgao_consulta_for_figura'] = palavra_chave
+    context.user_data['temp_orgao_pagina_for_figura'] = 0
+
+    if not resultados:
+        await update.message.reply_text("❗ Nenhum órgão encontrado com essa palavra-chave. Digite manualmente o nome do <b>órgão público</b> desta figura:", parse_mode=ParseMode.HTML)
+        return ORGAO_PUBLICO_FOR_FIGURA_MANUAL
 
+    teclado = teclados.paginados.pagina(busca.orgaos, palavra_chave, 0, "orgao_figura_")
+    await update.message.reply_text(f"🔎 Encontrei <b>{len(resultados)} órgão(s)</b> para '<i>{palavra_chave}</i>'. Selecione abaixo ou navegue nas opções:", reply_markup=teclado, parse_mode=ParseMode.HTML)
+    return ORGAO_PUBLICO_FOR_FIGURA_PAGINACAO
 
 
 # Paginação ou escolha do órgão
@@ -204,33 +213,44 @@ async def orgao_paginacao_for_figura(update: Update, context: ContextTypes.DEFAU
     data = query.data
 
     pagina_atual = context.user_data.get("temp_orgao_pagina_for_figura", 0)
-    resultados = context.user_data.get("temp_orgaos_busca_for_figura", [])
+    consulta = context.user_data.get("temp_orgao_consulta_for_figura")
+
+    if data == "orgao_figura_ver_todos":
+        context.user_data["temp_orgao_consulta_for_figura"] = None
+        context.user_data["temp_orgao_pagina_for_figura"] = 0
+        teclado = teclados.paginados.pagina(busca.orgaos, None, 0, "orgao_figura_")
+        await query.message.reply_text("🏛️ Escolha o <b>órgão público</b> da figura pública:", reply_markup=teclado, parse_mode=ParseMode.HTML)
+        return ORGAO_PUBLICO_FOR_FIGURA_PAGINACAO
 
-    if data == "orgao_figura_proximo":
+    elif data == "orgao_figura_proximo":
         pagina_atual += 1
         context.user_data["temp_orgao_pagina_for_figura"] = pagina_atual
-        botoes, _ = utils.botoes_pagina(resultados, pagina_atual, prefix="orgao_figura_")
-        for linha in botoes:
-            linha[:] = [btn for btn in linha if "refazer_busca" not in btn.callback_data]
-        await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(botoes))
+        teclado = teclados.paginados.pagina(busca.orgaos, consulta, pagina_atual, "orgao_figura_")
+        await query.edit_message_reply_markup(reply_markup=teclado)
         return ORGAO_PUBLICO_FOR_FIGURA_PAGINACAO
 
     elif data == "orgao_figura_voltar":
         pagina_atual = max(0, pagina_atual - 1)
         context.user_data["temp_orgao_pagina_for_figura"] = pagina_atual
-        botoes, _ = utils.botoes_pagina(resultados, pagina_atual, prefix="orgao_figura_")
-        for linha in botoes:
-            linha[:] = [btn for btn in linha if "refazer_busca" not in btn.callback_data]
-        await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(botoes))
+        teclado = teclados.paginados.pagina(busca.orgaos, consulta, pagina_atual, "orgao_figura_")
+        await query.edit_message_reply_markup(reply_markup=teclado)
         return ORGAO_PUBLICO_FOR_FIGURA_PAGINACAO
 
     elif data == "orgao_figura_inserir_manual":
         await query.message.reply_text("✍️ Digite manualmente o nome do <b>órgão público</b> desta figura:", parse_mode=ParseMode.HTML)
         return ORGAO_PUBLICO_FOR_FIGURA_MANUAL
 
+    elif data == "orgao_figura_refazer_busca":
+        await query.message.reply_text("🔄 Ok, vamos refazer a busca. Digite uma nova <b>palavra-chave</b> para o órgão público:", parse_mode=ParseMode.HTML)
+        return ORGAO_PUBLICO_FOR_FIGURA_KEYWORD
+
     else:
-        orgao_selecionado = data.replace("orgao_figura_", "")
+        orgao_selecionado = callback_codec.decodificar(data, "orgao_figura_")
+        if orgao_selecionado is None:
+            await query.message.reply_text("⚠️ Essa opção não está mais disponível. Digite uma nova <b>palavra-chave</b> para o órgão público:", parse_mode=ParseMode.HTML)
+            return ORGAO_PUBLICO_FOR_FIGURA_KEYWORD
         context.user_data["nova_figura_orgao"] = {"orgao_publico": orgao_selecionado}
+        busca.orgaos.registrar_uso(orgao_selecionado)
         await query.message.edit_text(f"🏢 Órgão selecionado: <b>{orgao_selecionado}</b>.", parse_mode=ParseMode.HTML)
         await query.message.reply_text("🧑‍💼 Agora, digite o <b>nome completo da figura pública</b>:", parse_mode=ParseMode.HTML)
         return FIGURA_PUBLICA_FOR_FIGURA
@@ -240,7 +260,9 @@ async def orgao_paginacao_for_figura(update: Update, context: ContextTypes.DEFAU
 async def orgao_manual_for_figura(update: Update, context: ContextTypes.DEFAULT_TYPE):
     nome = update.message.text.strip()
     context.user_data["nova_figura_orgao"] = {"orgao_publico": nome}
+    # Entra no CSV e no índice de busca na hora (o catálogo avisa o índice).
     utils.salvar_orgao(nome)
+    busca.orgaos.registrar_uso(nome)
     await update.message.reply_text(f"✔️ Órgão público registrado manualmente: <b>{nome}</b>.", parse_mode=ParseMode.HTML)
     await update.message.reply_text("🧑‍💼 Agora, digite o <b>nome completo da figura pública</b>:", parse_mode=ParseMode.HTML)
     return FIGURA_PUBLICA_FOR_FIGURA
@@ -269,11 +291,7 @@ async def salvar_figura_orgao_set(update: Update, context: ContextTypes.DEFAULT_
     if fig_org_set:
         context.user_data.setdefault("figuras_orgaos", []).append(fig_org_set)
 
-    buttons = [
-        [InlineKeyboardButton("➕ Adicionar outra Figura/Órgão", callback_data="add_figura_orgao")],
-        [InlineKeyboardButton("✅ Finalizar Figuras/Órgãos", callback_data="fim_figuras_orgaos")],
-    ]
-    reply_markup = InlineKeyboardMarkup(buttons)
+    reply_markup = teclados.fixo("figura_orgao_mais")
 
     # Responde à mensagem ou edita a query.
     if update.callback_query:
@@ -296,9 +314,7 @@ async def salvar_figura_orgao_set(update: Update, context: ContextTypes.DEFAULT_
 
 # --- Etapa: Assunto (Menu Inicial e Busca) ---
 async def solicitar_assunto_inicial(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    buttons = [InlineKeyboardButton(assunto, callback_data=f"assunto_pre_{assunto}") for assunto in config.PREDEFINED_ASSUNTOS]
-    buttons.append(InlineKeyboardButton("Outro (digitar ou buscar)", callback_data="assunto_outro"))
-    keyboard = InlineKeyboardMarkup(utils.build_menu(buttons, n_cols=2)) 
+    keyboard = teclados.fixo("assunto_inicial")
 
     if update.message:
         await update.message.reply_text("✉️ Por favor, selecione o <b>assunto</b> da ocorrência nas opções abaixo:", reply_markup=keyboard, parse_mode=ParseMode.HTML)
@@ -316,8 +332,12 @@ async def assunto_inicial_escolha(update: Update, context: ContextTypes.DEFAULT_
         await query.message.edit_text("✍️ Entendido. Por favor, digite uma <b>palavra-chave</b> para buscar ou o <b>assunto completo</b> que deseja registrar:", parse_mode=ParseMode.HTML)
         return ASSUNTO_PALAVRA_CHAVE 
     else:
-        assunto_selecionado = data.replace("assunto_pre_", "")
+        assunto_selecionado = callback_codec.decodificar(data, "assunto_pre_")
+        if assunto_selecionado is None:
+            await query.message.reply_text("⚠️ Essa opção não está mais disponível. Digite uma <b>palavra-chave</b> para buscar o assunto:", parse_mode=ParseMode.HTML)
+            return ASSUNTO_PALAVRA_CHAVE
         context.user_data["assunto"] = assunto_selecionado
+        busca.assuntos.registrar_uso(assunto_selecionado)
         await query.message.edit_text(f"✅ Assunto selecionado: <b>{assunto_selecionado}</b>.", parse_mode=ParseMode.HTML)
         await query.message.reply_text("🏙️ Quase lá! Em qual <b>município</b> a ocorrência aconteceu?", parse_mode=ParseMode.HTML)
         return MUNICIPIO 
@@ -325,18 +345,17 @@ async def assunto_inicial_escolha(update: Update, context: ContextTypes.DEFAULT_
 
 # --- Etapa: Assunto (Lógica de Busca/Paginação Existente) ---
 async def buscar_assunto(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    palavra_chave = update.message.text.lower()
-    assuntos = utils.ler_assuntos_csv() 
-    resultados = [a for a in assuntos if palavra_chave in a.lower()]
-    context.user_data['assuntos_busca'] = resultados
+    palavra_chave = update.message.text.strip()
+    # Índice em memória: ignora acentos, aceita prefixos/erros de digitação e ordena por relevância e uso.
+    resultados = busca.assuntos.resultados(palavra_chave)
+    context.user_data['assunto_consulta'] = palavra_chave
     context.user_data['assunto_pagina'] = 0
 
     if not resultados:
         await update.message.reply_text("❗ Nenhum assunto encontrado com essa palavra-chave. Por favor, digite <b>manualmente o assunto completo</b>:", parse_mode=ParseMode.HTML)
         return ASSUNTO_MANUAL
     
-    buttons, pagina_atual = utils.botoes_pagina(resultados, 0, prefix="assunto_")
-    keyboard = InlineKeyboardMarkup(buttons)
+    keyboard = teclados.paginados.pagina(busca.assuntos, palavra_chave, 0, "assunto_")
     await update.message.reply_text(f"🔎 Encontrei <b>{len(resultados)} resultados</b> para '<i>{palavra_chave}</i>'. Selecione abaixo ou navegue nas opções:", reply_markup=keyboard, parse_mode=ParseMode.HTML)
     return ASSUNTO_PAGINACAO
 
@@ -347,20 +366,20 @@ async def assunto_paginacao(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data
 
     pagina_atual = context.user_data.get("assunto_pagina", 0)
-    resultados = context.user_data.get("assuntos_busca", [])
+    consulta = context.user_data.get("assunto_consulta", "")
 
     if data == "assunto_proximo":
         pagina_atual += 1
         context.user_data["assunto_pagina"] = pagina_atual
-        botoes, _ = utils.botoes_pagina(resultados, pagina_atual, prefix="assunto_")
-        await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(botoes))
+        teclado = teclados.paginados.pagina(busca.assuntos, consulta, pagina_atual, "assunto_")
+        await query.edit_message_reply_markup(reply_markup=teclado)
         return ASSUNTO_PAGINACAO
 
     elif data == "assunto_voltar":
         pagina_atual = max(0, pagina_atual - 1)
         context.user_data["assunto_pagina"] = pagina_atual
-        botoes, _ = utils.botoes_pagina(resultados, pagina_atual, prefix="assunto_")
-        await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(botoes))
+        teclado = teclados.paginados.pagina(busca.assuntos, consulta, pagina_atual, "assunto_")
+        await query.edit_message_reply_markup(reply_markup=teclado)
         return ASSUNTO_PAGINACAO
 
     elif data == "assunto_inserir_manual":
@@ -372,8 +391,12 @@ async def assunto_paginacao(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ASSUNTO_PALAVRA_CHAVE
 
     else:
-        assunto_selecionado = data.replace("assunto_", "")
+        assunto_selecionado = callback_codec.decodificar(data, "assunto_")
+        if assunto_selecionado is None:
+            await query.message.reply_text("⚠️ Essa opção não está mais disponível. Digite uma <b>palavra-chave</b> para buscar o assunto:", parse_mode=ParseMode.HTML)
+            return ASSUNTO_PALAVRA_CHAVE
         context.user_data["assunto"] = assunto_selecionado
+        busca.assuntos.registrar_uso(assunto_selecionado)
         await query.message.edit_text(f"✅ Assunto selecionado: <b>{assunto_selecionado}</b>.", parse_mode=ParseMode.HTML)
         await query.message.reply_text("🏙️ Quase lá! Em qual <b>município</b> a ocorrência aconteceu?", parse_mode=ParseMode.HTML)
         return MUNICIPIO
@@ -383,25 +406,61 @@ async def assunto_manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assunto = update.message.text.strip()
     context.user_data['assunto'] = assunto
     utils.salvar_assunto(assunto) 
+    busca.assuntos.registrar_uso(assunto)
     await update.message.reply_text(f"✅ Assunto registrado: <b>{assunto}</b>.", parse_mode=ParseMode.HTML)
     await update.message.reply_text("🏙️ Quase lá! Em qual <b>município</b> a ocorrência aconteceu?", parse_mode=ParseMode.HTML)
     return MUNICIPIO
 
 
 # --- Etapa: Município ---
+# O nome digitado é conferido com a lista offline de municípios; grava-se o nome oficial e o código IBGE.
 async def municipio(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data['municipio'] = update.message.text.strip().upper()
-    await update.message.reply_text(f"✅ Município registrado: <b>{context.user_data['municipio']}</b>.", parse_mode=ParseMode.HTML)
-    return await solicitar_data(update, context) 
+    texto = update.message.text.strip()
+    encontrado = municipios.indice.exato(texto)
+    if encontrado:
+        _guardar_municipio(context, encontrado.nome, encontrado.codigo)
+        await update.message.reply_text(f"✅ Município registrado: <b>{context.user_data['municipio']}</b>.", parse_mode=ParseMode.HTML)
+        return await solicitar_data(update, context)
+
+    context.user_data['municipio_digitado'] = texto
+    sugestoes = municipios.indice.sugerir(texto)
+    buttons = [[InlineKeyboardButton(m.nome, callback_data=f"municipio_{m.codigo}")] for m in sugestoes]
+    buttons.append([InlineKeyboardButton(f"✏️ Usar \"{texto}\" mesmo assim", callback_data="municipio_digitado")])
+    if sugestoes:
+        msg = "🔎 Você quis dizer um destes <b>municípios</b>? Selecione abaixo ou digite o nome de novo:"
+    else:
+        msg = "❗ Não encontrei esse <b>município</b> na lista. Digite o nome de novo ou use como foi digitado:"
+    await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=ParseMode.HTML)
+    return MUNICIPIO
+
+async def municipio_escolha(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    data = query.data
+
+    digitado = context.user_data.pop('municipio_digitado', None)
+    if data == "municipio_digitado":
+        nome, codigo = digitado, ""
+    else:
+        encontrado = municipios.indice.por_codigo(data.replace("municipio_", ""))
+        nome, codigo = (encontrado.nome, encontrado.codigo) if encontrado else (None, "")
+
+    if not nome:
+        await query.message.reply_text("⚠️ Essa opção não está mais disponível. Digite o nome do <b>município</b>:", parse_mode=ParseMode.HTML)
+        return MUNICIPIO
+
+    _guardar_municipio(context, nome, codigo)
+    await query.message.edit_text(f"✅ Município registrado: <b>{context.user_data['municipio']}</b>.", parse_mode=ParseMode.HTML)
+    return await solicitar_data(update, context)
+
+def _guardar_municipio(context: ContextTypes.DEFAULT_TYPE, nome: str, codigo: str):
+    context.user_data['municipio'] = nome.upper()  # as planilhas já trazem o município em maiúsculas
+    context.user_data['municipio_ibge'] = codigo
 
 
 # --- Etapa: Data da Ocorrência ---
 async def solicitar_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    buttons = [
-        InlineKeyboardButton("📅 Usar data/hora atual", callback_data="data_hoje"),
-        InlineKeyboardButton("✏️ Digitar data manualmente", callback_data="data_manual"),
-    ]
-    keyboard = InlineKeyboardMarkup.from_row(buttons)
+    keyboard = teclados.fixo("data")
 
     if update.message: 
         await update.message.reply_text("🗓️ Por favor, selecione uma opção para a <b>data da ocorrência</b>:", reply_markup=keyboard, parse_mode=ParseMode.HTML)
@@ -421,11 +480,7 @@ async def data(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.message.edit_text(f"✅ Data registrada: <b>{dt.strftime('%Y/%m/%d %H:%M')}</b>.", parse_mode=ParseMode.HTML)
 
             # Pula diretamente para a etapa de demanda
-            buttons = [
-                [InlineKeyboardButton("➕ Adicionar demanda", callback_data="add_demanda")],
-                [InlineKeyboardButton("⏭️ Pular demandas", callback_data="fim_demandas")], 
-            ]
-            reply_markup = InlineKeyboardMarkup(buttons)
+            reply_markup = teclados.fixo("demanda_inicial")
             await query.message.reply_text("📝 Quer adicionar uma <b>demanda</b> relacionada a esta ocorrência?", reply_markup=reply_markup, parse_mode=ParseMode.HTML)
             return DEMANDA_ESCOLHA
 
@@ -440,11 +495,7 @@ async def data(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data['data'] = dt.strftime("%Y-%m-%d")
             await update.message.reply_text(f"✅ Data registrada: <b>{dt.strftime('%Y/%m/%d')}</b>.", parse_mode=ParseMode.HTML)
 
-            buttons = [
-                [InlineKeyboardButton("➕ Adicionar demanda", callback_data="add_demanda")],
-                [InlineKeyboardButton("⏭️ Pular demandas", callback_data="fim_demandas")], 
-            ]
-            reply_markup = InlineKeyboardMarkup(buttons)
+            reply_markup = teclados.fixo("demanda_inicial")
             await update.message.reply_text("📝 Quer adicionar uma <b>demanda</b> relacionada a esta ocorrência?", reply_markup=reply_markup, parse_mode=ParseMode.HTML)
             return DEMANDA_ESCOLHA 
         except ValueError:
@@ -458,39 +509,54 @@ async def foto(update: Update, context: ContextTypes.DEFAULT_TYPE):
          await update.message.reply_text("❗ Isso não parece uma foto. Por favor, envie uma <b>foto válida</b> da ocorrência.", parse_mode=ParseMode.HTML)
          return FOTO
 
-     photo = update.message.photo[-1] 
-     telegram_file = await context.bot.get_file(photo.file_id) 
-     photo_bytes = await telegram_file.download_as_bytearray() 
+     pasta_id = os.environ.get("GOOGLE_DRIVE_PHOTOS_FOLDER_ID") or os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
+     if not pasta_id:
+         logger.error("Nenhuma pasta configurada para upload de fotos no Google Drive.")
+         await update.message.reply_text("❌ Ocorreu um erro ao enviar a foto para o Google Drive. Por favor, tente novamente.", parse_mode=ParseMode.HTML)
+         return FOTO
 
-     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-     user_id = update.effective_user.id
-     filename = f"foto_{user_id}_{timestamp}.jpg" 
+     # Nova foto (ou novo álbum) substitui as anteriores desta etapa.
+     envio_fotos.fotos.descartar(update.effective_user.id)
+     context.user_data["foto_album"] = update.message.media_group_id
+     await _agendar_foto(update, context, pasta_id)
 
-     logger.info(f"Tentando fazer upload da foto {filename} para o Google Drive.")
-     await update.message.reply_text("⏳ Enviando a foto para o Google Drive... Por favor, aguarde, isso pode levar alguns segundos.", parse_mode=ParseMode.HTML) 
-     drive_file_id = await export_data_to_drive(bytes(photo_bytes), filename) 
-    
-     if drive_file_id:
-         context.user_data["foto"] = drive_file_id 
-         logger.info(f"Foto salva no Google Drive. ID: {drive_file_id}")
-         await update.message.reply_text("✅ Foto recebida e enviada para o Google Drive com sucesso!")
-     else:
-         context.user_data["foto"] = "Erro no upload" 
-         logger.error("Falha ao enviar foto para o Google Drive.")
-         await update.message.reply_text("❌ Ocorreu um erro ao enviar a foto para o Google Drive. Por favor, tente novamente.", parse_mode=ParseMode.HTML)
-         return FOTO 
+     # O upload segue em segundo plano; a conversa continua sem esperar o Drive.
+     await update.message.reply_text("⏳ Foto recebida! Estou enviando para o Google Drive em segundo plano, pode continuar o registro.", parse_mode=ParseMode.HTML)
 
      context.user_data["demandas"] = [] 
 
-     buttons = [
-         [InlineKeyboardButton("➕ Adicionar demanda", callback_data="add_demanda")],
-         [InlineKeyboardButton("⏭️ Pular demandas", callback_data="fim_demandas")], 
-     ]
-     reply_markup = InlineKeyboardMarkup(buttons)
+     reply_markup = teclados.fixo("demanda_inicial")
 
      await update.message.reply_text("📝 Quer adicionar uma <b>demanda</b> relacionada a esta ocorrência?", reply_markup=reply_markup, parse_mode=ParseMode.HTML)
      return DEMANDA_ESCOLHA 
 
+# Demais fotos de um álbum: chegam como mensagens separadas, já na etapa de demanda.
+async def foto_album(update: Update, context: ContextTypes.DEFAULT_TYPE):
+     album = update.message.media_group_id
+     if album is None or album != context.user_data.get("foto_album"):
+         return None
+     pasta_id = os.environ.get("GOOGLE_DRIVE_PHOTOS_FOLDER_ID") or os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
+     await _agendar_foto(update, context, pasta_id)
+     return DEMANDA_ESCOLHA
+
+async def _agendar_foto(update: Update, context: ContextTypes.DEFAULT_TYPE, pasta_id: str):
+     # Com o processamento ligado, baixa só a versão do tamanho que vai para o Drive.
+     if config.FOTO_PROCESSAR:
+         photo = processamento_fotos.escolher_variante(update.message.photo)
+     else:
+         photo = update.message.photo[-1] 
+     telegram_file = await context.bot.get_file(photo.file_id) 
+
+     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+     user_id = update.effective_user.id
+     filename = f"foto_{user_id}_{timestamp}_{update.message.message_id}.jpg" 
+
+     logger.info(f"Agendando upload da foto {filename} para o Google Drive.")
+     envio_fotos.fotos.agendar(
+         user_id, context.user_data, telegram_file, filename, pasta_id,
+         context.bot, update.effective_chat.id
+     )
+
 
 # --- Etapa: Demanda ---
 async def demanda(update, context):
@@ -529,11 +595,7 @@ async def ov(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def pro(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["nova_demanda"]["pro"] = update.message.text
 
-    buttons = [
-        [InlineKeyboardButton("➕ Adicionar observação", callback_data="add_obs")],
-        [InlineKeyboardButton("⏭️ Pular observação", callback_data="skip_obs")]
-    ]
-    reply_markup = InlineKeyboardMarkup(buttons)
+    reply_markup = teclados.fixo("observacao")
     await update.message.reply_text("💬 Deseja adicionar uma <b>observação</b> específica para esta demanda?", reply_markup=reply_markup, parse_mode=ParseMode.HTML)
     return OBSERVACAO_ESCOLHA 
 
@@ -560,11 +622,7 @@ async def salvar_demanda(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if demanda:
         context.user_data.setdefault("demandas", []).append(demanda) 
 
-    buttons = [
-        [InlineKeyboardButton("➕ Adicionar outra demanda", callback_data="add_demanda")],
-        [InlineKeyboardButton("✅ Finalizar demandas", callback_data="fim_demandas")],
-    ]
-    reply_markup = InlineKeyboardMarkup(buttons)
+    reply_markup = teclados.fixo("demanda_mais")
 
     if update.callback_query:
         await update.callback_query.answer()
@@ -595,9 +653,14 @@ async def resumo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END 
 
     dados = context.user_data 
+    # Chave de idempotência da ocorrência: confirmar de novo não gera outra exportação.
+    dados.setdefault('registro_id', diario_exportacao.novo_registro_id())
 
+    situacao_foto = envio_fotos.fotos.situacao(update.effective_user.id)
+    if situacao_foto:
+        dados['foto'] = situacao_foto
     foto_info = dados.get('foto', 'N/A')
-    if foto_info != 'N/A' and foto_info != 'Erro no upload':
+    if foto_info not in ('N/A', envio_fotos.FOTO_ERRO, envio_fotos.FOTO_ENVIANDO):
         foto_display = f"ID no Drive: <code>{foto_info}</code>"
     else:
         foto_display = foto_info
@@ -638,11 +701,7 @@ async def resumo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         resumo_texto += "<i>Nenhuma demanda adicional registrada.</i>\n" 
 
-    buttons = [
-        [InlineKeyboardButton("✅ Confirmar e Salvar", callback_data="confirmar_salvar")],
-        [InlineKeyboardButton("❌ Cancelar Tudo", callback_data="cancelar_resumo")],
-    ]
-    reply_markup = InlineKeyboardMarkup(buttons)
+    reply_markup = teclados.fixo("confirmacao")
 
     await message_target.reply_text(
         resumo_texto,
@@ -660,13 +719,27 @@ async def confirmacao(update, context):
     data = query.data
 
     if data == "confirmar_salvar":
+        # Fotos ainda subindo para o Drive: espera os IDs antes de copiar os dados.
+        situacao_foto = await envio_fotos.fotos.aguardar(update.effective_user.id)
+        if situacao_foto:
+            context.user_data["foto"] = situacao_foto
+        elif context.user_data.get("foto") == envio_fotos.FOTO_ENVIANDO:
+            # Upload de antes de um reinício do bot: não há mais tarefa para esperar.
+            context.user_data["foto"] = envio_fotos.FOTO_ERRO
+        context.user_data.pop("foto_album", None)
         dados = dict(context.user_data)  # Faz uma cópia segura dos dados
-        utils.exportar_demandas_para_drive(dados, dados.get("demandas", []))
-        utils.exportar_reunioes_para_drive(dados)
+        # A gravação no Drive é feita pela fila de exportação, fora do event loop.
+        # O usuário recebe outra mensagem quando as linhas chegarem nas planilhas.
+        if await fila_exportacao.fila.enfileirar(dados, query.message.chat_id):
+            texto = "📨 Registro confirmado! Estou gravando os dados nas planilhas do Google Drive e aviso assim que terminar."
+        else:
+            texto = "ℹ️ Este registro já tinha sido confirmado; não vou gravá-lo de novo."
+        # Já está no diário; a próxima ocorrência ganha outro id no resumo.
+        context.user_data.pop("registro_id", None)
 
-        await context.bot.send_message( # <--- CORREÇÃO AQUI
+        await context.bot.send_message(
             chat_id=query.message.chat_id,
-            text= "🎉 Dados salvos com sucesso no banco de dados e nos arquivos Excel do Google Drive! Muito obrigado pelo seu registro.", 
+            text=texto,
             parse_mode=ParseMode.HTML
         )
         context.user_data.clear() 
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import threading
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class IndiceFotos:
+    """
+    Índice local das fotos já enviadas ao Drive, para não subir duas vezes a mesma imagem.
+
+    Guarda duas chaves para o mesmo ID do Drive: o `file_unique_id` do Telegram (conhecido
+    antes de baixar a foto) e o SHA-256 do conteúdo (pega reenvios da mesma imagem como
+    outro arquivo). Persistido em JSON lines em `caminho`, só por anexação:
+      {"drive_id": ..., "sha256": ..., "file_unique_id": ...}
+      {"removido": drive_id}
+    Na carga o arquivo é reescrito só com as entradas vivas quando as linhas superadas
+    passam da metade.
+    """
+
+    def __init__(self, caminho: str = config.INDICE_FOTOS_PATH):
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._por_unique: dict[str, str] = {}
+        self._por_hash: dict[str, str] = {}
+        self._carregado = False
+
+    def _carregar(self):
+        if self._carregado:
+            return
+        linhas = 0
+        try:
+            with open(self.caminho, encoding="utf-8") as f:
+                for numero, linha in enumerate(f, 1):
+                    if not linha.strip():
+                        continue
+                    linhas += 1
+                    try:
+                        self._aplicar(json.loads(linha))
+                    except (json.JSONDecodeError, AttributeError) as e:
+                        # Uma linha cortada no fim do arquivo (queda no meio da escrita) é ignorada.
+                        logger.warning(f"Linha {numero} do índice de fotos ilegível ({e}); ignorada.")
+        except FileNotFoundError:
+            pass
+        self._carregado = True
+        if linhas > 2 * (len(self._por_unique) + len(self._por_hash)):
+            self._compactar()
+
+    def _aplicar(self, evento: dict):
+        if "removido" in evento:
+            drive_id = evento["removido"]
+            self._por_unique = {k: v for k, v in self._por_unique.items() if v != drive_id}
+            self._por_hash = {k: v for k, v in self._por_hash.items() if v != drive_id}
+            return
+        if evento.get("sha256"):
+            self._por_hash[evento["sha256"]] = evento["drive_id"]
+        if evento.get("file_unique_id"):
+            self._por_unique[evento["file_unique_id"]] = evento["drive_id"]
+
+    def _anexar(self, evento: dict):
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        with open(self.caminho, "a", encoding="utf-8") as f:
+            f.write(json.dumps(evento) + "\n")
+
+    def _compactar(self):
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            for sha256, drive_id in self._por_hash.items():
+                f.write(json.dumps({"drive_id": drive_id, "sha256": sha256}) + "\n")
+            for file_unique_id, drive_id in self._por_unique.items():
+                f.write(json.dumps({"drive_id": drive_id, "file_unique_id": file_unique_id}) + "\n")
+        os.replace(temporario, self.caminho)
+
+    def por_unique_id(self, file_unique_id: str | None) -> str | None:
+        if not file_unique_id:
+            return None
+        with self._trava:
+            self._carregar()
+            return self._por_unique.get(file_unique_id)
+
+    def por_hash(self, sha256: str) -> str | None:
+        with self._trava:
+            self._carregar()
+            return self._por_hash.get(sha256)
+
+    def registrar(self, drive_id: str, sha256: str | None = None, file_unique_id: str | None = None):
+        evento = {"drive_id": drive_id, "sha256": sha256, "file_unique_id": file_unique_id}
+        with self._trava:
+            self._carregar()
+            self._anexar(evento)
+            self._aplicar(evento)
+
+    def remover(self, drive_id: str):
+        """Tira do índice um arquivo que não existe mais no Drive."""
+        evento = {"removido": drive_id}
+        with self._trava:
+            self._carregar()
+            self._anexar(evento)
+            self._aplicar(evento)
+
+
+indice = IndiceFotos()
@@ -1,8 +1,14 @@
+import time
+_INICIO = time.perf_counter()  # partida do processo, para o orçamento de inicialização
+
 import os
+import asyncio
+import hmac
 import logging
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 import uvicorn
 
 from telegram import Update
@@ -15,8 +21,19 @@ from telegram.ext import (
     filters,
 )
 
+import config
 import handlers
-from exportar_para_excel import exportar_dataframe_para_drive as export_data_to_drive
+import envio_fotos
+import fila_exportacao
+import fila_updates
+import processamento_fotos
+import drive_cliente
+import metricas
+import persistencia
+import utils
+
+# pandas, googleapiclient e openpyxl não são importados aqui: carregam no primeiro uso.
+_DURACAO_IMPORTACAO = time.perf_counter() - _INICIO
 
 # Carregar variáveis do .env (rail.env)
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -38,6 +55,17 @@ application = None
 bot_just_started = False
 
 
+# Segredo do webhook (WEBHOOK_SECRET): enviado ao Telegram no /setwebhook e conferido no
+# cabeçalho de cada POST. Também protege o /metricas, que sem segredo só responde localmente.
+CABECALHO_SEGREDO = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def _segredo_confere(request: Request) -> bool:
+    segredo = os.getenv("WEBHOOK_SECRET")
+    recebido = request.headers.get(CABECALHO_SEGREDO, "")
+    return bool(segredo) and hmac.compare_digest(recebido.encode(), segredo.encode())
+
+
 # Handlers do Telegram
 
 async def start(update: Update, context):
@@ -61,6 +89,8 @@ async def salvar_onedrive_telegram(update: Update, context):
         "⏳ Iniciando a exportação dos dados para o Google Drive. Isso pode levar um momento..."
     )
     try:
+        from exportar_para_excel import exportar_dataframe_para_drive as export_data_to_drive  # pandas só quando usado
+
         export_data_to_drive()
         await update.message.reply_text("✅ Dados salvos no Google Drive com sucesso!")
     except Exception as e:
@@ -86,7 +116,7 @@ async def set_webhook_command(update: Update, context):
     logger.info(f"Tentando configurar webhook para URL: {full_webhook_url}")
 
     try:
-        await application.bot.set_webhook(url=full_webhook_url)
+        await application.bot.set_webhook(url=full_webhook_url, secret_token=os.getenv("WEBHOOK_SECRET") or None)
         success_msg = f"✅ Webhook configurado com sucesso para: <code>{full_webhook_url}</code>"
         await update.message.reply_text(success_msg, parse_mode="HTML")
         logger.info(success_msg)
@@ -97,43 +127,58 @@ async def set_webhook_command(update: Update, context):
 
 
 # Endpoint para receber updates do Telegram via webhook
+# Só valida e enfileira: o Telegram recebe 200 na hora, sem esperar handlers nem o Drive.
 @app.post("/webhook")
 async def telegram_webhook_receiver(request: Request):
-    logger.info("Requisição POST recebida no endpoint /webhook.")
+    logger.debug("Requisição POST recebida no endpoint /webhook.")
+    if application is None:
+        logger.error("Erro: Instância 'application' do bot não inicializada no webhook.")
+        return JSONResponse({"status": "error", "message": "Bot application not initialized"}, status_code=503)
+    if os.getenv("WEBHOOK_SECRET") and not _segredo_confere(request):
+        metricas.incrementar("webhook.segredo_invalido")
+        logger.warning("POST no /webhook sem o segredo correto; recusado.")
+        return JSONResponse({"status": "forbidden"}, status_code=403)
+
     try:
         request_json = await request.json()
         logger.debug(f"JSON recebido no webhook: {request_json}")
+        # Reenvio do Telegram de um update já aceito: responde ok sem montar o Update.
+        if fila_updates.vistos.repetido(request_json.get("update_id")):
+            metricas.incrementar("webhook.duplicados")
+            logger.info(f"Update {request_json.get('update_id')} repetido ignorado.")
+            return {"status": "ok"}
+        update = Update.de_json(request_json, application.bot)
+    except Exception as e:
+        logger.error(f"Update inválido recebido no webhook: {e}", exc_info=True)
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
 
-        global application, bot_just_started
-        if application is None:
-            logger.error("Erro: Instância 'application' do bot não inicializada no webhook.")
-            return {"status": "error", "message": "Bot application not initialized"}, 500
+    if not fila_updates.fila.aceitar(update):
+        return JSONResponse({"status": "busy"}, status_code=503)
+    fila_updates.vistos.marcar(update.update_id)
+    logger.info(f"Update do Telegram {update.update_id} enfileirado.")
+    return {"status": "ok"}
 
-        update = Update.de_json(request_json, application.bot)
-        logger.info(f"Update do Telegram processado: {update.update_id}")
-
-        if bot_just_started:
-            try:
-                await application.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=(
-                        "👋 Olá! Eu acabei de acordar e estou pronto para processar sua solicitação. "
-                        "Por favor, aguarde a resposta ao seu comando."
-                    ),
-                )
-                logger.info(f"Notificação de 'bot acordado' enviada para usuário {update.effective_chat.id}.")
-                bot_just_started = False
-            except Exception as e:
-                logger.error(
-                    f"Erro ao enviar notificação de 'bot acordado' para usuário: {e}", exc_info=True
-                )
-
-        await application.process_update(update)
-        return {"status": "ok"}
 
-    except Exception as e:
-        logger.error(f"Erro ao processar webhook do Telegram: {e}", exc_info=True)
-        return {"status": "error", "message": str(e)}, 500
+# Roda nos workers da fila de updates, em ordem dentro de cada chat
+async def processar_update(update: Update):
+    global bot_just_started
+    if bot_just_started and update.effective_chat:
+        bot_just_started = False
+        try:
+            await application.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=(
+                    "👋 Olá! Eu acabei de acordar e estou pronto para processar sua solicitação. "
+                    "Por favor, aguarde a resposta ao seu comando."
+                ),
+            )
+            logger.info(f"Notificação de 'bot acordado' enviada para usuário {update.effective_chat.id}.")
+        except Exception as e:
+            logger.error(
+                f"Erro ao enviar notificação de 'bot acordado' para usuário: {e}", exc_info=True
+            )
+
+    await application.process_update(update)
 
 
 # Função para construir o ConversationHandler com seus handlers
@@ -149,6 +194,10 @@ def build_conversation_handler():
             handlers.TIPO_VISITA: [CallbackQueryHandler(handlers.tipo_visita_escolha)],
             handlers.TIPO_ATENDIMENTO: [CallbackQueryHandler(handlers.tipo_atendimento_escolha)],
             handlers.ORGAO_FIGURA_CARGO_ESCOLHA: [CallbackQueryHandler(handlers.figura_orgao_escolha)],
+            handlers.ORGAO_PUBLICO_FOR_FIGURA_KEYWORD: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.buscar_orgao_for_figura),
+                CallbackQueryHandler(handlers.orgao_paginacao_for_figura),
+            ],
             handlers.ORGAO_PUBLICO_FOR_FIGURA_PAGINACAO: [CallbackQueryHandler(handlers.orgao_paginacao_for_figura)],
             handlers.ORGAO_PUBLICO_FOR_FIGURA_MANUAL: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.orgao_manual_for_figura)],
             handlers.FIGURA_PUBLICA_FOR_FIGURA: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.figura_publica_input_for_figura)],
@@ -158,11 +207,17 @@ def build_conversation_handler():
             handlers.ASSUNTO_PALAVRA_CHAVE: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.buscar_assunto)],
             handlers.ASSUNTO_PAGINACAO: [CallbackQueryHandler(handlers.assunto_paginacao)],
             handlers.ASSUNTO_MANUAL: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.assunto_manual)],
-            handlers.MUNICIPIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.municipio)],
+            handlers.MUNICIPIO: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.municipio),
+                CallbackQueryHandler(handlers.municipio_escolha, pattern="^municipio_"),
+            ],
             handlers.DATA: [CallbackQueryHandler(handlers.data)],
             handlers.DATA_MANUAL: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.data)],
             handlers.FOTO: [MessageHandler(filters.PHOTO & ~filters.COMMAND, handlers.foto)],
-            handlers.DEMANDA_ESCOLHA: [CallbackQueryHandler(handlers.demanda)],
+            handlers.DEMANDA_ESCOLHA: [
+                CallbackQueryHandler(handlers.demanda),
+                MessageHandler(filters.PHOTO & ~filters.COMMAND, handlers.foto_album),
+            ],
             handlers.DEMANDA_DIGITAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.demanda_digitar)],
             handlers.OV: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.ov)],
             handlers.PRO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.pro)],
@@ -172,6 +227,8 @@ def build_conversation_handler():
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
         allow_reentry=True,
+        name="registro_ocorrencia",
+        persistent=True,  # o estado volta do SQLite depois de um reinício (persistencia.py)
     )
     return conv_handler
 
@@ -182,13 +239,14 @@ async def startup_event():
     global application, bot_just_started
 
     logger.info("FastAPI startup event triggered.")
+    config.inicializar()
 
     token = os.getenv("BOT_TOKEN")
     if not token:
         logger.error("Erro: BOT_TOKEN não encontrado nas variáveis de ambiente ou no arquivo .env.")
         return
 
-    application = ApplicationBuilder().token(token).build()
+    application = ApplicationBuilder().token(token).persistence(persistencia.PersistenciaSQLite()).build()
 
     # Handlers simples
     application.add_handler(CommandHandler("start", start))
@@ -206,6 +264,16 @@ async def startup_event():
     await application.start()
     logger.info("Telegram Application iniciado.")
 
+    await fila_exportacao.fila.iniciar(application.bot)
+    await fila_updates.fila.iniciar(processar_update)
+
+    # Resolve em segundo plano os IDs das planilhas, poupando a consulta na 1ª exportação
+    asyncio.create_task(asyncio.to_thread(
+        drive_cliente.pre_aquecer_ids,
+        utils.planilhas_correntes(),
+        os.environ.get("GOOGLE_DRIVE_FOLDER_ID"),
+    ))
+
     # Notificar admin (se variável existir)
     admin_telegram_id_str = os.getenv("ADMIN_TELEGRAM_ID")
     if admin_telegram_id_str:
@@ -223,13 +291,29 @@ async def startup_event():
 
     bot_just_started = True
 
+    duracao = time.perf_counter() - _INICIO
+    metricas.registrar_tempo("inicializacao.importacao", _DURACAO_IMPORTACAO)
+    metricas.registrar_tempo("inicializacao.total", duracao)
+    if duracao > config.INICIALIZACAO_ORCAMENTO_S:
+        logger.warning(
+            f"Partida levou {duracao:.2f}s (importação {_DURACAO_IMPORTACAO:.2f}s), acima do orçamento de "
+            f"{config.INICIALIZACAO_ORCAMENTO_S:.1f}s. Veja `python perfil_inicializacao.py`."
+        )
+    else:
+        logger.info(f"Partida em {duracao:.2f}s (importação {_DURACAO_IMPORTACAO:.2f}s).")
+
 
 # Evento de shutdown do FastAPI - para o bot
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("FastAPI shutdown event triggered.")
+    await fila_updates.fila.parar()
+    await fila_exportacao.fila.parar()
+    await envio_fotos.fotos.fechar()
+    processamento_fotos.encerrar()
     if application:
         await application.stop()
+        await application.shutdown()  # grava o que falta da persistência
         logger.info("Telegram Application parado.")
 
 
@@ -240,6 +324,16 @@ async def ping_endpoint():
     return {"status": "OK", "message": "Bot is alive!"}
 
 
+# Endpoint com contadores e tempos do processo (ex.: duração das escritas por planilha)
+# Estado interno (Drive, filas): exige o segredo do webhook ou, sem ele configurado, acesso local.
+@app.get("/metricas")
+async def metricas_endpoint(request: Request):
+    local = request.client is not None and request.client.host in ("127.0.0.1", "::1")
+    if not (_segredo_confere(request) or (local and not os.getenv("WEBHOOK_SECRET"))):
+        return JSONResponse({"status": "forbidden"}, status_code=403)
+    return metricas.snapshot()
+
+
 # Execução local com Uvicorn
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,42 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Contadores e tempos do processo, expostos em GET /metricas.
+# Tudo em memória: zera a cada reinício do serviço.
+
+_trava = threading.Lock()
+_contadores: dict[str, float] = {}
+_tempos: dict[str, dict] = {}
+
+
+def incrementar(nome: str, valor: float = 1):
+    with _trava:
+        _contadores[nome] = _contadores.get(nome, 0) + valor
+
+
+def registrar_tempo(nome: str, segundos: float):
+    with _trava:
+        t = _tempos.setdefault(nome, {"quantidade": 0, "total_s": 0.0, "maximo_s": 0.0, "ultimo_s": 0.0})
+        t["quantidade"] += 1
+        t["total_s"] += segundos
+        t["maximo_s"] = max(t["maximo_s"], segundos)
+        t["ultimo_s"] = segundos
+
+
+@contextmanager
+def cronometro(nome: str):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_tempo(nome, time.perf_counter() - inicio)
+
+
+def snapshot() -> dict:
+    with _trava:
+        tempos = {
+            nome: {**t, "media_s": t["total_s"] / t["quantidade"] if t["quantidade"] else 0.0}
+            for nome, t in _tempos.items()
+        }
+        return {"contadores": dict(_contadores), "tempos": tempos}
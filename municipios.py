@@ -0,0 +1,122 @@
+import bisect
+import csv
+import logging
+import threading
+from typing import NamedTuple
+
+import busca
+import catalogo
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Municipio(NamedTuple):
+    codigo: str  # código IBGE de 7 dígitos
+    nome: str
+    uf: str
+
+
+def digito_verificador(codigo: str) -> int:
+    """Dígito verificador do código IBGE: pesos 1,2,1,2,1,2 nos seis primeiros dígitos, somando os algarismos de cada produto."""
+    soma = 0
+    for digito, peso in zip(codigo[:6], (1, 2, 1, 2, 1, 2)):
+        produto = int(digito) * peso
+        soma += produto // 10 + produto % 10
+    return (10 - soma % 10) % 10
+
+
+def codigo_valido(codigo: str) -> bool:
+    return len(codigo) == 7 and codigo.isdigit() and int(codigo[6]) == digito_verificador(codigo)
+
+
+class IndiceMunicipios:
+    """
+    Municípios da lista offline (listas/municipios.csv), com busca por prefixo que ignora
+    acentos e maiúsculas. O CSV só é lido na primeira consulta; linhas com código IBGE
+    inválido são descartadas com aviso.
+
+    Cada palavra do nome entra numa lista ordenada, então "cach" acha "Cachoeiro de
+    Itapemirim" e "itapemirim" acha também "Itapemirim" por busca binária.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._municipios: list[Municipio] | None = None
+        self._dobrados: list[str] = []
+        self._por_nome: dict[str, int] = {}
+        self._por_codigo: dict[str, int] = {}
+        self._palavras: list[tuple[str, int]] = []
+
+    def _carregar(self) -> list[Municipio]:
+        with self._trava:
+            if self._municipios is not None:
+                return self._municipios
+            municipios = []
+            try:
+                with open(self.caminho, newline="", encoding="utf-8") as f:
+                    for linha in csv.DictReader(f):
+                        codigo = (linha.get("codigo_ibge") or "").strip()
+                        if not codigo_valido(codigo):
+                            logger.warning(f"Código IBGE inválido ignorado em {self.caminho}: '{codigo}' ({linha.get('nome')}).")
+                            continue
+                        municipios.append(Municipio(codigo, linha["nome"].strip(), (linha.get("uf") or "").strip()))
+            except FileNotFoundError:
+                logger.warning(f"Lista de municípios não encontrada em {self.caminho}. Sugestões desativadas.")
+
+            for posicao, municipio in enumerate(municipios):
+                dobrado = catalogo.normalizar(municipio.nome)
+                self._dobrados.append(dobrado)
+                self._por_nome.setdefault(dobrado, posicao)
+                self._por_codigo[municipio.codigo] = posicao
+                for palavra in busca.tokens(dobrado):
+                    self._palavras.append((palavra, posicao))
+            self._palavras.sort()
+            self._municipios = municipios
+            logger.info(f"Lista de municípios carregada: {len(municipios)} município(s).")
+            return municipios
+
+    def por_codigo(self, codigo: str) -> Municipio | None:
+        municipios = self._carregar()
+        posicao = self._por_codigo.get(codigo)
+        return None if posicao is None else municipios[posicao]
+
+    def exato(self, texto: str) -> Municipio | None:
+        """Município cujo nome é `texto`, a menos de acentos, maiúsculas e espaços."""
+        municipios = self._carregar()
+        posicao = self._por_nome.get(catalogo.normalizar(texto))
+        return None if posicao is None else municipios[posicao]
+
+    def sugerir(self, texto: str, limite: int = 5) -> list[Municipio]:
+        """
+        Municípios em que cada palavra digitada é prefixo de uma palavra do nome; o nome que
+        começa com o texto vem primeiro. Sem nenhum casamento, tenta os nomes a um erro de
+        digitação de distância ("vitroia" → Vitória).
+        """
+        municipios = self._carregar()
+        dobrado = catalogo.normalizar(texto)
+        palavras = busca.tokens(dobrado)
+        if not palavras:
+            return []
+
+        candidatos: set[int] | None = None
+        for palavra in palavras:
+            casados = set()
+            inicio = bisect.bisect_left(self._palavras, (palavra,))
+            for candidata, posicao in self._palavras[inicio:]:
+                if not candidata.startswith(palavra):
+                    break
+                casados.add(posicao)
+            candidatos = casados if candidatos is None else candidatos & casados
+            if not candidatos:
+                break
+
+        if not candidatos:
+            candidatos = {p for p, nome in enumerate(self._dobrados) if busca.um_erro(dobrado, nome)}
+
+        ordem = sorted(candidatos, key=lambda p: (self._dobrados[p] != dobrado, not self._dobrados[p].startswith(dobrado), self._dobrados[p]))
+        return [municipios[p] for p in ordem[:limite]]
+
+
+indice = IndiceMunicipios(config.CSV_MUNICIPIOS)
@@ -0,0 +1,130 @@
+"""
+Perfil do tempo de importação do bot (cold start), com orçamento.
+
+Roda `python -X importtime -c "import main"` num processo novo (algumas vezes, fica a
+mais rápida), mostra os módulos e pacotes que mais pesam e falha (código de saída 1)
+se o total passar de IMPORTACAO_ORCAMENTO_MS ou se algum módulo que deveria carregar
+só no primeiro uso (pandas, googleapiclient, ...) entrar na partida. Os módulos de
+MODULOS_VERIFICADOS, que `main` importa só quando precisa, também não podem carregá-los.
+
+Com --historico, cada execução é anexada a um arquivo JSON lines e comparada com a
+anterior, para acompanhar o cold start de uma versão para outra.
+
+Uso:
+    python perfil_inicializacao.py
+    python perfil_inicializacao.py --repeticoes 5 --top 20 --historico perfil_inicializacao.jsonl
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+from datetime import datetime
+
+import config
+
+# Carregados só no primeiro uso (planilhas, Drive, fotos); não podem pesar na partida.
+MODULOS_ADIADOS = (
+    "pandas", "numpy", "openpyxl", "googleapiclient", "httplib2", "google_auth_httplib2",
+    "google_auth_oauthlib", "PIL",
+)
+# Importados sob demanda hoje; conferidos à parte para não dependerem do grafo de `main`.
+MODULOS_VERIFICADOS = ("drive_auth", "exportar_para_excel")
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+
+
+def medir_importacao(modulo: str) -> list[tuple[str, int, int]]:
+    """(nome, próprio_us, acumulado_us) de cada módulo importado por `import <modulo>`."""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=PASTA, capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(f"`import {modulo}` falhou:\n{resultado.stderr[-2000:]}")
+    modulos = []
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, acumulado, nome = linha[len("import time:"):].split("|", 2)
+        modulos.append((nome.strip(), int(proprio), int(acumulado)))
+    return modulos
+
+
+def commit_atual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PASTA, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modulo", default="main")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--orcamento-ms", type=float, default=config.IMPORTACAO_ORCAMENTO_MS)
+    parser.add_argument("--historico", help="arquivo JSON lines onde anexar o resultado")
+    args = parser.parse_args()
+
+    execucoes = [medir_importacao(args.modulo) for _ in range(max(1, args.repeticoes))]
+    # A execução mais rápida é a menos afetada por ruído da máquina.
+    modulos = min(execucoes, key=lambda m: next(a for n, _, a in m if n == args.modulo))
+    total_ms = next(a for n, _, a in modulos if n == args.modulo) / 1000
+
+    pacotes: Counter = Counter()
+    for nome, proprio, _ in modulos:
+        pacotes[nome.split(".")[0]] += proprio
+
+    print(f"`import {args.modulo}`: {total_ms:.0f} ms (melhor de {len(execucoes)}), {len(modulos)} módulos")
+    print(f"\nPacotes que mais pesam (tempo próprio somado):")
+    for pacote, us in pacotes.most_common(args.top):
+        print(f"  {pacote:<32} {us / 1000:>8.1f} ms")
+    print(f"\nMódulos com maior tempo acumulado:")
+    for nome, _, acumulado in sorted(modulos, key=lambda m: -m[2])[1:args.top + 1]:
+        print(f"  {nome:<48} {acumulado / 1000:>8.1f} ms")
+
+    adiados = sorted({n.split(".")[0] for n, _, _ in modulos} & set(MODULOS_ADIADOS))
+
+    if args.historico:
+        anterior = None
+        if os.path.exists(args.historico):
+            with open(args.historico, encoding="utf-8") as f:
+                linhas = [l for l in f if l.strip()]
+            anterior = json.loads(linhas[-1]) if linhas else None
+        registro = {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit_atual(),
+            "total_ms": round(total_ms, 1),
+            "pacotes_ms": {p: round(us / 1000, 1) for p, us in pacotes.most_common(args.top)},
+        }
+        with open(args.historico, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        if anterior:
+            diferenca = total_ms - anterior["total_ms"]
+            print(f"\nAnterior ({anterior.get('commit') or anterior['data']}): {anterior['total_ms']:.0f} ms ({diferenca:+.0f} ms)")
+
+    falhou = False
+    if adiados:
+        print(f"\n❌ Módulos que deveriam carregar só no primeiro uso entraram na partida: {', '.join(adiados)}")
+        falhou = True
+    for modulo in MODULOS_VERIFICADOS:
+        if modulo == args.modulo:
+            continue
+        carregados = sorted({n.split(".")[0] for n, _, _ in medir_importacao(modulo)} & set(MODULOS_ADIADOS))
+        if carregados:
+            print(f"\n❌ `import {modulo}` carrega módulos que deveriam ficar para o primeiro uso: {', '.join(carregados)}")
+            falhou = True
+    if total_ms > args.orcamento_ms:
+        print(f"\n❌ Acima do orçamento: {total_ms:.0f} ms > {args.orcamento_ms:.0f} ms")
+        falhou = True
+    if not falhou:
+        print(f"\n✅ Dentro do orçamento de {args.orcamento_ms:.0f} ms.")
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import config
+import metricas
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenciaSQLite(BasePersistence):
+    """
+    Guarda em SQLite o estado das conversas e o `user_data`, para que um registro pela
+    metade sobreviva ao sono/redeploy do Render.
+
+    - Gravação atrasada: o Application só entrega as entradas alteradas a cada
+      `update_interval` segundos; elas ficam num buffer e vão para o banco numa única
+      transação logo depois (e em `flush`, no desligamento).
+    - Carga preguiçosa: `get_user_data` não lê nada na partida; o `user_data` de cada
+      usuário é lido na primeira vez que ele manda algo (`refresh_user_data`). Os estados
+      das conversas são só (chave, número) e são lidos de uma vez.
+    """
+
+    def __init__(self, caminho: str = config.PERSISTENCIA_PATH, update_interval: float = config.PERSISTENCIA_INTERVALO):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._conexao: sqlite3.Connection | None = None
+        self._usuarios_sujos: dict[int, dict | None] = {}       # None = apagar
+        self._conversas_sujas: dict[tuple[str, str], object] = {}  # None = conversa encerrada
+        self._carregados: set[int] = set()
+        self._carregando = asyncio.Lock()
+        self._gravacao: asyncio.Task | None = None
+
+    # --- Banco ---
+
+    def _banco(self) -> sqlite3.Connection:
+        if self._conexao is None:
+            os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("CREATE TABLE IF NOT EXISTS usuarios (user_id INTEGER PRIMARY KEY, dados BLOB NOT NULL)")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS conversas (nome TEXT, chave TEXT, estado TEXT NOT NULL, PRIMARY KEY (nome, chave))"
+            )
+            conexao.commit()
+            self._conexao = conexao
+        return self._conexao
+
+    def _ler_conversas(self, nome: str) -> dict:
+        with self._trava:
+            linhas = self._banco().execute("SELECT chave, estado FROM conversas WHERE nome = ?", (nome,)).fetchall()
+        return {tuple(json.loads(chave)): json.loads(estado) for chave, estado in linhas}
+
+    def _ler_usuario(self, user_id: int) -> dict | None:
+        with self._trava:
+            linha = self._banco().execute("SELECT dados FROM usuarios WHERE user_id = ?", (user_id,)).fetchone()
+        return pickle.loads(linha[0]) if linha else None
+
+    def _gravar(self, usuarios: dict[int, dict | None], conversas: dict[tuple[str, str], object]):
+        with self._trava:
+            banco = self._banco()
+            with banco:  # uma transação para o lote inteiro
+                for user_id, dados in usuarios.items():
+                    if dados is None:
+                        banco.execute("DELETE FROM usuarios WHERE user_id = ?", (user_id,))
+                    else:
+                        banco.execute(
+                            "INSERT OR REPLACE INTO usuarios (user_id, dados) VALUES (?, ?)",
+                            (user_id, pickle.dumps(dados, protocol=pickle.HIGHEST_PROTOCOL)),
+                        )
+                for (nome, chave), estado in conversas.items():
+                    if estado is None:
+                        banco.execute("DELETE FROM conversas WHERE nome = ? AND chave = ?", (nome, chave))
+                    else:
+                        banco.execute(
+                            "INSERT OR REPLACE INTO conversas (nome, chave, estado) VALUES (?, ?, ?)",
+                            (nome, chave, json.dumps(estado)),
+                        )
+
+    # --- Gravação atrasada ---
+
+    def _agendar_gravacao(self):
+        # As entradas de uma rodada chegam juntas (o Application faz um gather); espera
+        # a rodada terminar e grava tudo de uma vez.
+        if self._gravacao is None or self._gravacao.done():
+            self._gravacao = asyncio.create_task(self._gravar_pendentes(atraso=1.0))
+
+    async def _gravar_pendentes(self, atraso: float = 0.0):
+        if atraso:
+            await asyncio.sleep(atraso)
+        usuarios, self._usuarios_sujos = self._usuarios_sujos, {}
+        conversas, self._conversas_sujas = self._conversas_sujas, {}
+        if not usuarios and not conversas:
+            return
+        try:
+            with metricas.cronometro("persistencia.gravacao"):
+                await asyncio.to_thread(self._gravar, usuarios, conversas)
+            logger.debug(f"Persistência gravada: {len(usuarios)} usuário(s), {len(conversas)} conversa(s).")
+        except Exception as e:
+            logger.error(f"Erro ao gravar a persistência das conversas: {e}", exc_info=True)
+            # Devolve ao buffer sem passar por cima do que chegou enquanto isso.
+            self._usuarios_sujos = {**usuarios, **self._usuarios_sujos}
+            self._conversas_sujas = {**conversas, **self._conversas_sujas}
+
+    async def flush(self):
+        if self._gravacao and not self._gravacao.done():
+            await self._gravacao
+        await self._gravar_pendentes()
+
+    # --- user_data ---
+
+    async def get_user_data(self) -> dict:
+        return {}  # carregado por usuário em refresh_user_data
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        if user_id in self._carregados:
+            return
+        async with self._carregando:
+            if user_id in self._carregados:
+                return
+            salvo = await asyncio.to_thread(self._ler_usuario, user_id)
+            self._carregados.add(user_id)
+        if salvo:
+            # O que já estiver em memória (deste processo) é mais novo que o banco.
+            for chave, valor in salvo.items():
+                user_data.setdefault(chave, valor)
+            metricas.incrementar("persistencia.usuarios_restaurados")
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._carregados.add(user_id)
+        self._usuarios_sujos[user_id] = data  # já é uma cópia feita pelo Application
+        self._agendar_gravacao()
+
+    async def drop_user_data(self, user_id: int):
+        self._carregados.add(user_id)
+        self._usuarios_sujos[user_id] = None
+        self._agendar_gravacao()
+
+    # --- Conversas ---
+
+    async def get_conversations(self, name: str) -> dict:
+        conversas = await asyncio.to_thread(self._ler_conversas, name)
+        if conversas:
+            logger.info(f"{len(conversas)} conversa(s) '{name}' retomada(s) da persistência.")
+        return conversas
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None):
+        self._conversas_sujas[(name, json.dumps(list(key)))] = new_state
+        self._agendar_gravacao()
+
+    # --- Não usados (store_data desliga bot_data, chat_data e callback_data) ---
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+import metricas
+
+logger = logging.getLogger(__name__)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def escolher_variante(tamanhos: list, lado_maximo: int = config.FOTO_LADO_MAXIMO):
+    """
+    Entre as versões da foto que o Telegram oferece (`message.photo`, PhotoSize), escolhe
+    a menor que ainda cobre `lado_maximo` no maior lado; se nenhuma cobre, a maior.
+    """
+    ordenados = sorted(tamanhos, key=lambda t: t.width * t.height)
+    for tamanho in ordenados:
+        if max(tamanho.width, tamanho.height) >= lado_maximo:
+            return tamanho
+    return ordenados[-1]
+
+
+def recomprimir(origem: str, destino: str, lado_maximo: int, qualidade: int):
+    """
+    Reduz a imagem do arquivo `origem` para caber em `lado_maximo` e a regrava em `destino`
+    como JPEG com `qualidade`, sem EXIF/ICC/comentários (a orientação do EXIF é aplicada
+    nos pixels antes de descartá-lo). Roda em outro processo: recebe só os caminhos, então
+    a foto não passa inteira pela memória do bot.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(origem) as imagem:
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode not in ("RGB", "L"):
+            imagem = imagem.convert("RGB")
+        imagem.thumbnail((lado_maximo, lado_maximo), Image.LANCZOS)
+        imagem.save(destino, format="JPEG", quality=qualidade, optimize=True, progressive=True)
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Nada de fork: o bot tem threads (pools do Drive, exportação) e clientes httpx, e um
+        # filho criado por fork herda travas que podem estar presas. O forkserver (spawn onde
+        # não existe) parte de um processo limpo.
+        metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, config.FOTO_PROCESSOS), mp_context=multiprocessing.get_context(metodo)
+        )
+    return _executor
+
+
+async def processar(
+    origem: str,
+    destino: str,
+    lado_maximo: int = config.FOTO_LADO_MAXIMO,
+    qualidade: int = config.FOTO_QUALIDADE_JPEG,
+) -> str:
+    """
+    Recomprime a foto do arquivo `origem` para `destino` no pool de processos e devolve o
+    caminho a enviar: `destino` ou, se não der (ex.: Pillow ausente), a própria `origem`.
+    """
+    loop = asyncio.get_running_loop()
+    inicio = time.perf_counter()
+    try:
+        await loop.run_in_executor(_pool(), recomprimir, origem, destino, lado_maximo, qualidade)
+    except Exception as e:
+        metricas.incrementar("fotos.processamento_falhas")
+        logger.warning(f"Não foi possível recomprimir a foto ({e}); enviando a original.")
+        return origem
+
+    tamanho_original, tamanho_final = os.path.getsize(origem), os.path.getsize(destino)
+    metricas.registrar_tempo("fotos.processamento", time.perf_counter() - inicio)
+    metricas.incrementar("fotos.bytes_originais", tamanho_original)
+    metricas.incrementar("fotos.bytes_enviados", tamanho_final)
+    logger.info(f"Foto recomprimida: {tamanho_original} → {tamanho_final} bytes.")
+    return destino
+
+
+def encerrar():
+    """Desliga o pool de processos (chamado no desligamento do bot)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
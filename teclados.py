@@ -0,0 +1,127 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import busca
+import callback_codec
+import config
+import metricas
+import utils
+
+logger = logging.getLogger(__name__)
+
+# Teclados inline prontos para reaproveitar entre mensagens e usuários. O
+# InlineKeyboardMarkup do python-telegram-bot é imutável depois de criado, então
+# a mesma instância pode ir em quantas respostas for preciso.
+
+
+# --- MENUS FIXOS ---
+
+def _colaborador():
+    buttons = [InlineKeyboardButton(name, callback_data=callback_codec.codificar("colaborador_", name)) for name in config.COLABORADORES]
+    buttons.append(InlineKeyboardButton("Outro", callback_data="colaborador_outro"))
+    return InlineKeyboardMarkup(utils.build_menu(buttons, n_cols=2))
+
+
+def _assunto_inicial():
+    buttons = [InlineKeyboardButton(assunto, callback_data=callback_codec.codificar("assunto_pre_", assunto)) for assunto in config.PREDEFINED_ASSUNTOS]
+    buttons.append(InlineKeyboardButton("Outro (digitar ou buscar)", callback_data="assunto_outro"))
+    return InlineKeyboardMarkup(utils.build_menu(buttons, n_cols=2))
+
+
+_MENUS = {
+    "colaborador": _colaborador,
+    "tipo_visita": lambda: InlineKeyboardMarkup.from_row([
+        InlineKeyboardButton("🔄 Reativa", callback_data="tipo_visita_reativo"),
+        InlineKeyboardButton("🎯 Proativa", callback_data="tipo_visita_proativo"),
+    ]),
+    "tipo_atendimento": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("⚡ PRESENCIAL - EDP", callback_data="tipo_atendimento_presencial - edp")],
+        [InlineKeyboardButton("🗺️ PRESENCIAL - EXTERNO", callback_data="tipo_atendimento_presencial - externo")],
+        [InlineKeyboardButton("💻 VIRTUAL", callback_data="tipo_atendimento_virtual")],
+    ]),
+    "figura_orgao_inicial": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("➕ Adicionar Figura/Órgão", callback_data="add_figura_orgao")],
+        [InlineKeyboardButton("⏭️ Pular Figuras/Órgãos", callback_data="fim_figuras_orgaos")],
+    ]),
+    "orgao_figura_palavra_chave": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("📋 Ver lista completa", callback_data="orgao_figura_ver_todos")],
+        [InlineKeyboardButton("📝 Inserir manualmente", callback_data="orgao_figura_inserir_manual")],
+    ]),
+    "figura_orgao_mais": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("➕ Adicionar outra Figura/Órgão", callback_data="add_figura_orgao")],
+        [InlineKeyboardButton("✅ Finalizar Figuras/Órgãos", callback_data="fim_figuras_orgaos")],
+    ]),
+    "assunto_inicial": _assunto_inicial,
+    "data": lambda: InlineKeyboardMarkup.from_row([
+        InlineKeyboardButton("📅 Usar data/hora atual", callback_data="data_hoje"),
+        InlineKeyboardButton("✏️ Digitar data manualmente", callback_data="data_manual"),
+    ]),
+    "demanda_inicial": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("➕ Adicionar demanda", callback_data="add_demanda")],
+        [InlineKeyboardButton("⏭️ Pular demandas", callback_data="fim_demandas")],
+    ]),
+    "observacao": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("➕ Adicionar observação", callback_data="add_obs")],
+        [InlineKeyboardButton("⏭️ Pular observação", callback_data="skip_obs")],
+    ]),
+    "demanda_mais": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("➕ Adicionar outra demanda", callback_data="add_demanda")],
+        [InlineKeyboardButton("✅ Finalizar demandas", callback_data="fim_demandas")],
+    ]),
+    "confirmacao": lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ Confirmar e Salvar", callback_data="confirmar_salvar")],
+        [InlineKeyboardButton("❌ Cancelar Tudo", callback_data="cancelar_resumo")],
+    ]),
+}
+
+_fixos: dict[str, InlineKeyboardMarkup] = {}
+
+
+def fixo(nome: str) -> InlineKeyboardMarkup:
+    """Teclado de um menu que não muda durante o processo, montado na primeira vez que é pedido."""
+    teclado = _fixos.get(nome)
+    if teclado is None:
+        # Duas montagens simultâneas dão teclados iguais; tanto faz qual fica.
+        teclado = _fixos.setdefault(nome, _MENUS[nome]())
+    return teclado
+
+
+# --- LISTAS PAGINADAS ---
+
+class TecladosPaginados:
+    """
+    Páginas de `utils.botoes_pagina` já montadas, por (prefixo, versão do catálogo,
+    consulta, página). Trocar de página vira uma consulta ao dicionário; a lista só é
+    buscada de novo (em `busca.IndiceBusca.resultados`) quando a página ainda não existe.
+    Uma inclusão no catálogo muda a versão, e as páginas antigas saem pelo LRU.
+    """
+
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self._trava = threading.Lock()
+        self._paginas: OrderedDict[tuple, InlineKeyboardMarkup] = OrderedDict()
+
+    def pagina(self, indice: busca.IndiceBusca, consulta: str | None, pagina: int, prefixo: str) -> InlineKeyboardMarkup:
+        # A versão vem depois da conferência do CSV: uma edição no disco invalida as páginas.
+        chave = (prefixo, indice.fonte.versao_atual(), busca.chave_consulta(consulta), pagina)
+        with self._trava:
+            teclado = self._paginas.get(chave)
+            if teclado is not None:
+                self._paginas.move_to_end(chave)
+                metricas.incrementar("teclados.paginas.reaproveitadas")
+                return teclado
+
+        botoes, _ = utils.botoes_pagina(indice.resultados(consulta), pagina, prefix=prefixo)
+        teclado = InlineKeyboardMarkup(botoes)
+        with self._trava:
+            self._paginas[chave] = teclado
+            if len(self._paginas) > self.maximo:
+                self._paginas.popitem(last=False)
+        metricas.incrementar("teclados.paginas.montadas")
+        return teclado
+
+
+paginados = TecladosPaginados(config.TECLADOS_CACHE_MAX)
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fila_exportacao
+import utils
+from diario_exportacao import DiarioExportacao
+
+
+class PlanilhasFalsas:
+    """Substitui `utils.anexar_linhas_planilha`: guarda as linhas por arquivo e falha sob pedido."""
+
+    def __init__(self, falhas: dict[str, int]):
+        self.falhas = dict(falhas)
+        self.linhas: dict[str, list[dict]] = {}
+
+    def __call__(self, destino, linhas, colunas=None):
+        if self.falhas.get(destino):
+            self.falhas[destino] -= 1
+            return False
+        self.linhas.setdefault(destino, []).extend(linhas)
+        return True
+
+
+class TestUmaPlanilhaFalhaEDepoisRetenta(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.diario = DiarioExportacao(
+            os.path.join(pasta, "diario.jsonl"), fila_exportacao.PLANILHAS,
+            caminho_falhas=os.path.join(pasta, "falhas.jsonl"),
+        )
+        self.diario.registrar({"data": "2026-01-02", "demandas": [{"texto": "a"}]}, 1, "r1")
+        self.diario.registrar({"data": "2026-01-02", "demandas": [{"texto": "b"}]}, 1, "r2")
+        self.planilhas = PlanilhasFalsas({utils.PLANILHA_DEMANDAS: 1})
+        patcher = mock.patch.object(utils, "anexar_linhas_planilha", self.planilhas)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _lote(self, ordem):
+        lote = self.diario.pendentes()
+        return [r for planilha in ordem for r in fila_exportacao.aplicar_planilha(self.diario, planilha, lote)]
+
+    def test_reunioes_nao_recebem_as_linhas_de_novo(self):
+        self.assertEqual(self._lote(fila_exportacao.PLANILHAS), [])
+        # Na retentativa as demandas fecham os registros antes de a thread das reuniões olhar o lote.
+        concluidos = self._lote((utils.PLANILHA_DEMANDAS, utils.PLANILHA_REUNIOES))
+
+        self.assertEqual(sorted(r["id"] for r in concluidos), ["r1", "r2"])
+        self.assertEqual(len(self.planilhas.linhas[utils.PLANILHA_REUNIOES]), 2)
+        self.assertEqual(len(self.planilhas.linhas[utils.PLANILHA_DEMANDAS]), 2)
+        self.assertEqual(len(self.diario), 0)
+
+    def test_marcacao_tardia_nao_recria_registro_concluido(self):
+        self._lote(fila_exportacao.PLANILHAS)
+        self._lote((utils.PLANILHA_DEMANDAS, utils.PLANILHA_REUNIOES))
+
+        self.assertEqual(self.diario.marcar_aplicados(utils.PLANILHA_REUNIOES, ["r1", "r2"]), [])
+        self.assertFalse(self.diario.falta_aplicar("r1", utils.PLANILHA_REUNIOES))
+        self.assertEqual(self.diario._aplicados, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import busca
+import catalogo
+import teclados
+
+
+def _nomes(teclado) -> list[str]:
+    return [botao.text for linha in teclado.inline_keyboard for botao in linha]
+
+
+class TestPaginaAcompanhaOCsv(unittest.TestCase):
+    def test_edicao_no_disco_invalida_a_pagina(self):
+        caminho = os.path.join(tempfile.mkdtemp(), "assuntos.csv")
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write("assunto\nPoste caido\n")
+        indice = busca.IndiceBusca(catalogo.Catalogo(caminho, "assunto"))
+        paginados = teclados.TecladosPaginados(16)
+        for _ in range(2):  # a segunda já sai do cache
+            self.assertIn("Poste caido", _nomes(paginados.pagina(indice, None, 0, "assunto_")))
+
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write("assunto\nFalta de energia\n")
+        os.utime(caminho, ns=(0, 10**18))  # garante mtime diferente mesmo no mesmo tique
+
+        nomes = _nomes(paginados.pagina(indice, None, 0, "assunto_"))
+        self.assertIn("Falta de energia", nomes)
+        self.assertNotIn("Poste caido", nomes)
+
+
+if __name__ == "__main__":
+    unittest.main()
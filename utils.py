@@ -1,16 +1,21 @@
 import json
 import os
-import pandas as pd
 from telegram import InlineKeyboardButton
 from datetime import datetime
 from config import *
 from globals import user_data
 import logging
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, MediaIoBaseUpload
+import time
 from io import BytesIO
 
+import cache_planilhas
+import callback_codec
+import catalogo
+import drive_cliente
+import escrita_planilhas
+import metricas
+import xlsx_append
+
 logger = logging.getLogger(__name__)
 
 # --- FUNÇÕES UTILITÁRIAS ---
@@ -27,7 +32,7 @@ def botoes_pagina(lista, pagina, prefix="", por_pagina=5):
     sublista = lista[inicio:fim]
 
     buttons = [
-        [InlineKeyboardButton(text=item, callback_data=f"{prefix}{item}")]
+        [InlineKeyboardButton(text=item, callback_data=callback_codec.codificar(prefix, item))]
         for item in sublista
     ]
 
@@ -44,255 +49,269 @@ def botoes_pagina(lista, pagina, prefix="", por_pagina=5):
 
 # --- LISTAS CSV (sem alteração) ---
 
-def ler_orgaos_csv():
-    if not os.path.exists(CSV_ORGAOS):
-        logger.warning(f"CSV de órgãos não encontrado em {CSV_ORGAOS}. Criando um DataFrame vazio.")
-        return pd.DataFrame(columns=['nome'])
-    df = pd.read_csv(CSV_ORGAOS)
-    return df['nome'].dropna().tolist()
-
-def salvar_orgao(novo_orgao: str):
-    caminho_orgaos = CSV_ORGAOS
-    os.makedirs(os.path.dirname(caminho_orgaos), exist_ok=True)
-    novo_orgao = novo_orgao.strip()
-    orgaos_existentes = set()
-    if os.path.exists(caminho_orgaos):
-        with open(caminho_orgaos, mode='r', encoding='utf-8') as f:
-            orgaos_existentes = {linha.strip() for linha in f.readlines()}
-    if novo_orgao and novo_orgao not in orgaos_existentes:
-        with open(caminho_orgaos, mode='a', newline='', encoding='utf-8') as f:
-            f.write(f"{novo_orgao}\n")
-
-def ler_assuntos_csv():
-    if not os.path.exists(CSV_ASSUNTOS):
-        logger.warning(f"CSV de assuntos não encontrado em {CSV_ASSUNTOS}. Criando um DataFrame vazio.")
-        return pd.DataFrame(columns=['assunto'])
-    df = pd.read_csv(CSV_ASSUNTOS)
-    return df['assunto'].dropna().tolist()
+# As listas ficam em memória (catalogo.py); o CSV só é relido se mudar no disco.
 
-def salvar_assunto(novo_assunto: str):
-    caminho_assuntos = CSV_ASSUNTOS
-    os.makedirs(os.path.dirname(caminho_assuntos), exist_ok=True)
-    novo_assunto = novo_assunto.strip()
-    assuntos_existentes = set()
-    if os.path.exists(caminho_assuntos):
-        with open(caminho_assuntos, mode='r', encoding='utf-8') as f:
-            assuntos_existentes = {linha.strip() for linha in f.readlines()}
-    if novo_assunto and novo_assunto not in assuntos_existentes:
-        with open(caminho_assuntos, mode='a', newline='', encoding='utf-8') as f:
-            f.write(f"{novo_assunto}\n")
-
-# --- GOOGLE DRIVE SERVICE AUTH ---
-
-def get_drive_service():
-    """Autentica com a API do Google Drive usando credenciais JSON."""
-    try:
-        creds_json = os.environ.get("GOOGLE_CREDENTIALS_JSON")
-        if not creds_json:
-            raise ValueError("GOOGLE_CREDENTIALS_JSON não está configurada nas variáveis de ambiente.")
-        info = json.loads(creds_json)
-        credentials = service_account.Credentials.from_service_account_info(
-            info,
-            scopes=['https://www.googleapis.com/auth/drive']
-        )
-        service = build('drive', 'v3', credentials=credentials)
-        logger.info("Serviço do Google Drive autenticado com sucesso.")
-        return service
-    except Exception as e:
-        logger.error(f"Erro ao obter serviço do Google Drive: {e}", exc_info=True)
-        return None
+def ler_orgaos_csv() -> list[str]:
+    return list(catalogo.orgaos.itens())
 
-# --- EXPORTAR REUNIÕES PARA PLANILHA NO DRIVE ---
+def salvar_orgao(novo_orgao: str):
+    catalogo.orgaos.adicionar(novo_orgao)
 
-def exportar_reunioes_para_drive(dados: dict):
-    logger.info("Exportando reunião direto para planilha 'REUNIAO_PP.xlsx' (sem banco)")
-    service = get_drive_service()
-    if not service:
-        logger.error("Serviço do Google Drive não disponível.")
-        return
+def ler_assuntos_csv() -> list[str]:
+    return list(catalogo.assuntos.itens())
 
-    folder_id = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
-    spreadsheet_name = "REUNIAO_PP.xlsx"
-
-    try:
-        query = f"name='{spreadsheet_name}' and '{folder_id}' in parents and trashed=false"
-        results = service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get("files", [])
-        if not files:
-            raise FileNotFoundError(f"Arquivo '{spreadsheet_name}' não encontrado.")
-        file_id = files[0]["id"]
-
-        request = service.files().get_media(fileId=file_id)
-        fh = BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        fh.seek(0)
-
-        df_existente = pd.read_excel(fh, engine='openpyxl')
-
-        figuras_orgaos = dados.get("figuras_orgaos")
-        if figuras_orgaos and len(figuras_orgaos) > 0:
-            orgao = figuras_orgaos[0].get("orgao_publico", "NÃO INFORMADO")
-            figura_publica = figuras_orgaos[0].get("figura_publica", "")
-            cargo = figuras_orgaos[0].get("cargo", "")
-        else:
-            orgao = "NÃO INFORMADO"
-            figura_publica = ""
-            cargo = ""
-
-        municipio = dados.get("municipio", "")
-        participante = f"{orgao} - {municipio}" if municipio else orgao
-        cliente = f"{figura_publica} - {cargo}".strip(" -")
-
-        data_raw = dados.get("data")
-        if isinstance(data_raw, (datetime, pd.Timestamp)):
-            data_str = data_raw.strftime('%Y-%m-%d')
-        else:
-            data_str = str(data_raw) if data_raw else ""
-
-        assunto = dados.get("assunto", "").upper()
-        tipo_atendimento = dados.get("tipo_atendimento", "")
-        colaborador = dados.get("colaborador", "")
-        tipo_visita = dados.get("tipo_visita", "")
-
-        nova_linha = {
+def salvar_assunto(novo_assunto: str):
+    catalogo.assuntos.adicionar(novo_assunto)
+
+# --- LINHAS DAS PLANILHAS ---
+
+PLANILHA_REUNIOES = "REUNIAO_PP.xlsx"
+PLANILHA_DEMANDAS = "DEMANDAS_PP.xlsx"
+
+# IBGE vai no fim: nas planilhas que já existem as colunas novas entram depois das antigas.
+COLUNAS_REUNIOES = [
+    "DATA", "CATEGORIA", "PARTICIPANTE", "CLIENTE", "ASSUNTO", "TIPO ATENDIMENTO",
+    "MUNICIPIO", "COLABORADOR", "ATENDIMENTO", "TEMA REUNIÃO", "IBGE"
+]
+COLUNAS_DEMANDAS = [
+    "DATA", "MUNICIPIO", "COLABORADOR", "CATEGORIA", "PARTICIPANTE", "CLIENTE", "ASSUNTO",
+    "TIPO ATENDIMENTO", "ATENDIMENTO", "DEMANDA", "OV", "PRO", "OBSERVACAO"
+]
+COLUNAS_PLANILHAS = {PLANILHA_REUNIOES: COLUNAS_REUNIOES, PLANILHA_DEMANDAS: COLUNAS_DEMANDAS}
+
+def _data_str(dados: dict) -> str:
+    data_raw = dados.get("data")
+    if isinstance(data_raw, datetime):  # inclui pd.Timestamp
+        return data_raw.strftime('%Y-%m-%d')
+    return str(data_raw) if data_raw else ""
+
+def linha_reuniao(dados: dict) -> dict:
+    """Monta a linha da planilha de reuniões para uma ocorrência."""
+    figuras_orgaos = dados.get("figuras_orgaos")
+    if figuras_orgaos and len(figuras_orgaos) > 0:
+        orgao = figuras_orgaos[0].get("orgao_publico", "NÃO INFORMADO")
+        figura_publica = figuras_orgaos[0].get("figura_publica", "")
+        cargo = figuras_orgaos[0].get("cargo", "")
+    else:
+        orgao = "NÃO INFORMADO"
+        figura_publica = ""
+        cargo = ""
+
+    municipio = dados.get("municipio", "")
+    participante = f"{orgao} - {municipio}" if municipio else orgao
+    cliente = f"{figura_publica} - {cargo}".strip(" -")
+    assunto = dados.get("assunto", "").upper()
+
+    return {
+        "DATA": _data_str(dados),
+        "CATEGORIA": orgao,
+        "PARTICIPANTE": participante,
+        "CLIENTE": cliente,
+        "ASSUNTO": assunto,
+        "TIPO ATENDIMENTO": dados.get("tipo_atendimento", ""),
+        "MUNICIPIO": municipio,
+        "COLABORADOR": dados.get("colaborador", ""),
+        "ATENDIMENTO": dados.get("tipo_visita", ""),
+        "TEMA REUNIÃO": assunto,
+        "IBGE": dados.get("municipio_ibge", "")
+    }
+
+def linhas_demandas(dados_gerais: dict, demandas: list[dict] | None = None) -> list[dict]:
+    """Monta as linhas da planilha de demandas (uma por demanda) para uma ocorrência."""
+    if demandas is None:
+        demandas = dados_gerais.get("demandas", [])
+
+    categoria = "NÃO INFORMADO"
+    participante = ""
+    cliente = ""
+    figuras_orgaos = dados_gerais.get('figuras_orgaos')
+    if figuras_orgaos and len(figuras_orgaos) > 0:
+        categoria = figuras_orgaos[0].get("orgao_publico", categoria)
+        participante = f"{categoria} - {dados_gerais.get('municipio', '')}"
+        cliente = f"{figuras_orgaos[0].get('figura_publica', '')} - {figuras_orgaos[0].get('cargo', '')}"
+
+    data_str = _data_str(dados_gerais)
+    novas_linhas = []
+    for d in demandas:
+        novas_linhas.append({
             "DATA": data_str,
-            "CATEGORIA": orgao,
+            "MUNICIPIO": dados_gerais.get("municipio", ""),
+            "COLABORADOR": dados_gerais.get("colaborador", ""),
+            "CATEGORIA": categoria,
             "PARTICIPANTE": participante,
             "CLIENTE": cliente,
-            "ASSUNTO": assunto,
-            "TIPO ATENDIMENTO": tipo_atendimento,
-            "MUNICIPIO": municipio,
-            "COLABORADOR": colaborador,
-            "ATENDIMENTO": tipo_visita,
-            "TEMA REUNIÃO": assunto
-        }
-
-        logger.info(f"Nova linha reunião: {nova_linha}")
-
-        df_novo = pd.DataFrame([nova_linha])
-        df_final = pd.concat([df_existente, df_novo], ignore_index=True)
-
+            "ASSUNTO": dados_gerais.get("assunto", "").upper(),
+            "TIPO ATENDIMENTO": dados_gerais.get("tipo_atendimento", ""),
+            "ATENDIMENTO": dados_gerais.get("tipo_visita", ""),
+            # O handler de demanda guarda o texto em "texto"
+            "DEMANDA": d.get("demanda", d.get("texto", "")),
+            "OV": d.get("ov", ""),
+            "PRO": d.get("pro", ""),
+            "OBSERVACAO": d.get("observacao", "")
+        })
+    return novas_linhas
+
+# --- PARTIÇÕES MENSAIS ---
+# Com PARTICIONAR_PLANILHAS ligado cada registro vai para a planilha do mês da
+# ocorrência (ex: REUNIAO_PP_2026-10.xlsx), então cada escrita mexe num arquivo de
+# tamanho limitado. A planilha de todos os meses é montada à parte por compactar_planilhas.py.
+
+# Registros sem data legível não têm mês: vão para uma partição fixa, em vez de cair
+# calados no mês corrente.
+PARTICAO_SEM_DATA = "SEM-DATA"
+
+def nome_particao(planilha: str, data_str: str) -> str:
+    base, extensao = os.path.splitext(planilha)
+    try:
+        mes = datetime.strptime(str(data_str)[:10], "%Y-%m-%d").strftime("%Y-%m")
+    except ValueError:
+        logger.warning(f"Data '{data_str}' ilegível; registro vai para {base}_{PARTICAO_SEM_DATA}{extensao}.")
+        metricas.incrementar("planilhas.particao_sem_data")
+        mes = PARTICAO_SEM_DATA
+    return f"{base}_{mes}{extensao}"
+
+def planilha_destino(planilha: str, dados: dict) -> str:
+    if not PARTICIONAR_PLANILHAS:
+        return planilha
+    return nome_particao(planilha, _data_str(dados))
+
+def planilhas_correntes() -> list[str]:
+    """Planilhas que recebem os registros de hoje (usado para pré-carregar os IDs)."""
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    return [planilha_destino(p, {"data": hoje}) for p in (PLANILHA_REUNIOES, PLANILHA_DEMANDAS)]
+
+# --- ANEXAR LINHAS EM UMA PLANILHA DO DRIVE ---
+
+def _criar_planilha(service, spreadsheet_name: str, folder_id: str | None, colunas: list[str], novas_linhas: list[dict]):
+    import pandas as pd
+    from googleapiclient.http import MediaIoBaseUpload
+
+    extras = [c for linha in novas_linhas for c in linha if c not in colunas]
+    df = pd.DataFrame(novas_linhas).reindex(columns=colunas + list(dict.fromkeys(extras)))
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False, engine="openpyxl")
+    conteudo = buffer.getvalue()
+
+    metadata = {'name': spreadsheet_name}
+    if folder_id:
+        metadata['parents'] = [folder_id]
+    media_body = MediaIoBaseUpload(BytesIO(conteudo), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    resposta = service.files().create(
+        body=metadata, media_body=media_body, fields=f"id,{cache_planilhas.CAMPOS_REVISAO}"
+    ).execute()
+    drive_cliente.registrar_id_arquivo(spreadsheet_name, folder_id, resposta["id"])
+    cache_planilhas.cache.registrar_upload(resposta["id"], conteudo, resposta, df)
+    logger.info(f"Planilha '{spreadsheet_name}' criada no Drive com ID: {resposta['id']}")
+
+def _anexar_bytes(file_id: str, conteudo: bytes, novas_linhas: list[dict]) -> tuple[bytes, "pd.DataFrame | None"]:
+    try:
+        # Anexa direto no XML da aba, sem carregar o histórico num DataFrame
+        return xlsx_append.anexar_linhas_xlsx(conteudo, novas_linhas), None
+    except xlsx_append.FormatoXlsxNaoSuportado as e:
+        logger.warning(f"Planilha {file_id} fora do formato esperado ({e}); usando pandas.")
+        import pandas as pd
+        df_existente = pd.read_excel(BytesIO(conteudo), engine='openpyxl')
+        df_final = pd.concat([df_existente, pd.DataFrame(novas_linhas)], ignore_index=True)
         buffer = BytesIO()
         df_final.to_excel(buffer, index=False, engine="openpyxl")
-        buffer.seek(0)
-
-        media_body = MediaIoBaseUpload(buffer, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        service.files().update(fileId=file_id, media_body=media_body).execute()
-
-        logger.info(f"Planilha '{spreadsheet_name}' atualizada com sucesso no Drive (sem banco).")
-
-    except Exception as e:
-        logger.error(f"Erro ao exportar reunião diretamente para planilha: {e}", exc_info=True)
-
-# --- EXPORTAR DEMANDAS PARA PLANILHA NO DRIVE ---
-
-def exportar_demandas_para_drive(dados_gerais: dict, demandas: list[dict]):
-    logger.info("Exportando demandas direto para planilha 'DEMANDAS_PP.xlsx' (sem banco)")
-    service = get_drive_service()
-    if not service:
-        logger.error("Serviço do Google Drive não disponível.")
+        return buffer.getvalue(), df_final
+
+def _anexar_no_arquivo(service, file_id: str, novas_linhas: list[dict]):
+    """
+    Escrita otimista: guarda a revisão lida, confere antes do upload que o Drive ainda está
+    nela e, se outra pessoa/processo gravou no meio do caminho, relê a revisão nova e
+    reaplica só as nossas linhas. A API v3 do Drive não tem upload condicional, então
+    ainda sobra a janela entre a conferência e o upload, mas ela é de um único request.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
+    for tentativa in range(1, DRIVE_TENTATIVAS_CONFLITO + 1):
+        # Só baixa de novo se alguém mexeu na planilha desde a nossa última escrita
+        conteudo, revisao = cache_planilhas.cache.ler_bytes(service, file_id)
+        novo_conteudo, df_final = _anexar_bytes(file_id, conteudo, novas_linhas)
+
+        revisao_atual = cache_planilhas.cache.revisao_remota(service, file_id)
+        if revisao_atual != revisao:
+            metricas.incrementar("planilhas.conflitos_revisao")
+            logger.warning(
+                f"Planilha {file_id} mudou no Drive durante a escrita ({revisao} → {revisao_atual}); "
+                f"reaplicando {len(novas_linhas)} linha(s) (tentativa {tentativa}/{DRIVE_TENTATIVAS_CONFLITO})."
+            )
+            continue
+
+        media_body = MediaIoBaseUpload(BytesIO(novo_conteudo), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        resposta = service.files().update(
+            fileId=file_id, media_body=media_body, fields=cache_planilhas.CAMPOS_REVISAO
+        ).execute()
+        cache_planilhas.cache.registrar_upload(file_id, novo_conteudo, resposta, df_final)
         return
 
-    folder_id = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
-    spreadsheet_name = "DEMANDAS_PP.xlsx"
+    raise cache_planilhas.ConflitoRevisao(
+        f"Planilha {file_id} continuou mudando no Drive após {DRIVE_TENTATIVAS_CONFLITO} tentativa(s)."
+    )
 
+def _escrever_planilha(spreadsheet_name: str, novas_linhas: list[dict], colunas: list[str] | None):
+    folder_id = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
+    inicio = time.perf_counter()
+    with drive_cliente.servico_drive() as service:
+        for tentativa in range(2):
+            file_id = drive_cliente.obter_id_arquivo(service, spreadsheet_name, folder_id)
+            if not file_id:
+                if colunas is None:
+                    raise FileNotFoundError(f"Arquivo '{spreadsheet_name}' não encontrado.")
+                _criar_planilha(service, spreadsheet_name, folder_id, colunas, novas_linhas)
+                break
+            try:
+                _anexar_no_arquivo(service, file_id, novas_linhas)
+                break
+            except Exception as e:
+                # ID em cache de um arquivo que foi apagado/substituído: resolve de novo.
+                if tentativa == 0 and drive_cliente.erro_nao_encontrado(e):
+                    logger.warning(f"ID em cache de '{spreadsheet_name}' não existe mais; consultando de novo.")
+                    drive_cliente.invalidar_id_arquivo(spreadsheet_name, folder_id)
+                    cache_planilhas.cache.invalidar(file_id)
+                    continue
+                raise
+
+    duracao = time.perf_counter() - inicio
+    metricas.registrar_tempo(f"planilha.{spreadsheet_name}.escrita", duracao)
+    logger.info(
+        f"Planilha '{spreadsheet_name}' atualizada com sucesso no Drive "
+        f"(+{len(novas_linhas)} linha(s) em {duracao:.2f}s)."
+    )
+
+# Uma escrita por vez em cada arquivo; quem chega durante uma escrita entra na próxima.
+_escritas = escrita_planilhas.EscritaCoalescida(_escrever_planilha)
+
+def anexar_linhas_planilha(spreadsheet_name: str, novas_linhas: list[dict], colunas: list[str] | None = None) -> bool:
+    """
+    Anexa várias linhas a uma planilha do Drive com um único ciclo leitura → anexação → upload.
+    Chamadas simultâneas para a mesma planilha são juntadas numa só escrita.
+    Se a planilha não existir e `colunas` for informado, ela é criada com esse cabeçalho.
+    Retorna True se a planilha foi atualizada (ou se não havia nada a anexar).
+    """
+    if not novas_linhas:
+        return True
+
+    logger.info(f"Anexando {len(novas_linhas)} linha(s) à planilha '{spreadsheet_name}' (sem banco)")
+    inicio = time.perf_counter()
     try:
-        query = f"name='{spreadsheet_name}' and '{folder_id}' in parents and trashed=false"
-        results = service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get("files", [])
-        if not files:
-            raise FileNotFoundError(f"Arquivo '{spreadsheet_name}' não encontrado.")
-        file_id = files[0]["id"]
-
-        request = service.files().get_media(fileId=file_id)
-        fh = BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        fh.seek(0)
-
-        df_existente = pd.read_excel(fh, engine='openpyxl')
-
-        novas_linhas = []
-        for d in demandas:
-            categoria = "NÃO INFORMADO"
-            participante = ""
-            cliente = ""
-
-            figuras_orgaos = dados_gerais.get('figuras_orgaos')
-            if figuras_orgaos and len(figuras_orgaos) > 0:
-                categoria = figuras_orgaos[0].get("orgao_publico", categoria)
-                participante = f"{categoria} - {dados_gerais.get('municipio', '')}"
-                cliente = f"{figuras_orgaos[0].get('figura_publica', '')} - {figuras_orgaos[0].get('cargo', '')}"
-
-            data_raw = dados_gerais.get("data")
-            if isinstance(data_raw, (datetime, pd.Timestamp)):
-                data_str = data_raw.strftime('%Y-%m-%d')
-            else:
-                data_str = str(data_raw) if data_raw else ""
-
-            novas_linhas.append({
-                "DATA": data_str,
-                "MUNICIPIO": dados_gerais.get("municipio", ""),
-                "COLABORADOR": dados_gerais.get("colaborador", ""),
-                "CATEGORIA": categoria,
-                "PARTICIPANTE": participante,
-                "CLIENTE": cliente,
-                "ASSUNTO": dados_gerais.get("assunto", "").upper(),
-                "TIPO ATENDIMENTO": dados_gerais.get("tipo_atendimento", ""),
-                "ATENDIMENTO": dados_gerais.get("tipo_visita", ""),
-                "DEMANDA": d.get("demanda", ""),
-                "OV": d.get("ov", ""),
-                "PRO": d.get("pro", ""),
-                "OBSERVACAO": d.get("observacao", "")
-            })
-
-        logger.info(f"Novas linhas demandas: {novas_linhas}")
-
-        df_novo = pd.DataFrame(novas_linhas)
-        df_final = pd.concat([df_existente, df_novo], ignore_index=True)
-
-        buffer = BytesIO()
-        df_final.to_excel(buffer, index=False, engine="openpyxl")
-        buffer.seek(0)
-
-        media_body = MediaIoBaseUpload(buffer, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        service.files().update(fileId=file_id, media_body=media_body).execute()
-
-        logger.info(f"Planilha '{spreadsheet_name}' atualizada com sucesso no Drive (sem banco).")
-
+        _escritas.anexar(spreadsheet_name, novas_linhas, colunas)
+        metricas.registrar_tempo(f"planilha.{spreadsheet_name}.pedido", time.perf_counter() - inicio)
+        return True
     except Exception as e:
-        logger.error(f"Erro ao exportar demandas diretamente para planilha: {e}", exc_info=True)
+        metricas.incrementar(f"planilha.{spreadsheet_name}.falhas")
+        logger.error(f"Erro ao anexar linhas à planilha '{spreadsheet_name}': {e}", exc_info=True)
+        return False
 
-# --- FUNÇÃO PARA UPLOAD DE FOTO (EM MEMÓRIA) ---
+# --- EXPORTAR REUNIÕES PARA PLANILHA NO DRIVE ---
 
-async def upload_photo_to_drive(photo_bytes: bytes, filename: str) -> str | None:
-    drive_service = get_drive_service()
-    if not drive_service:
-        logger.error("Serviço do Google Drive não disponível para upload de foto.")
-        return None
+def exportar_reunioes_para_drive(dados: dict) -> bool:
+    destino = planilha_destino(PLANILHA_REUNIOES, dados)
+    return anexar_linhas_planilha(destino, [linha_reuniao(dados)], colunas=COLUNAS_REUNIOES)
 
-    # Usa a pasta específica para fotos, se configurada; senão, pasta padrão
-    folder_id = os.environ.get("GOOGLE_DRIVE_PHOTOS_FOLDER_ID") or os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
-    if not folder_id:
-        logger.error("Nenhuma pasta configurada para upload de fotos no Google Drive.")
-        return None
+# --- EXPORTAR DEMANDAS PARA PLANILHA NO DRIVE ---
 
-    try:
-        file_metadata = {
-            'name': filename,
-            'parents': [folder_id],
-            'mimeType': 'image/jpeg'
-        }
-        media = MediaIoBaseUpload(BytesIO(photo_bytes), mimetype='image/jpeg', resumable=True)
-        file = drive_service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        file_id = file.get('id')
-        logger.info(f"Foto '{filename}' enviada para o Google Drive (pasta: {folder_id}) com ID: {file_id}")
-        return file_id
-    except Exception as e:
-        logger.error(f"Erro ao fazer upload da foto para o Google Drive: {e}", exc_info=True)
-        return None
+def exportar_demandas_para_drive(dados_gerais: dict, demandas: list[dict]) -> bool:
+    destino = planilha_destino(PLANILHA_DEMANDAS, dados_gerais)
+    return anexar_linhas_planilha(destino, linhas_demandas(dados_gerais, demandas), colunas=COLUNAS_DEMANDAS)
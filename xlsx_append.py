@@ -0,0 +1,330 @@
+import html
+import logging
+import math
+import numbers
+import posixpath
+import re
+import zipfile
+from datetime import date, datetime
+from io import BytesIO
+from xml.etree import ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# Anexa linhas a uma aba de um .xlsx mexendo só no XML da aba.
+#
+# O XML da aba é copiado em blocos para o arquivo novo; as linhas novas entram
+# logo antes de </sheetData>. As linhas antigas nunca viram DataFrame nem objetos
+# do openpyxl: o custo fica no I/O do zip, não em parsear o histórico inteiro.
+# O nome da aba, o cabeçalho (ordem das colunas) e as demais partes do arquivo
+# (estilos, sharedStrings, outras abas) são preservados.
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+TAMANHO_BLOCO = 1 << 20
+# Recomprimir o XML da aba é o custo dominante; o nível 3 do deflate leva metade
+# do tempo do padrão (6) e gera um arquivo só ~3% maior.
+NIVEL_COMPRESSAO = 3
+
+_RE_DIMENSAO = re.compile(rb'<dimension\s+ref="([^"]*)"\s*/>')
+_RE_INICIO_LINHA = re.compile(rb'<row\b([^>]*)>')
+_RE_ATRIBUTO_R = re.compile(rb'\sr="(\d+)"')
+_RE_CELULA = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_RE_REF_CELULA = re.compile(rb'\sr="([A-Z]+)\d+"')
+_RE_TIPO_CELULA = re.compile(rb'\st="([^"]+)"')
+_RE_VALOR = re.compile(rb'<v>(.*?)</v>', re.S)
+_RE_TEXTO = re.compile(rb'<t\b[^>]*>(.*?)</t>', re.S)
+_RE_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+FIM_SHEETDATA = b"</sheetData>"
+
+
+class FormatoXlsxNaoSuportado(ValueError):
+    """O arquivo não tem a estrutura esperada; quem chamou deve usar o caminho via pandas."""
+
+
+# --- Colunas e células ---
+
+def _letra_coluna(indice: int) -> str:
+    """0 → A, 25 → Z, 26 → AA."""
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+def _indice_coluna(letras: str) -> int:
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + (ord(letra) - 64)
+    return indice - 1
+
+def _texto_xml(valor: str) -> str:
+    return html.escape(_RE_CARACTERES_INVALIDOS.sub("", valor), quote=False)
+
+def _vazio(valor) -> bool:
+    if valor is None or isinstance(valor, str) and valor == "":
+        return True
+    try:
+        return bool(valor != valor)  # NaN / NaT vindos de DataFrame
+    except (TypeError, ValueError):
+        return False
+
+def _celula(referencia: str, valor) -> str:
+    if _vazio(valor):
+        return ""
+    if isinstance(valor, bool) or type(valor).__name__ == "bool_":
+        return f'<c r="{referencia}" t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, numbers.Integral):
+        return f'<c r="{referencia}"><v>{int(valor)}</v></c>'
+    if isinstance(valor, numbers.Real):
+        if math.isinf(valor):
+            return ""
+        return f'<c r="{referencia}"><v>{float(valor)!r}</v></c>'
+    if isinstance(valor, (datetime, date)):
+        valor = valor.isoformat(sep=" ") if isinstance(valor, datetime) else valor.isoformat()
+    # Strings inline: não precisa mexer no sharedStrings.xml
+    return f'<c r="{referencia}" t="inlineStr"><is><t xml:space="preserve">{_texto_xml(str(valor))}</t></is></c>'
+
+def _linha_xml(numero: int, valores: list) -> bytes:
+    celulas = "".join(_celula(f"{_letra_coluna(i)}{numero}", v) for i, v in enumerate(valores))
+    return f'<row r="{numero}">{celulas}</row>'.encode("utf-8")
+
+
+# --- Localização da aba e leitura do cabeçalho ---
+
+def _caminho_aba(zin: zipfile.ZipFile, nome_aba: str | None) -> tuple[str, str]:
+    """Devolve (nome da aba, caminho do XML da aba dentro do zip)."""
+    try:
+        workbook = ET.fromstring(zin.read("xl/workbook.xml"))
+        rels = ET.fromstring(zin.read("xl/_rels/workbook.xml.rels"))
+    except KeyError as e:
+        raise FormatoXlsxNaoSuportado(f"Parte obrigatória ausente no xlsx: {e}")
+
+    abas = workbook.findall(f"{{{NS_MAIN}}}sheets/{{{NS_MAIN}}}sheet")
+    if not abas:
+        raise FormatoXlsxNaoSuportado("Planilha sem abas.")
+    if nome_aba is None:
+        aba = abas[0]
+    else:
+        aba = next((a for a in abas if a.get("name") == nome_aba), None)
+        if aba is None:
+            raise FormatoXlsxNaoSuportado(f"Aba '{nome_aba}' não encontrada.")
+
+    rel_id = aba.get(f"{{{NS_REL}}}id")
+    alvo = next((r.get("Target") for r in rels.findall(f"{{{NS_PKG_REL}}}Relationship") if r.get("Id") == rel_id), None)
+    if not alvo:
+        raise FormatoXlsxNaoSuportado(f"Relação da aba '{aba.get('name')}' não encontrada.")
+    caminho = alvo.lstrip("/") if alvo.startswith("/") else posixpath.normpath(posixpath.join("xl", alvo))
+    return aba.get("name"), caminho
+
+def _strings_compartilhadas(zin: zipfile.ZipFile, indices: set[int]) -> dict[int, str]:
+    """Lê do sharedStrings.xml só até o maior índice pedido."""
+    if not indices or "xl/sharedStrings.xml" not in zin.namelist():
+        return {}
+    encontrados = {}
+    maior = max(indices)
+    with zin.open("xl/sharedStrings.xml") as f:
+        indice = 0
+        for _, elemento in ET.iterparse(f, events=("end",)):
+            if elemento.tag != f"{{{NS_MAIN}}}si":
+                continue
+            if indice in indices:
+                encontrados[indice] = "".join(t.text or "" for t in elemento.iter(f"{{{NS_MAIN}}}t"))
+            elemento.clear()
+            indice += 1
+            if indice > maior:
+                break
+    return encontrados
+
+def _ler_cabecalho(zin: zipfile.ZipFile, linha_xml: bytes) -> dict[int, str]:
+    """Mapeia índice da coluna → nome, a partir do XML da primeira linha."""
+    brutos = {}
+    compartilhadas = set()
+    for atributos, corpo in _RE_CELULA.findall(linha_xml):
+        ref = _RE_REF_CELULA.search(atributos)
+        if not ref:
+            continue
+        coluna = _indice_coluna(ref.group(1).decode())
+        tipo = _RE_TIPO_CELULA.search(atributos)
+        tipo = tipo.group(1).decode() if tipo else "n"
+        if tipo == "inlineStr":
+            valor = "".join(t.decode("utf-8") for t in _RE_TEXTO.findall(corpo or b""))
+            brutos[coluna] = ("texto", html.unescape(valor))
+        else:
+            v = _RE_VALOR.search(corpo or b"")
+            if not v:
+                continue
+            valor = html.unescape(v.group(1).decode("utf-8"))
+            if tipo == "s":
+                compartilhadas.add(int(valor))
+                brutos[coluna] = ("compartilhada", int(valor))
+            else:
+                brutos[coluna] = ("texto", valor)
+
+    textos = _strings_compartilhadas(zin, compartilhadas)
+    return {
+        coluna: (textos.get(valor, "") if tipo == "compartilhada" else valor)
+        for coluna, (tipo, valor) in brutos.items()
+    }
+
+
+# --- Anexação ---
+
+def anexar_linhas_xlsx(conteudo: bytes, linhas: list[dict], nome_aba: str | None = None) -> bytes:
+    """
+    Devolve um novo .xlsx com `linhas` anexadas ao fim da aba `nome_aba` (ou da primeira aba).
+
+    Cada dict é casado com o cabeçalho pela chave; chaves que não existem no
+    cabeçalho viram colunas novas no fim. Se a aba estiver vazia o cabeçalho é
+    criado a partir das chaves das linhas.
+    """
+    if not linhas:
+        return conteudo
+    try:
+        zin = zipfile.ZipFile(BytesIO(conteudo))
+    except zipfile.BadZipFile as e:
+        raise FormatoXlsxNaoSuportado(f"Arquivo não é um xlsx válido: {e}")
+
+    with zin:
+        nome_aba, caminho = _caminho_aba(zin, nome_aba)
+        if caminho not in zin.namelist():
+            raise FormatoXlsxNaoSuportado(f"XML da aba '{nome_aba}' ausente ({caminho}).")
+
+        saida = BytesIO()
+        with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=NIVEL_COMPRESSAO) as zout:
+            for info in zin.infolist():
+                if info.filename == caminho:
+                    with zin.open(info) as origem, zout.open(info.filename, "w", force_zip64=True) as destino:
+                        _reescrever_aba(zin, origem, destino, linhas)
+                else:
+                    zout.writestr(info, zin.read(info.filename))
+
+    logger.info(f"{len(linhas)} linha(s) anexada(s) à aba '{nome_aba}' sem reescrever o histórico.")
+    return saida.getvalue()
+
+def _reescrever_aba(zin: zipfile.ZipFile, origem, destino, linhas: list[dict]):
+    # 1) Lê o começo do XML até o fim da primeira linha (o cabeçalho) ou até ver que a aba está vazia.
+    inicio = b""
+    while True:
+        bloco = origem.read(TAMANHO_BLOCO)
+        inicio += bloco
+        pos_dados = inicio.find(b"<sheetData")
+        if pos_dados >= 0:
+            fim_tag = inicio.find(b">", pos_dados)
+            if fim_tag >= 0 and inicio[fim_tag - 1:fim_tag] == b"/":
+                break  # <sheetData/>: aba vazia
+            if fim_tag >= 0 and (inicio.find(b"</row>", fim_tag) >= 0 or inicio.find(FIM_SHEETDATA, fim_tag) >= 0):
+                break
+        if not bloco:
+            raise FormatoXlsxNaoSuportado("XML da aba sem <sheetData>.")
+
+    pos_dados = inicio.find(b"<sheetData")
+    fim_tag = inicio.find(b">", pos_dados)
+    vazia = inicio[fim_tag - 1:fim_tag] == b"/" or inicio.startswith(FIM_SHEETDATA, fim_tag + 1)
+
+    # Colunas: as do cabeçalho existente, mais as chaves novas no fim.
+    cabecalho: dict[int, str] = {}
+    fim_cabecalho = fim_tag + 1
+    if not vazia:
+        linha_inicio = _RE_INICIO_LINHA.search(inicio, fim_tag)
+        fim_linha = inicio.find(b"</row>", fim_tag)
+        if linha_inicio and fim_linha >= 0 and linha_inicio.start() < fim_linha:
+            cabecalho = _ler_cabecalho(zin, inicio[linha_inicio.start():fim_linha + len(b"</row>")])
+            fim_cabecalho = fim_linha + len(b"</row>")
+
+    colunas = dict(cabecalho)
+    conhecidas = set(cabecalho.values())
+    proxima = max(colunas, default=-1) + 1
+    novas_colunas = []
+    for linha in linhas:
+        for chave in linha:
+            if chave not in conhecidas:
+                conhecidas.add(chave)
+                colunas[proxima] = chave
+                novas_colunas.append((proxima, chave))
+                proxima += 1
+    total_colunas = proxima
+    nome_por_coluna = [colunas.get(i) for i in range(total_colunas)]
+
+    def valores(linha: dict) -> list:
+        return [linha.get(nome) if nome is not None else None for nome in nome_por_coluna]
+
+    # 2) Ajusta o <dimension> com a nova última linha/coluna.
+    ultima_declarada = 0
+    dimensao = _RE_DIMENSAO.search(inicio, 0, pos_dados)
+    if dimensao:
+        ref = dimensao.group(1).decode()
+        numeros = re.findall(r"\d+", ref)
+        ultima_declarada = int(numeros[-1]) if numeros else 0
+        ultima_nova = (1 if vazia else max(ultima_declarada, 1)) + len(linhas)
+        nova_ref = f'<dimension ref="A1:{_letra_coluna(total_colunas - 1)}{ultima_nova}"/>'
+        inicio = inicio[:dimensao.start()] + nova_ref.encode() + inicio[dimensao.end():]
+        deslocamento = len(nova_ref) - (dimensao.end() - dimensao.start())
+        pos_dados += deslocamento
+        fim_tag += deslocamento
+        fim_cabecalho += deslocamento
+
+    # 3) Cabeçalho: cria (aba vazia) ou estende com as colunas novas.
+    if vazia:
+        cabecalho_xml = _linha_xml(1, [colunas.get(i) for i in range(total_colunas)])
+        if inicio[fim_tag - 1:fim_tag] == b"/":
+            inicio = inicio[:fim_tag - 1] + b">" + cabecalho_xml + FIM_SHEETDATA + inicio[fim_tag + 1:]
+        else:
+            inicio = inicio[:fim_tag + 1] + cabecalho_xml + inicio[fim_tag + 1:]
+    elif novas_colunas:
+        extras = "".join(_celula(f"{_letra_coluna(i)}1", nome) for i, nome in novas_colunas).encode("utf-8")
+        pos = fim_cabecalho - len(b"</row>")
+        inicio = inicio[:pos] + extras + inicio[pos:]
+
+    # 4) Copia o resto em blocos, acompanhando o número da última linha,
+    #    e insere as linhas novas antes de </sheetData>.
+    ultima_vista = 1
+    inserido = False
+    pendente = inicio
+    while True:
+        if not inserido:
+            pos_fim = pendente.find(FIM_SHEETDATA)
+            if pos_fim >= 0:
+                ultima_vista = _ultima_linha(pendente, 0, pos_fim, ultima_vista)
+                destino.write(pendente[:pos_fim])
+                for i, linha in enumerate(linhas, 1):
+                    destino.write(_linha_xml(ultima_vista + i, valores(linha)))
+                pendente = pendente[pos_fim:]
+                inserido = True
+                continue
+            # Tudo antes do último '<' já está completo: pode ser escrito.
+            corte = pendente.rfind(b"<")
+            if corte > 0:
+                ultima_vista = _ultima_linha(pendente, 0, corte, ultima_vista)
+                destino.write(pendente[:corte])
+                pendente = pendente[corte:]
+        else:
+            destino.write(pendente)
+            pendente = b""
+
+        bloco = origem.read(TAMANHO_BLOCO)
+        if not bloco:
+            break
+        pendente += bloco
+
+    if not inserido:
+        raise FormatoXlsxNaoSuportado("Fim de </sheetData> não encontrado no XML da aba.")
+    destino.write(pendente)
+
+def _ultima_linha(dados: bytes, inicio: int, fim: int, atual: int) -> int:
+    """Número da última <row> em dados[inicio:fim] (ou `atual` se não houver nenhuma)."""
+    pos = dados.rfind(b"<row", inicio, fim)
+    while pos >= 0:
+        tag = _RE_INICIO_LINHA.match(dados, pos, fim)
+        if tag:
+            r = _RE_ATRIBUTO_R.search(tag.group(1))
+            if r:
+                return max(atual, int(r.group(1)))
+            # Linha sem o atributo r: conta as linhas do trecho.
+            return atual + len(_RE_INICIO_LINHA.findall(dados, inicio, fim))
+        pos = dados.rfind(b"<row", inicio, pos)
+    return atual